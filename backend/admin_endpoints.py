@@ -12,19 +12,33 @@ Usage:
     
     # Or run with uvicorn directly
     uvicorn admin_endpoints:app --reload --port 5000
+
+    # Several workers share data/admin.sqlite3 (SHOPIVERSE_STORAGE=json keeps
+    # hotspots.json/scenes.json as the store instead)
+    uvicorn admin_endpoints:app --workers 4 --port 5000
 """
 
-from fastapi import FastAPI, HTTPException, UploadFile, File
+from fastapi import FastAPI, HTTPException, Request, Response, UploadFile, File
+from fastapi.concurrency import run_in_threadpool
 from fastapi.middleware.cors import CORSMiddleware
-from pydantic import BaseModel
+from pydantic import BaseModel, ValidationError
 from typing import List, Optional, Any, Dict
 import json
 import os
 import shutil
 import csv
+import io
 from datetime import datetime
 import zlib
 
+from admin_storage import DEFAULT_STORAGE, open_storage
+from analytics_log import AnalyticsBackpressure, AnalyticsLog
+from analytics_store import AnalyticsStore
+from analytics_summary import AnalyticsSummary, infer_device_type
+from http_cache import ResponseCache
+from json_store import file_lock
+from ply_ingest import PlyRejected, SceneIndex, ingest_ply
+
 app = FastAPI(title="Shopiverse Admin API")
 
 # Enable CORS for frontend requests
@@ -39,13 +53,19 @@ app.add_middleware(
 # Path to store hotspots data
 DATA_DIR = os.path.join(os.path.dirname(__file__), 'data')
 HOTSPOTS_FILE = os.path.join(DATA_DIR, 'hotspots.json')
-ANALYTICS_FILE = os.path.join(DATA_DIR, 'analytics.csv')
+ANALYTICS_FILE = os.path.join(DATA_DIR, 'analytics.csv')  # legacy, imported into ANALYTICS_DIR
+ANALYTICS_DIR = os.path.join(DATA_DIR, 'analytics')
+ANALYTICS_SUMMARY_FILE = os.path.join(DATA_DIR, 'analytics_summary.json')
 SCENES_FILE = os.path.join(DATA_DIR, 'scenes.json')
+SCENE_INDEX_FILE = os.path.join(DATA_DIR, 'scene_index.json')
 
 # Path to public folder (for serving images via Vite)
 PUBLIC_DIR = os.path.join(os.path.dirname(__file__), '..', 'public')
 PLY_DIR = os.path.join(PUBLIC_DIR, 'scenes')
 
+# Metadata (vertex count, bounds, checksum) of validated scene PLYs
+scene_index = SceneIndex(SCENE_INDEX_FILE)
+
 # Default hotspots (fallback if no saved data)
 # Default hotspots (fallback if no saved data)
 DEFAULT_HOTSPOTS = {
@@ -127,87 +147,73 @@ def ensure_data_dir():
         os.makedirs(DATA_DIR)
 
 
+# Hotspots and scene overrides (SQLite by default, or the JSON files; see
+# admin_storage), shared by all requests in this process
+ensure_data_dir()
+storage = open_storage(DEFAULT_STORAGE, DATA_DIR, DEFAULT_HOTSPOTS)
+
+# Serialized (and pre-compressed) bodies of the storefront's document reads
+response_cache = ResponseCache()
+
+
 def load_hotspots():
-    """Load hotspots from file or return defaults"""
-    ensure_data_dir()
-    if os.path.exists(HOTSPOTS_FILE):
-        try:
-            with open(HOTSPOTS_FILE, 'r') as f:
-                return json.load(f)
-        except (json.JSONDecodeError, IOError):
-            return DEFAULT_HOTSPOTS
-    return DEFAULT_HOTSPOTS
+    """Load hotspots for all scenes. Do not mutate."""
+    return storage.all_hotspots()
 
 
 def save_hotspots(hotspots):
-    """Save hotspots to file"""
-    ensure_data_dir()
-    with open(HOTSPOTS_FILE, 'w') as f:
-        json.dump(hotspots, f, indent=2)
+    """Replace all hotspots"""
+    storage.reset_hotspots(hotspots)
 
 
 def load_scene_overrides():
-    """Load scene overrides from file"""
-    ensure_data_dir()
-    if os.path.exists(SCENES_FILE):
-        try:
-            with open(SCENES_FILE, 'r') as f:
-                return json.load(f)
-        except (json.JSONDecodeError, IOError):
-            return {}
-    return {}
+    """Load scene overrides. Do not mutate."""
+    return storage.all_scenes()
 
 
 def save_scene_overrides(overrides):
-    """Save scene overrides to file"""
-    ensure_data_dir()
-    with open(SCENES_FILE, 'w') as f:
-        json.dump(overrides, f, indent=2)
+    """Replace all scene overrides"""
+    storage.replace_scenes(overrides)
 
 
 # ============== API ENDPOINTS ==============
 
 @app.get("/api/hotspots")
-def get_all_hotspots():
-    """Get all hotspots for all scenes"""
-    return load_hotspots()
+def get_all_hotspots(request: Request):
+    """Get all hotspots for all scenes (ETag / If-None-Match aware)"""
+    return response_cache.respond(request, 'hotspots', storage.hotspots_version(), load_hotspots)
 
 
 @app.get("/api/hotspots/{scene_id}")
 def get_scene_hotspots(scene_id: str):
     """Get hotspots for a specific scene"""
-    hotspots = load_hotspots()
-    return hotspots.get(scene_id, [])
+    return storage.scene_hotspots(scene_id)
+
+
+@app.get("/api/hotspots/{scene_id}/{hotspot_id}")
+def get_hotspot(scene_id: str, hotspot_id: str):
+    """Get a single hotspot"""
+    hotspot = storage.get_hotspot(scene_id, hotspot_id)
+    if hotspot is None:
+        raise HTTPException(status_code=404, detail="Hotspot not found")
+    return hotspot
 
 
 @app.put("/api/hotspots/{scene_id}")
 def update_scene_hotspots(scene_id: str, scene_hotspots: List[dict]):
     """Update hotspots for a specific scene"""
-    hotspots = load_hotspots()
-    hotspots[scene_id] = scene_hotspots
-    save_hotspots(hotspots)
+    storage.set_scene_hotspots(scene_id, scene_hotspots)
     return {"success": True, "message": f"Updated hotspots for {scene_id}"}
 
 
 @app.put("/api/hotspots/{scene_id}/{hotspot_id}")
+@app.patch("/api/hotspots/{scene_id}/{hotspot_id}")
 def update_hotspot(scene_id: str, hotspot_id: str, hotspot_data: dict):
-    """Update a single hotspot"""
-    hotspots = load_hotspots()
-    scene_hotspots = hotspots.get(scene_id, [])
-    
-    # Find and update the hotspot
-    updated = False
-    for i, h in enumerate(scene_hotspots):
-        if h.get('id') == hotspot_id:
-            scene_hotspots[i] = {**h, **hotspot_data}
-            updated = True
-            break
-    
-    if not updated:
+    """Update a single hotspot (fields not given are kept)"""
+    try:
+        storage.patch_hotspot(scene_id, hotspot_id, hotspot_data)
+    except KeyError:
         raise HTTPException(status_code=404, detail="Hotspot not found")
-    
-    hotspots[scene_id] = scene_hotspots
-    save_hotspots(hotspots)
     return {"success": True, "message": f"Updated hotspot {hotspot_id}"}
 
 
@@ -218,22 +224,10 @@ def update_hotspot_images(scene_id: str, hotspot_id: str, data: ImagesUpdate):
     
     Request body: { "images": ["/image1.jpg", "/image2.jpg"] }
     """
-    hotspots = load_hotspots()
-    scene_hotspots = hotspots.get(scene_id, [])
-    
-    # Find and update the hotspot's images
-    updated = False
-    for i, h in enumerate(scene_hotspots):
-        if h.get('id') == hotspot_id:
-            scene_hotspots[i]['images'] = data.images
-            updated = True
-            break
-    
-    if not updated:
+    try:
+        storage.set_hotspot_images(scene_id, hotspot_id, data.images)
+    except KeyError:
         raise HTTPException(status_code=404, detail="Hotspot not found")
-    
-    hotspots[scene_id] = scene_hotspots
-    save_hotspots(hotspots)
     return {
         "success": True, 
         "message": f"Updated images for hotspot {hotspot_id}",
@@ -248,27 +242,13 @@ def add_hotspot_image(scene_id: str, hotspot_id: str, data: ImageAdd):
     
     Request body: { "image": "/new-image.jpg" }
     """
-    hotspots = load_hotspots()
-    scene_hotspots = hotspots.get(scene_id, [])
-    
     if not data.image:
         raise HTTPException(status_code=400, detail="No image URL provided")
-    
-    # Find and update the hotspot's images
-    updated = False
-    for i, h in enumerate(scene_hotspots):
-        if h.get('id') == hotspot_id:
-            if 'images' not in scene_hotspots[i]:
-                scene_hotspots[i]['images'] = []
-            scene_hotspots[i]['images'].append(data.image)
-            updated = True
-            break
-    
-    if not updated:
+
+    try:
+        storage.add_hotspot_image(scene_id, hotspot_id, data.image)
+    except KeyError:
         raise HTTPException(status_code=404, detail="Hotspot not found")
-    
-    hotspots[scene_id] = scene_hotspots
-    save_hotspots(hotspots)
     return {
         "success": True, 
         "message": f"Added image to hotspot {hotspot_id}",
@@ -279,28 +259,12 @@ def add_hotspot_image(scene_id: str, hotspot_id: str, data: ImageAdd):
 @app.delete("/api/hotspots/{scene_id}/{hotspot_id}/images/{image_index}")
 def delete_hotspot_image(scene_id: str, hotspot_id: str, image_index: int):
     """Delete an image from a hotspot by index"""
-    hotspots = load_hotspots()
-    scene_hotspots = hotspots.get(scene_id, [])
-    
-    # Find the hotspot
-    removed = None
-    updated = False
-    for i, h in enumerate(scene_hotspots):
-        if h.get('id') == hotspot_id:
-            images = h.get('images', [])
-            if 0 <= image_index < len(images):
-                removed = images.pop(image_index)
-                scene_hotspots[i]['images'] = images
-                updated = True
-            else:
-                raise HTTPException(status_code=400, detail="Image index out of range")
-            break
-    
-    if not updated:
+    try:
+        removed = storage.remove_hotspot_image(scene_id, hotspot_id, image_index)
+    except KeyError:
         raise HTTPException(status_code=404, detail="Hotspot not found")
-    
-    hotspots[scene_id] = scene_hotspots
-    save_hotspots(hotspots)
+    except IndexError:
+        raise HTTPException(status_code=400, detail="Image index out of range")
     return {
         "success": True, 
         "message": f"Deleted image at index {image_index}",
@@ -318,40 +282,40 @@ def reset_hotspots():
 # ============== SCENE OVERRIDES ==============
 
 @app.get("/api/scenes")
-def get_scene_overrides():
-    """Get all scene overrides"""
-    return load_scene_overrides()
+def get_scene_overrides(request: Request):
+    """Get all scene overrides (ETag / If-None-Match aware)"""
+    return response_cache.respond(request, 'scenes', storage.scenes_version(), load_scene_overrides)
 
 
 @app.get("/api/scenes/{scene_id}")
 def get_scene_override(scene_id: str):
     """Get a specific scene override"""
-    overrides = load_scene_overrides()
-    return overrides.get(scene_id, {})
+    return storage.get_scene(scene_id)
 
 
 @app.put("/api/scenes/{scene_id}")
 def update_scene_override(scene_id: str, data: SceneUpdate):
     """Update a scene override (image/ply/name)"""
-    overrides = load_scene_overrides()
-    current = overrides.get(scene_id, {})
     payload = data.dict(exclude_unset=True)
-    for key, value in payload.items():
-        if value is None:
-            continue
-        current[key] = value
-    overrides[scene_id] = current
-    save_scene_overrides(overrides)
+
+    def apply(current):
+        if payload.get('ply') and payload['ply'] != current.get('ply'):
+            # A new upload replaces any variants written by optimize_scenes.py
+            current.pop('plyOriginal', None)
+            current.pop('plyLods', None)
+        for key, value in payload.items():
+            if value is None:
+                continue
+            current[key] = value
+
+    current = storage.update_scene(scene_id, apply)
     return {"success": True, "scene_id": scene_id, "override": current}
 
 
 @app.delete("/api/scenes/{scene_id}")
 def delete_scene_override(scene_id: str):
     """Delete a scene override"""
-    overrides = load_scene_overrides()
-    if scene_id in overrides:
-        del overrides[scene_id]
-        save_scene_overrides(overrides)
+    storage.delete_scene(scene_id)
     return {"success": True, "scene_id": scene_id}
 
 
@@ -388,27 +352,45 @@ async def upload_file(file: UploadFile = File(...)):
 async def upload_ply(file: UploadFile = File(...)):
     """
     Upload a PLY file to public/scenes
-    Returns the path to use in navigation config
+    The file is validated (header, property layout, size, vertex positions)
+    before it is published, and its metadata is added to the scene index.
+    Returns the path to use in navigation config plus that metadata.
     """
-    filename = file.filename or ''
+    filename = os.path.basename(file.filename or '')
     if not filename.lower().endswith('.ply'):
         raise HTTPException(status_code=400, detail="File must be a .ply")
 
-    os.makedirs(PLY_DIR, exist_ok=True)
-    file_path = os.path.join(PLY_DIR, filename)
-
     try:
-        with open(file_path, "wb") as buffer:
-            shutil.copyfileobj(file.file, buffer)
-
-        return {
-            "success": True,
-            "filename": filename,
-            "path": f"/scenes/{filename}"
-        }
+        # Copying, hashing and validating up to MAX_PLY_BYTES blocks; keep it
+        # off the event loop
+        metadata = await run_in_threadpool(ingest_ply, file.file, filename, PLY_DIR, scene_index)
+    except PlyRejected as e:
+        raise HTTPException(status_code=e.status, detail=f"Invalid PLY: {str(e)}")
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Failed to save file: {str(e)}")
 
+    return {
+        "success": True,
+        "filename": filename,
+        "path": f"/scenes/{filename}",
+        "metadata": metadata
+    }
+
+
+@app.get("/api/scene-files")
+def get_scene_files():
+    """Get metadata of all ingested scene PLYs, keyed by filename"""
+    return scene_index.load()
+
+
+@app.get("/api/scene-files/{filename}")
+def get_scene_file(filename: str):
+    """Get metadata (vertex count, bbox, checksum) of one scene PLY"""
+    entry = scene_index.get(filename)
+    if entry is None:
+        raise HTTPException(status_code=404, detail="Scene file not found")
+    return entry
+
 
 @app.delete("/api/upload/{filename}")
 def delete_file(filename: str):
@@ -463,17 +445,6 @@ def _stable_hash(value: str) -> int:
     return zlib.crc32(value.encode('utf-8')) & 0xFFFFFFFF
 
 
-def _infer_device_type(user_agent: str) -> str:
-    if not user_agent:
-        return 'desktop'
-    ua = user_agent.lower()
-    if 'mobile' in ua or 'iphone' in ua or 'android' in ua:
-        return 'mobile'
-    if 'ipad' in ua or 'tablet' in ua:
-        return 'tablet'
-    return 'desktop'
-
-
 def _default_order_total(seed: str) -> float:
     if not seed:
         return 49.99
@@ -488,7 +459,7 @@ def _normalize_event_fields(event: AnalyticsEvent):
     session_duration = event.sessionDuration if event.sessionDuration is not None else ""
     event_id = event.eventId or f"evt_{_stable_hash(f'{session_id}_{timestamp}')}"
     user_agent = data.get('userAgent') or data.get('user_agent') or ''
-    device_type = event.deviceType or _infer_device_type(user_agent)
+    device_type = event.deviceType or infer_device_type(user_agent)
     page = event.page or data.get('page') or data.get('referrer') or 'store'
     scene = event.scene or data.get('scene') or data.get('sceneId') or data.get('toScene') or data.get('fromScene') or ''
     product_id = event.productId or data.get('productId') or data.get('hotspotId') or ''
@@ -531,26 +502,21 @@ def _normalize_event_fields(event: AnalyticsEvent):
     }
 
 
-def _migrate_analytics_file():
-    if not os.path.exists(ANALYTICS_FILE):
-        return
+def _legacy_analytics_events():
+    """Normalized events of analytics.csv, whatever its (historical) header"""
     with open(ANALYTICS_FILE, 'r', newline='') as f:
         reader = csv.reader(f)
-        rows = list(reader)
-    if not rows:
-        return
-    existing_headers = rows[0]
-    if existing_headers == ANALYTICS_HEADERS:
-        return
-    data_rows = rows[1:]
-    with open(ANALYTICS_FILE, 'w', newline='') as f:
-        writer = csv.writer(f)
-        writer.writerow(ANALYTICS_HEADERS)
-        for row in data_rows:
+        existing_headers = next(reader, None)
+        if not existing_headers:
+            return
+        for row in reader:
             row_map = {}
             for idx, header in enumerate(existing_headers):
                 if idx < len(row):
                     row_map[header] = row[idx]
+            if existing_headers == ANALYTICS_HEADERS:
+                yield row_map
+                continue
             data_json = row_map.get('data') or ''
             try:
                 data_obj = json.loads(data_json) if data_json else {}
@@ -572,40 +538,60 @@ def _migrate_analytics_file():
                 cartValue=_safe_float(row_map.get('cart_value'), None),
                 messageText=row_map.get('message_text')
             )
-            normalized = _normalize_event_fields(event_stub)
-            writer.writerow([
-                normalized['timestamp'],
-                normalized['session_id'],
-                normalized['user_id'],
-                normalized['session_duration'],
-                normalized['action'],
-                normalized['data'],
-                normalized['event_id'],
-                normalized['device_type'],
-                normalized['page'],
-                normalized['scene'],
-                normalized['product_id'],
-                normalized['order_total'],
-                normalized['cart_value'],
-                normalized['message_text']
-            ])
-
-
-def ensure_analytics_file():
-    """Create analytics CSV with headers if it doesn't exist"""
+            yield _normalize_event_fields(event_stub)
+
+
+def migrate_analytics_csv():
+    """
+    Import analytics.csv into the columnar store, once. The CSV is left in
+    place; a marker in ANALYTICS_DIR records the import. Returns the number
+    of events imported.
+    """
     ensure_data_dir()
-    if not os.path.exists(ANALYTICS_FILE):
-        with open(ANALYTICS_FILE, 'w', newline='') as f:
-            writer = csv.writer(f)
-            writer.writerow(ANALYTICS_HEADERS)
-        return
-    _migrate_analytics_file()
+    marker = os.path.join(ANALYTICS_DIR, '.migrated')
+    imported = 0
+    with file_lock(ANALYTICS_FILE):
+        if os.path.exists(marker):
+            return 0
+        if os.path.exists(ANALYTICS_FILE):
+            batch = []
+            for event in _legacy_analytics_events():
+                batch.append(event)
+                if len(batch) >= 10000:
+                    analytics_store.append(batch)
+                    imported += len(batch)
+                    batch = []
+            if batch:
+                analytics_store.append(batch)
+                imported += len(batch)
+        os.makedirs(ANALYTICS_DIR, exist_ok=True)
+        with open(marker, 'w') as f:
+            f.write(f"{datetime.now().isoformat()} imported {imported} events from analytics.csv\n")
+    return imported
+
+
+# Events live in day-partitioned columnar segments (see analytics_store). The
+# CSV import runs once at startup; events are then appended in batches by a
+# background flusher (see analytics_log), which also folds each batch into
+# the materialized summary (see analytics_summary)
+analytics_store = AnalyticsStore(ANALYTICS_DIR)
+migrate_analytics_csv()
+analytics_summary = AnalyticsSummary(ANALYTICS_SUMMARY_FILE, analytics_store)
+analytics_summary.load()
+analytics_log = AnalyticsLog(analytics_store, analytics_summary)
+
+
+@app.on_event("shutdown")
+def flush_analytics():
+    analytics_log.close()
 
 
 @app.post("/api/analytics")
 def track_event(event: AnalyticsEvent):
     """
-    Track a frontend event and append it to the CSV file.
+    Track a frontend event. It is buffered and written to the columnar
+    analytics store (data/analytics/) in batches; 503 (Retry-After) if the
+    buffer stays full.
 
     Request body: {
         "action": "navigate",
@@ -615,378 +601,179 @@ def track_event(event: AnalyticsEvent):
         "data": { "fromScene": "storeFront", "toScene": "storeP1", "timeInPreviousScene": 45 }
     }
     """
-    ensure_analytics_file()
-
-    normalized = _normalize_event_fields(event)
-
-    with open(ANALYTICS_FILE, 'a', newline='') as f:
-        writer = csv.writer(f)
-        writer.writerow([
-            normalized['timestamp'],
-            normalized['session_id'],
-            normalized['user_id'],
-            normalized['session_duration'],
-            normalized['action'],
-            normalized['data'],
-            normalized['event_id'],
-            normalized['device_type'],
-            normalized['page'],
-            normalized['scene'],
-            normalized['product_id'],
-            normalized['order_total'],
-            normalized['cart_value'],
-            normalized['message_text']
-        ])
+    try:
+        analytics_log.append([_normalize_event_fields(event)])
+    except AnalyticsBackpressure:
+        raise HTTPException(status_code=503, detail="Analytics busy, retry later", headers={"Retry-After": "1"})
 
     return {"success": True, "message": f"Tracked event: {event.action}"}
 
 
+# Limits for POST /api/analytics/batch (the byte limit applies after gunzip)
+MAX_ANALYTICS_BATCH_EVENTS = 1000
+MAX_ANALYTICS_BATCH_BYTES = 4 * 1024 * 1024
+
+
+def _decode_analytics_batch(body: bytes, content_encoding: str):
+    """Raw events of a JSON array or NDJSON body, gunzipped if needed"""
+    if content_encoding == 'gzip':
+        decompressor = zlib.decompressobj(16 + zlib.MAX_WBITS)
+        try:
+            body = decompressor.decompress(body, MAX_ANALYTICS_BATCH_BYTES + 1)
+        except zlib.error:
+            raise HTTPException(status_code=400, detail="Invalid gzip body")
+    elif content_encoding not in ('', 'identity'):
+        raise HTTPException(status_code=415, detail=f"Unsupported Content-Encoding: {content_encoding}")
+    if len(body) > MAX_ANALYTICS_BATCH_BYTES:
+        raise HTTPException(status_code=413, detail="Batch too large")
+
+    text = body.decode('utf-8', errors='replace').strip()
+    try:
+        if text.startswith('['):
+            return json.loads(text)
+        return [json.loads(line) for line in text.splitlines() if line.strip()]
+    except json.JSONDecodeError as e:
+        raise HTTPException(status_code=400, detail=f"Invalid JSON: {e}")
+
+
+@app.post("/api/analytics/batch")
+async def track_events_batch(request: Request):
+    """
+    Track several frontend events in one request.
+
+    Body: a JSON array of events (as for POST /api/analytics) or one event
+    per line (NDJSON), optionally with Content-Encoding: gzip. Valid events
+    are appended together; invalid ones are reported and skipped.
+
+    Response: { "accepted": 2, "rejected": 1, "results": [
+        { "index": 0, "accepted": true, "eventId": "evt_..." },
+        { "index": 1, "accepted": false, "error": "action: Field required" }, ...] }
+    """
+    if int(request.headers.get('content-length') or 0) > MAX_ANALYTICS_BATCH_BYTES:
+        raise HTTPException(status_code=413, detail="Batch too large")
+    body = await request.body()
+    raw_events = _decode_analytics_batch(body, request.headers.get('content-encoding', '').strip().lower())
+    if not isinstance(raw_events, list):
+        raise HTTPException(status_code=400, detail="Expected a JSON array or NDJSON")
+    if len(raw_events) > MAX_ANALYTICS_BATCH_EVENTS:
+        raise HTTPException(status_code=413, detail=f"At most {MAX_ANALYTICS_BATCH_EVENTS} events per batch")
+
+    rows = []
+    results = []
+    for index, raw in enumerate(raw_events):
+        try:
+            if not isinstance(raw, dict):
+                raise TypeError("event must be an object")
+            normalized = _normalize_event_fields(AnalyticsEvent(**raw))
+        except ValidationError as e:
+            error = e.errors()[0]
+            location = '.'.join(str(part) for part in error['loc'])
+            results.append({"index": index, "accepted": False, "error": f"{location}: {error['msg']}"})
+            continue
+        except TypeError as e:
+            results.append({"index": index, "accepted": False, "error": str(e)})
+            continue
+        rows.append(normalized)
+        results.append({"index": index, "accepted": True, "eventId": normalized['event_id']})
+
+    if rows:
+        try:
+            await run_in_threadpool(analytics_log.append, rows)
+        except AnalyticsBackpressure:
+            raise HTTPException(status_code=503, detail="Analytics busy, retry later", headers={"Retry-After": "1"})
+
+    return {
+        "success": True,
+        "accepted": len(rows),
+        "rejected": len(results) - len(rows),
+        "results": results
+    }
+
+
+def _analytics_range(start: Optional[str], end: Optional[str]):
+    """Validate optional YYYY-MM-DD query bounds"""
+    for value in (start, end):
+        if value:
+            try:
+                datetime.strptime(value, '%Y-%m-%d')
+            except ValueError:
+                raise HTTPException(status_code=400, detail=f"Invalid date: {value} (expected YYYY-MM-DD)")
+    return start or None, end or None
+
+
 @app.get("/api/analytics")
-def get_analytics():
-    """Get all analytics events"""
-    ensure_analytics_file()
+def get_analytics(start: Optional[str] = None, end: Optional[str] = None):
+    """Get analytics events, optionally only those from days start..end (YYYY-MM-DD)"""
+    start, end = _analytics_range(start, end)
+    analytics_log.flush()
 
     events = []
-    with open(ANALYTICS_FILE, 'r', newline='') as f:
-        reader = csv.DictReader(f)
-        for row in reader:
-            event = {
-                'timestamp': row.get('timestamp', ''),
-                'sessionId': row.get('session_id', ''),
-                'userId': row.get('user_id', ''),
-                'sessionDuration': int(row['session_duration']) if row.get('session_duration') else None,
-                'action': row.get('action', ''),
-                'data': json.loads(row['data']) if row.get('data') else None,
-                'eventId': row.get('event_id', ''),
-                'deviceType': row.get('device_type', ''),
-                'page': row.get('page', ''),
-                'scene': row.get('scene', ''),
-                'productId': row.get('product_id', ''),
-                'orderTotal': _safe_float(row.get('order_total'), None),
-                'cartValue': _safe_float(row.get('cart_value'), None),
-                'messageText': row.get('message_text', '')
-            }
-            events.append(event)
+    for row in analytics_store.rows(start=start, end=end):
+        event = {
+            'timestamp': row['timestamp'],
+            'sessionId': row['session_id'],
+            'userId': row['user_id'],
+            'sessionDuration': int(row['session_duration']) if row['session_duration'] is not None else None,
+            'action': row['action'],
+            'data': json.loads(row['data']) if row['data'] else None,
+            'eventId': row['event_id'],
+            'deviceType': row['device_type'],
+            'page': row['page'],
+            'scene': row['scene'],
+            'productId': row['product_id'],
+            'orderTotal': row['order_total'],
+            'cartValue': row['cart_value'],
+            'messageText': row['message_text']
+        }
+        events.append(event)
 
     return {"events": events, "count": len(events)}
 
 
-@app.get("/api/analytics/summary")
-def get_analytics_summary():
-    """Get aggregated analytics summary by session and user"""
-    ensure_analytics_file()
-
-    sessions = {}
-    users = {}
-    events_by_session = {}
-    session_start_times = {}
-    session_earliest = {}
-    session_last_action = {}
-    session_last_time = {}
-    session_actions = {}
-    session_scenes = {}
-    session_first_action_time = {}
-    funnel_sessions = {
-        'view_product': set(),
-        'add_to_cart': set(),
-        'start_checkout': set(),
-        'complete_checkout': set()
-    }
-    product_funnel = {}
-    transition_counts = {}
-    add_to_cart_time = {}
-    start_checkout_time = {}
-    complete_checkout_time = {}
-    peak_hours = {str(i): 0 for i in range(24)}
-    peak_days = {str(i): 0 for i in range(7)}
-    device_breakdown = {}
-    referrer_counts = {}
-    chat_intents = {}
+@app.get("/api/analytics/export")
+def export_analytics(start: Optional[str] = None, end: Optional[str] = None, columns: Optional[str] = None):
+    """
+    Download analytics events as CSV. Optional: start/end days (YYYY-MM-DD)
+    and columns (comma-separated subset of the CSV headers, in that order).
+    """
+    start, end = _analytics_range(start, end)
+    headers = [name.strip() for name in columns.split(',')] if columns else ANALYTICS_HEADERS
+    unknown = [name for name in headers if name not in ANALYTICS_HEADERS]
+    if unknown:
+        raise HTTPException(status_code=400, detail=f"Unknown columns: {', '.join(unknown)}")
+    analytics_log.flush()
+
+    values = analytics_store.scan(headers, start, end)
+    output = io.StringIO()
+    writer = csv.writer(output)
+    writer.writerow(headers)
+    writer.writerows(
+        ['' if value is None else value for value in row]
+        for row in zip(*(values[name] for name in headers))
+    )
+    filename = f"analytics_{start or 'all'}_{end or datetime.now().strftime('%Y-%m-%d')}.csv"
+    return Response(
+        output.getvalue(),
+        media_type='text/csv',
+        headers={'Content-Disposition': f'attachment; filename="{filename}"'}
+    )
 
-    with open(ANALYTICS_FILE, 'r', newline='') as f:
-        reader = csv.DictReader(f)
-        for row in reader:
-            session_id = row.get('session_id', '')
-            user_id = row.get('user_id', '')
-            action = row.get('action', '')
-            data = json.loads(row['data']) if row.get('data') else {}
-            timestamp = row.get('timestamp', '')
-            product_id = row.get('product_id') or data.get('productId') or data.get('hotspotId') or ''
-            scene = row.get('scene') or data.get('scene') or data.get('sceneId') or data.get('toScene') or ''
-            device_type = row.get('device_type') or _infer_device_type(data.get('userAgent', ''))
-            referrer = data.get('referrer') or row.get('page') or ''
-            message_text = row.get('message_text') or data.get('messageText') or data.get('message') or ''
-
-            def parse_ts(value):
-                if not value:
-                    return None
-                try:
-                    return datetime.fromisoformat(value.replace('Z', '+00:00'))
-                except ValueError:
-                    return None
-
-            ts = parse_ts(timestamp)
-
-            # Track sessions
-            if session_id:
-                if session_id not in sessions:
-                    sessions[session_id] = {
-                        'userId': user_id,
-                        'startTime': row.get('timestamp'),
-                        'actions': [],
-                        'scenes': {},
-                        'totalDuration': 0
-                    }
-                sessions[session_id]['actions'].append(action)
-                session_actions.setdefault(session_id, 0)
-                session_actions[session_id] += 1
-                if scene:
-                    session_scenes.setdefault(session_id, set())
-                    session_scenes[session_id].add(scene)
-
-                # Track time in scenes
-                if action == 'navigate' and 'timeInPreviousScene' in data:
-                    from_scene = data.get('fromScene', 'unknown')
-                    if from_scene not in sessions[session_id]['scenes']:
-                        sessions[session_id]['scenes'][from_scene] = 0
-                    sessions[session_id]['scenes'][from_scene] += data['timeInPreviousScene']
-
-                # Track session end
-                if action == 'session_end' and 'totalDuration' in data:
-                    sessions[session_id]['totalDuration'] = data['totalDuration']
-
-            # Track users
-            if user_id:
-                if user_id not in users:
-                    users[user_id] = {'sessions': [], 'totalActions': 0}
-                if session_id and session_id not in users[user_id]['sessions']:
-                    users[user_id]['sessions'].append(session_id)
-                users[user_id]['totalActions'] += 1
-
-            if session_id:
-                events_by_session.setdefault(session_id, []).append({
-                    'timestamp': timestamp,
-                    'ts': ts,
-                    'action': action,
-                    'data': data,
-                    'productId': product_id,
-                    'scene': scene
-                })
-                if ts:
-                    if session_id not in session_earliest or ts < session_earliest[session_id]:
-                        session_earliest[session_id] = ts
-                if action == 'session_start' and ts:
-                    if session_id not in session_start_times or ts < session_start_times[session_id]:
-                        session_start_times[session_id] = ts
-                if ts:
-                    if session_id not in session_last_time or ts > session_last_time[session_id]:
-                        session_last_time[session_id] = ts
-                        session_last_action[session_id] = action
-
-            if action in funnel_sessions and session_id:
-                funnel_sessions[action].add(session_id)
-
-            if product_id:
-                if product_id not in product_funnel:
-                    product_funnel[product_id] = {'productId': product_id, 'views': 0, 'addToCart': 0, 'startCheckout': 0, 'purchased': 0}
-                if action == 'view_product':
-                    product_funnel[product_id]['views'] += 1
-                if action == 'add_to_cart':
-                    product_funnel[product_id]['addToCart'] += 1
-                if action == 'start_checkout':
-                    product_funnel[product_id]['startCheckout'] += 1
-                if action == 'complete_checkout':
-                    product_funnel[product_id]['purchased'] += 1
-
-            if action == 'navigate':
-                from_scene = data.get('fromScene') or ''
-                to_scene = data.get('toScene') or ''
-                if from_scene and to_scene:
-                    key = f"{from_scene} -> {to_scene}"
-                    transition_counts[key] = transition_counts.get(key, 0) + 1
-
-            if ts and action == 'session_start':
-                peak_hours[str(ts.hour)] = peak_hours.get(str(ts.hour), 0) + 1
-                peak_days[str(ts.weekday())] = peak_days.get(str(ts.weekday()), 0) + 1
-
-            if action == 'session_start' and device_type:
-                device_breakdown[device_type] = device_breakdown.get(device_type, 0) + 1
-
-            if action == 'session_start' and referrer:
-                referrer_counts[referrer] = referrer_counts.get(referrer, 0) + 1
-
-            if action == 'send_chat_message' and message_text:
-                text = message_text.lower()
-                intent = 'other'
-                if any(k in text for k in ['price', 'cost', 'expensive', 'cheap', '$']):
-                    intent = 'pricing'
-                elif any(k in text for k in ['size', 'fit', 'dimension', 'measurement']):
-                    intent = 'sizing'
-                elif any(k in text for k in ['ship', 'delivery', 'arrive', 'track']):
-                    intent = 'shipping'
-                elif any(k in text for k in ['return', 'refund', 'exchange']):
-                    intent = 'returns'
-                elif any(k in text for k in ['stock', 'available', 'availability']):
-                    intent = 'availability'
-                elif any(k in text for k in ['material', 'fabric', 'color']):
-                    intent = 'product_details'
-                chat_intents[intent] = chat_intents.get(intent, 0) + 1
-
-            if action == 'add_to_cart' and session_id and ts:
-                if session_id not in add_to_cart_time:
-                    add_to_cart_time[session_id] = ts
-            if action == 'start_checkout' and session_id and ts:
-                if session_id not in start_checkout_time:
-                    start_checkout_time[session_id] = ts
-            if action == 'complete_checkout' and session_id and ts:
-                if session_id not in complete_checkout_time:
-                    complete_checkout_time[session_id] = ts
-
-            if session_id and action != 'session_start' and ts:
-                if session_id not in session_first_action_time:
-                    session_first_action_time[session_id] = ts
-
-    time_to_first = []
-    for session_id, first_action_ts in session_first_action_time.items():
-        start_ts = session_start_times.get(session_id) or session_earliest.get(session_id)
-        if start_ts and first_action_ts:
-            delta = (first_action_ts - start_ts).total_seconds()
-            if delta >= 0:
-                time_to_first.append(delta)
-
-    time_to_checkout = []
-    time_to_purchase = []
-    for session_id, add_ts in add_to_cart_time.items():
-        start_ts = start_checkout_time.get(session_id)
-        if add_ts and start_ts:
-            delta = (start_ts - add_ts).total_seconds()
-            if delta >= 0:
-                time_to_checkout.append(delta)
-    for session_id, start_ts in start_checkout_time.items():
-        complete_ts = complete_checkout_time.get(session_id)
-        if start_ts and complete_ts:
-            delta = (complete_ts - start_ts).total_seconds()
-            if delta >= 0:
-                time_to_purchase.append(delta)
-
-    def _avg(values):
-        return round(sum(values) / len(values), 2) if values else 0
-
-    def _median(values):
-        if not values:
-            return 0
-        vals = sorted(values)
-        mid = len(vals) // 2
-        if len(vals) % 2 == 0:
-            return round((vals[mid - 1] + vals[mid]) / 2, 2)
-        return round(vals[mid], 2)
-
-    def _p90(values):
-        if not values:
-            return 0
-        vals = sorted(values)
-        idx = int(len(vals) * 0.9) - 1
-        idx = max(min(idx, len(vals) - 1), 0)
-        return round(vals[idx], 2)
-
-    actions_per_session = [count for count in session_actions.values()]
-    scenes_per_session = [len(scenes) for scenes in session_scenes.values()]
-
-    drop_offs = {}
-    for action in session_last_action.values():
-        drop_offs[action] = drop_offs.get(action, 0) + 1
-
-    top_transitions = sorted(
-        [{'path': k, 'count': v} for k, v in transition_counts.items()],
-        key=lambda x: x['count'],
-        reverse=True
-    )[:10]
-
-    top_products = sorted(
-        product_funnel.values(),
-        key=lambda x: x['views'],
-        reverse=True
-    )[:10]
-
-    user_session_counts = [len(user['sessions']) for user in users.values()]
-    returning_users = len([count for count in user_session_counts if count > 1])
-    total_users = len(users)
-    return_rate = round((returning_users / total_users) * 100, 2) if total_users else 0
-
-    insights = {
-        'funnel': {
-            'viewProductSessions': len(funnel_sessions['view_product']),
-            'addToCartSessions': len(funnel_sessions['add_to_cart']),
-            'startCheckoutSessions': len(funnel_sessions['start_checkout']),
-            'completeCheckoutSessions': len(funnel_sessions['complete_checkout'])
-        },
-        'dropOffs': sorted(
-            [{'action': k, 'count': v} for k, v in drop_offs.items()],
-            key=lambda x: x['count'],
-            reverse=True
-        )[:10],
-        'sceneTransitions': top_transitions,
-        'timeToFirstAction': {
-            'averageSeconds': _avg(time_to_first),
-            'medianSeconds': _median(time_to_first),
-            'p90Seconds': _p90(time_to_first)
-        },
-        'timeToCheckout': {
-            'addToCheckoutAvgSeconds': _avg(time_to_checkout),
-            'checkoutToPurchaseAvgSeconds': _avg(time_to_purchase)
-        },
-        'cartAbandonment': {
-            'startCheckoutSessions': len(start_checkout_time),
-            'completeCheckoutSessions': len(complete_checkout_time),
-            'abandonmentRate': round(
-                (1 - (len(complete_checkout_time) / len(start_checkout_time))) * 100, 2
-            ) if start_checkout_time else 0
-        },
-        'engagement': {
-            'actionsPerSessionAvg': _avg(actions_per_session),
-            'actionsPerSessionMedian': _median(actions_per_session),
-            'actionsPerSessionP90': _p90(actions_per_session),
-            'scenesPerSessionAvg': _avg(scenes_per_session),
-            'scenesPerSessionMedian': _median(scenes_per_session),
-            'scenesPerSessionP90': _p90(scenes_per_session)
-        },
-        'peakHours': peak_hours,
-        'peakDays': peak_days,
-        'repeatUsers': {
-            'returningUsers': returning_users,
-            'returnRate': return_rate,
-            'avgSessionsPerUser': _avg(user_session_counts)
-        },
-        'topChatIntents': sorted(
-            [{'intent': k, 'count': v} for k, v in chat_intents.items()],
-            key=lambda x: x['count'],
-            reverse=True
-        )[:8],
-        'topReferrers': sorted(
-            [{'referrer': k, 'count': v} for k, v in referrer_counts.items()],
-            key=lambda x: x['count'],
-            reverse=True
-        )[:8],
-        'deviceBreakdown': device_breakdown,
-        'productFunnel': top_products
-    }
 
-    return {
-        'sessions': sessions,
-        'users': users,
-        'totalSessions': len(sessions),
-        'totalUsers': len(users),
-        'insights': insights
-    }
+@app.get("/api/analytics/summary")
+def get_analytics_summary(request: Request):
+    """
+    Get aggregated analytics summary by session and user (ETag / If-None-Match
+    aware). Events still buffered are included by the next background flush.
+    """
+    return response_cache.respond(
+        request, 'analytics_summary', analytics_summary.version(), analytics_summary.get
+    )
 
 
 @app.delete("/api/analytics")
 def clear_analytics():
     """Clear all analytics data"""
-    ensure_analytics_file()
-    with open(ANALYTICS_FILE, 'w', newline='') as f:
-        writer = csv.writer(f)
-        writer.writerow(ANALYTICS_HEADERS)
+    analytics_log.reset()
     return {"success": True, "message": "Analytics data cleared"}
 
 
@@ -0,0 +1,453 @@
+"""
+Storage backends for the admin API's hotspots and scene overrides.
+
+admin_endpoints talks to one of two interchangeable backends, selected with
+SHOPIVERSE_STORAGE:
+
+    sqlite  (default) data/admin.sqlite3 in WAL mode, with tables for scene
+            overrides, hotspots and hotspot images. Every endpoint runs in one
+            transaction (writes take the write lock up front with BEGIN
+            IMMEDIATE), so several uvicorn workers stay consistent. On first
+            use the existing hotspots.json (plus journal) and scenes.json are
+            imported once.
+    json    the original files: HotspotRepository for hotspots and a
+            JsonDocumentStore for scenes.json.
+
+Both expose the same methods. Hotspot methods raise KeyError for unknown
+hotspots and IndexError for image indexes out of range, without writing.
+Returned documents must be treated as read-only. hotspots_version() and
+scenes_version() return opaque strings that change whenever the respective
+data is saved, by any worker; they are cheap enough to call per request.
+"""
+
+import copy
+import json
+import os
+import sqlite3
+import threading
+import uuid
+from contextlib import contextmanager
+
+from hotspot_repository import HotspotRepository
+from json_store import JsonDocumentStore, stat_signature
+
+STORAGE_BACKENDS = ("sqlite", "json")
+DEFAULT_STORAGE = os.environ.get("SHOPIVERSE_STORAGE", "sqlite")
+
+# Seconds a writer waits for another worker's transaction before failing
+SQLITE_BUSY_TIMEOUT = 10.0
+
+
+class JsonStorage:
+    """Hotspots and scene overrides in hotspots.json and scenes.json."""
+
+    def __init__(self, hotspots_path: str, scenes_path: str, default_hotspots: dict):
+        self.hotspots = HotspotRepository(hotspots_path, default=default_hotspots)
+        self.scenes = JsonDocumentStore(scenes_path, default={})
+
+    # ---- hotspots ----
+
+    def all_hotspots(self) -> dict:
+        return self.hotspots.all()
+
+    def scene_hotspots(self, scene_id: str) -> list:
+        return self.hotspots.scene(scene_id)
+
+    def get_hotspot(self, scene_id: str, hotspot_id: str):
+        return self.hotspots.get(scene_id, hotspot_id)
+
+    def set_scene_hotspots(self, scene_id: str, hotspots: list):
+        self.hotspots.set_scene(scene_id, hotspots)
+
+    def patch_hotspot(self, scene_id: str, hotspot_id: str, fields: dict):
+        self.hotspots.patch(scene_id, hotspot_id, fields)
+
+    def set_hotspot_images(self, scene_id: str, hotspot_id: str, images: list):
+        self.hotspots.set_images(scene_id, hotspot_id, images)
+
+    def add_hotspot_image(self, scene_id: str, hotspot_id: str, image: str):
+        self.hotspots.add_image(scene_id, hotspot_id, image)
+
+    def remove_hotspot_image(self, scene_id: str, hotspot_id: str, index: int):
+        return self.hotspots.remove_image(scene_id, hotspot_id, index)
+
+    def reset_hotspots(self, document: dict):
+        self.hotspots.reset(document)
+
+    def hotspots_version(self) -> str:
+        return self.hotspots.version()
+
+    # ---- scene overrides ----
+
+    def all_scenes(self) -> dict:
+        return self.scenes.get()
+
+    def get_scene(self, scene_id: str) -> dict:
+        return self.scenes.get().get(scene_id, {})
+
+    def update_scene(self, scene_id: str, apply) -> dict:
+        """Run apply(override) on a scene's override (created if missing); returns it."""
+
+        def update(overrides):
+            current = overrides.setdefault(scene_id, {})
+            apply(current)
+            return current
+
+        return self.scenes.update(update)
+
+    def delete_scene(self, scene_id: str):
+        if scene_id in self.scenes.get():
+            self.scenes.update(lambda overrides: overrides.pop(scene_id, None))
+
+    def replace_scenes(self, document: dict):
+        self.scenes.replace(document)
+
+    def scenes_version(self) -> str:
+        return str(stat_signature(self.scenes.path))
+
+
+SQLITE_SCHEMA = """
+CREATE TABLE IF NOT EXISTS meta (
+    key TEXT PRIMARY KEY,
+    value TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS scenes (
+    scene_id TEXT PRIMARY KEY,
+    position INTEGER NOT NULL,
+    override TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS hotspot_scenes (
+    scene_id TEXT PRIMARY KEY,
+    position INTEGER NOT NULL
+);
+CREATE TABLE IF NOT EXISTS hotspots (
+    id INTEGER PRIMARY KEY,
+    scene_id TEXT NOT NULL REFERENCES hotspot_scenes (scene_id) ON DELETE CASCADE,
+    position INTEGER NOT NULL,
+    hotspot_id TEXT,
+    data TEXT NOT NULL,
+    has_images INTEGER NOT NULL DEFAULT 0
+);
+CREATE INDEX IF NOT EXISTS hotspots_by_scene ON hotspots (scene_id, position);
+CREATE INDEX IF NOT EXISTS hotspots_by_id ON hotspots (scene_id, hotspot_id);
+CREATE TABLE IF NOT EXISTS hotspot_images (
+    hotspot INTEGER NOT NULL REFERENCES hotspots (id) ON DELETE CASCADE,
+    position INTEGER NOT NULL,
+    url TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS hotspot_images_by_hotspot ON hotspot_images (hotspot, position);
+"""
+
+
+class SqliteStorage:
+    """Hotspots and scene overrides in an SQLite database (WAL mode)."""
+
+    def __init__(
+        self, path: str, hotspots_path: str, scenes_path: str, default_hotspots: dict
+    ):
+        self.path = path
+        self._local = threading.local()
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        connection = self._connection()
+        connection.execute("PRAGMA journal_mode=WAL")
+        with self._write() as db:
+            for statement in SQLITE_SCHEMA.split(";"):
+                if statement.strip():
+                    db.execute(statement)
+            # Versions are qualified by a per-database id, so recreating the
+            # database never repeats an earlier version string
+            db.execute(
+                "INSERT OR IGNORE INTO meta (key, value) VALUES ('instance', ?)",
+                (uuid.uuid4().hex,),
+            )
+            if db.execute("SELECT 1 FROM meta WHERE key = 'imported'").fetchone() is None:
+                self._import_json(db, hotspots_path, scenes_path, default_hotspots)
+
+    def _connection(self) -> sqlite3.Connection:
+        connection = getattr(self._local, "connection", None)
+        if connection is None:
+            connection = sqlite3.connect(
+                self.path, timeout=SQLITE_BUSY_TIMEOUT, isolation_level=None
+            )
+            connection.execute("PRAGMA foreign_keys=ON")
+            connection.execute("PRAGMA synchronous=NORMAL")
+            self._local.connection = connection
+        return connection
+
+    @contextmanager
+    def _transaction(self, mode: str):
+        db = self._connection()
+        db.execute(f"BEGIN {mode}")
+        try:
+            yield db
+        except BaseException:
+            db.execute("ROLLBACK")
+            raise
+        db.execute("COMMIT")
+
+    def _read(self):
+        """A read transaction: one consistent snapshot across several queries."""
+        return self._transaction("DEFERRED")
+
+    def _write(self):
+        """A write transaction holding the database write lock from the start."""
+        return self._transaction("IMMEDIATE")
+
+    def _bump(self, db, name: str):
+        """Advance the version counter name inside the current write."""
+        db.execute(
+            "INSERT INTO meta (key, value) VALUES (?, '1')"
+            " ON CONFLICT (key) DO UPDATE SET value = CAST(value AS INTEGER) + 1",
+            (name,),
+        )
+
+    def _version(self, name: str) -> str:
+        rows = dict(
+            self._connection().execute(
+                "SELECT key, value FROM meta WHERE key IN ('instance', ?)", (name,)
+            )
+        )
+        return f"{rows.get('instance', '')}.{rows.get(name, '0')}"
+
+    def _import_json(self, db, hotspots_path, scenes_path, default_hotspots):
+        """One-time import of the JSON backend's data into empty tables."""
+        hotspots = JsonStorage(hotspots_path, scenes_path, default_hotspots)
+        self._insert_hotspot_document(db, hotspots.all_hotspots())
+        for position, (scene_id, override) in enumerate(hotspots.all_scenes().items()):
+            db.execute(
+                "INSERT INTO scenes (scene_id, position, override) VALUES (?, ?, ?)",
+                (scene_id, position, json.dumps(override or {})),
+            )
+        db.execute("INSERT INTO meta (key, value) VALUES ('imported', '1')")
+
+    # ---- hotspots ----
+
+    def _insert_hotspots(self, db, scene_id: str, hotspots: list):
+        for position, hotspot in enumerate(hotspots):
+            record = dict(hotspot)
+            images = record.pop("images", None)
+            cursor = db.execute(
+                "INSERT INTO hotspots (scene_id, position, hotspot_id, data, has_images)"
+                " VALUES (?, ?, ?, ?, ?)",
+                (scene_id, position, record.get("id"), json.dumps(record), images is not None),
+            )
+            if images:
+                self._insert_images(db, cursor.lastrowid, images)
+
+    def _insert_images(self, db, hotspot: int, images: list, start: int = 0):
+        db.executemany(
+            "INSERT INTO hotspot_images (hotspot, position, url) VALUES (?, ?, ?)",
+            [(hotspot, start + i, url) for i, url in enumerate(images)],
+        )
+
+    def _insert_hotspot_document(self, db, document: dict):
+        for position, (scene_id, hotspots) in enumerate(document.items()):
+            db.execute(
+                "INSERT INTO hotspot_scenes (scene_id, position) VALUES (?, ?)",
+                (scene_id, position),
+            )
+            self._insert_hotspots(db, scene_id, hotspots)
+
+    def _hotspot_rows(self, db, where: str = "", params=()) -> list:
+        """(scene_id, record) of the hotspots matching where (on alias h), in order."""
+        rows = db.execute(
+            "SELECT h.id, h.scene_id, h.data, h.has_images FROM hotspots h"
+            f" {where} ORDER BY h.scene_id, h.position",
+            params,
+        ).fetchall()
+        images = {row[0]: [] for row in rows if row[3]}
+        if images:
+            for hotspot, url in db.execute(
+                "SELECT i.hotspot, i.url FROM hotspot_images i JOIN hotspots h ON h.id = i.hotspot"
+                f" {where} ORDER BY i.hotspot, i.position",
+                params,
+            ):
+                images[hotspot].append(url)
+
+        records = []
+        for hotspot, scene_id, data, has_images in rows:
+            record = json.loads(data)
+            if has_images:
+                record["images"] = images[hotspot]
+            records.append((scene_id, record))
+        return records
+
+    def _find(self, db, scene_id: str, hotspot_id: str):
+        row = db.execute(
+            "SELECT id, data FROM hotspots WHERE scene_id = ? AND hotspot_id = ?"
+            " ORDER BY position LIMIT 1",
+            (scene_id, hotspot_id),
+        ).fetchone()
+        if row is None:
+            raise KeyError(hotspot_id)
+        return row[0], json.loads(row[1])
+
+    def all_hotspots(self) -> dict:
+        with self._read() as db:
+            document = {
+                scene_id: []
+                for (scene_id,) in db.execute(
+                    "SELECT scene_id FROM hotspot_scenes ORDER BY position"
+                )
+            }
+            for scene_id, record in self._hotspot_rows(db):
+                document.setdefault(scene_id, []).append(record)
+        return document
+
+    def scene_hotspots(self, scene_id: str) -> list:
+        with self._read() as db:
+            return [record for _, record in self._hotspot_rows(db, "WHERE h.scene_id = ?", (scene_id,))]
+
+    def get_hotspot(self, scene_id: str, hotspot_id: str):
+        with self._read() as db:
+            try:
+                hotspot, _ = self._find(db, scene_id, hotspot_id)
+            except KeyError:
+                return None
+            return self._hotspot_rows(db, "WHERE h.id = ?", (hotspot,))[0][1]
+
+    def set_scene_hotspots(self, scene_id: str, hotspots: list):
+        with self._write() as db:
+            self._bump(db, "hotspots_version")
+            db.execute("DELETE FROM hotspots WHERE scene_id = ?", (scene_id,))
+            db.execute(
+                "INSERT OR IGNORE INTO hotspot_scenes (scene_id, position)"
+                " SELECT ?, COALESCE(MAX(position) + 1, 0) FROM hotspot_scenes",
+                (scene_id,),
+            )
+            self._insert_hotspots(db, scene_id, hotspots)
+
+    def patch_hotspot(self, scene_id: str, hotspot_id: str, fields: dict):
+        with self._write() as db:
+            self._bump(db, "hotspots_version")
+            hotspot, record = self._find(db, scene_id, hotspot_id)
+            fields = dict(fields)
+            images = fields.pop("images", None)
+            record.update(fields)
+            db.execute(
+                "UPDATE hotspots SET hotspot_id = ?, data = ? WHERE id = ?",
+                (record.get("id"), json.dumps(record), hotspot),
+            )
+            if images is not None:
+                self._replace_images(db, hotspot, images)
+
+    def _replace_images(self, db, hotspot: int, images: list):
+        db.execute("DELETE FROM hotspot_images WHERE hotspot = ?", (hotspot,))
+        db.execute("UPDATE hotspots SET has_images = 1 WHERE id = ?", (hotspot,))
+        self._insert_images(db, hotspot, images)
+
+    def set_hotspot_images(self, scene_id: str, hotspot_id: str, images: list):
+        with self._write() as db:
+            self._bump(db, "hotspots_version")
+            hotspot, _ = self._find(db, scene_id, hotspot_id)
+            self._replace_images(db, hotspot, images)
+
+    def add_hotspot_image(self, scene_id: str, hotspot_id: str, image: str):
+        with self._write() as db:
+            self._bump(db, "hotspots_version")
+            hotspot, _ = self._find(db, scene_id, hotspot_id)
+            (count,) = db.execute(
+                "SELECT COUNT(*) FROM hotspot_images WHERE hotspot = ?", (hotspot,)
+            ).fetchone()
+            db.execute("UPDATE hotspots SET has_images = 1 WHERE id = ?", (hotspot,))
+            self._insert_images(db, hotspot, [image], start=count)
+
+    def remove_hotspot_image(self, scene_id: str, hotspot_id: str, index: int):
+        with self._write() as db:
+            self._bump(db, "hotspots_version")
+            hotspot, _ = self._find(db, scene_id, hotspot_id)
+            row = db.execute(
+                "SELECT url FROM hotspot_images WHERE hotspot = ? AND position = ?",
+                (hotspot, index),
+            ).fetchone()
+            if index < 0 or row is None:
+                raise IndexError(index)
+            db.execute(
+                "DELETE FROM hotspot_images WHERE hotspot = ? AND position = ?", (hotspot, index)
+            )
+            db.execute(
+                "UPDATE hotspot_images SET position = position - 1"
+                " WHERE hotspot = ? AND position > ?",
+                (hotspot, index),
+            )
+            return row[0]
+
+    def reset_hotspots(self, document: dict):
+        with self._write() as db:
+            self._bump(db, "hotspots_version")
+            db.execute("DELETE FROM hotspot_scenes")
+            self._insert_hotspot_document(db, document)
+
+    def hotspots_version(self) -> str:
+        return self._version("hotspots_version")
+
+    # ---- scene overrides ----
+
+    def all_scenes(self) -> dict:
+        with self._read() as db:
+            return {
+                scene_id: json.loads(override)
+                for scene_id, override in db.execute(
+                    "SELECT scene_id, override FROM scenes ORDER BY position"
+                )
+            }
+
+    def get_scene(self, scene_id: str) -> dict:
+        with self._read() as db:
+            row = db.execute(
+                "SELECT override FROM scenes WHERE scene_id = ?", (scene_id,)
+            ).fetchone()
+        return json.loads(row[0]) if row is not None else {}
+
+    def update_scene(self, scene_id: str, apply) -> dict:
+        """Run apply(override) on a scene's override (created if missing); returns it."""
+        with self._write() as db:
+            self._bump(db, "scenes_version")
+            row = db.execute(
+                "SELECT override FROM scenes WHERE scene_id = ?", (scene_id,)
+            ).fetchone()
+            current = json.loads(row[0]) if row is not None else {}
+            apply(current)
+            if row is None:
+                db.execute(
+                    "INSERT INTO scenes (scene_id, position, override)"
+                    " SELECT ?, COALESCE(MAX(position) + 1, 0), ? FROM scenes",
+                    (scene_id, json.dumps(current)),
+                )
+            else:
+                db.execute(
+                    "UPDATE scenes SET override = ? WHERE scene_id = ?",
+                    (json.dumps(current), scene_id),
+                )
+        return current
+
+    def delete_scene(self, scene_id: str):
+        with self._write() as db:
+            self._bump(db, "scenes_version")
+            db.execute("DELETE FROM scenes WHERE scene_id = ?", (scene_id,))
+
+    def replace_scenes(self, document: dict):
+        with self._write() as db:
+            self._bump(db, "scenes_version")
+            db.execute("DELETE FROM scenes")
+            for position, (scene_id, override) in enumerate(copy.deepcopy(document).items()):
+                db.execute(
+                    "INSERT INTO scenes (scene_id, position, override) VALUES (?, ?, ?)",
+                    (scene_id, position, json.dumps(override or {})),
+                )
+
+    def scenes_version(self) -> str:
+        return self._version("scenes_version")
+
+
+def open_storage(kind: str, data_dir: str, default_hotspots: dict):
+    """Open the storage backend named kind (one of STORAGE_BACKENDS) in data_dir."""
+    hotspots_path = os.path.join(data_dir, "hotspots.json")
+    scenes_path = os.path.join(data_dir, "scenes.json")
+    if kind == "json":
+        return JsonStorage(hotspots_path, scenes_path, default_hotspots)
+    if kind == "sqlite":
+        return SqliteStorage(
+            os.path.join(data_dir, "admin.sqlite3"), hotspots_path, scenes_path, default_hotspots
+        )
+    raise ValueError(f"Unknown storage backend {kind!r}, expected one of {', '.join(STORAGE_BACKENDS)}")
@@ -0,0 +1,169 @@
+"""
+Buffered, batched appends to the analytics store.
+
+track_event used to open analytics.csv and write one row per request.
+AnalyticsLog instead queues events in a bounded in-memory buffer and a
+background thread hands them to the store in batches - once BATCH_EVENTS
+events are waiting or FLUSH_INTERVAL seconds have passed - so each batch
+costs one segment write and fsync per day it covers. Enqueueing is O(1) no
+matter how large the log is. When the buffer is full, append() waits up to
+ENQUEUE_TIMEOUT for the flusher to make room and then raises
+AnalyticsBackpressure, so callers can shed load (the endpoint answers 503
+with Retry-After) instead of growing memory without bound.
+
+Readers call flush() first so they see every event accepted so far.
+"""
+
+import os
+import threading
+import time
+import traceback
+from collections import deque
+
+# Events held in memory before append() applies backpressure
+BUFFER_EVENTS = int(os.environ.get("SHOPIVERSE_ANALYTICS_BUFFER", 10000))
+# Events that trigger a flush before FLUSH_INTERVAL elapses
+BATCH_EVENTS = 500
+# Seconds buffered events may wait before being written
+FLUSH_INTERVAL = 1.0
+# Seconds append() waits for room in a full buffer
+ENQUEUE_TIMEOUT = 2.0
+
+
+class AnalyticsBackpressure(RuntimeError):
+    """The buffer stayed full for ENQUEUE_TIMEOUT seconds."""
+
+
+class AnalyticsLog:
+    """
+    Append-only event log fed through a bounded buffer. store needs
+    append(events) and clear() (see analytics_store.AnalyticsStore); the
+    optional summary apply(events), invalidate() and reset() (see
+    analytics_summary).
+
+        log = AnalyticsLog(store, summary)
+        log.append([event, ...])   # normalized event dicts; returns immediately
+        log.flush()                # write everything buffered (readers)
+        log.close()                # on shutdown
+    """
+
+    def __init__(
+        self,
+        store,
+        summary=None,
+        capacity: int = BUFFER_EVENTS,
+        batch_events: int = BATCH_EVENTS,
+        flush_interval: float = FLUSH_INTERVAL,
+    ):
+        self.store = store
+        self.summary = summary
+        self.capacity = capacity
+        self.batch_events = batch_events
+        self.flush_interval = flush_interval
+        self._events = deque()
+        self._condition = threading.Condition()
+        self._write_lock = threading.Lock()  # one batch (or reset) at a time
+        self._thread = None
+        self._closed = False
+        self._blocked = 0  # appenders waiting for room
+
+    def __len__(self):
+        return len(self._events)
+
+    def _start(self):
+        """Start the flusher thread (condition held)."""
+        if self._thread is None or not self._thread.is_alive():
+            self._closed = False
+            self._thread = threading.Thread(target=self._run, name="analytics-flush", daemon=True)
+            self._thread.start()
+
+    def append(self, events: list, timeout: float = ENQUEUE_TIMEOUT):
+        """Queue events for writing, waiting up to timeout for buffer space."""
+        if len(events) > self.capacity:
+            raise ValueError(f"At most {self.capacity} events can be queued at once")
+        deadline = time.monotonic() + timeout
+        with self._condition:
+            self._start()
+            while len(self._events) + len(events) > self.capacity:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    raise AnalyticsBackpressure("Analytics buffer is full")
+                self._blocked += 1
+                self._condition.notify_all()  # wake the flusher early
+                try:
+                    self._condition.wait(remaining)
+                finally:
+                    self._blocked -= 1
+            self._events.extend(events)
+            if len(self._events) >= self.batch_events:
+                self._condition.notify_all()
+
+    def _drain(self) -> list:
+        with self._condition:
+            events = list(self._events)
+            self._events.clear()
+            self._condition.notify_all()  # room for blocked writers
+        return events
+
+    def flush(self):
+        """
+        Write every buffered event now. Events are re-queued if the write
+        fails; if only the summary update fails, the summary is marked stale
+        and rebuilt from the store on its next use.
+        """
+        with self._write_lock:
+            events = self._drain()
+            if not events:
+                return
+            try:
+                self.store.append(events)
+            except BaseException:
+                with self._condition:
+                    self._events.extendleft(reversed(events))
+                raise
+            if self.summary is not None:
+                try:
+                    self.summary.apply(events)
+                except Exception:
+                    print("Analytics summary update failed; it will be rebuilt")
+                    traceback.print_exc()
+                    self.summary.invalidate()
+
+    def reset(self):
+        """Discard buffered events and clear the store."""
+        with self._write_lock:
+            self._drain()
+            self.store.clear()
+            if self.summary is not None:
+                self.summary.reset()
+
+    def _run(self):
+        while True:
+            with self._condition:
+                self._condition.wait_for(
+                    lambda: self._closed
+                    or self._blocked
+                    or len(self._events) >= self.batch_events,
+                    timeout=self.flush_interval,
+                )
+                closed = self._closed
+            try:
+                self.flush()
+            except Exception:
+                print("Analytics flush failed")
+                traceback.print_exc()
+                if not closed:
+                    time.sleep(self.flush_interval)
+                    continue
+            if closed:
+                return
+
+    def close(self):
+        """Stop the flusher after writing what is buffered."""
+        with self._condition:
+            self._closed = True
+            self._condition.notify_all()
+            thread = self._thread
+        if thread is not None:
+            thread.join()
+        self.flush()
@@ -0,0 +1,323 @@
+"""
+Columnar, day-partitioned storage for analytics events.
+
+analytics.csv kept every event in one growing file with the event data as a
+JSON string, so every read re-parsed the whole history. AnalyticsStore keeps
+events under data/analytics/<YYYY-MM-DD>/ (by event timestamp; events
+without one go to "undated") as NumPy .npz segments, one per flushed batch:
+
+    text    variable-length UTF-8: <col>.offsets (int64) + <col>.bytes (uint8)
+    dict    dictionary-encoded: <col>.codes (smallest uint) + the distinct
+            values as a text column <col>.values
+    float   float64, NaN for missing
+
+Readers name the columns and the day range they need; only those
+partitions are listed and only those arrays are read from each segment
+(.npz members load lazily). Once a day holds COMPACT_SEGMENTS segments they
+are merged into one. The merged segment lists the segments it replaces, so
+a crash between writing it and deleting them never double counts.
+
+Writes, compaction and segment listing share one advisory file lock
+(data/analytics.lock); reading the arrays happens outside it.
+
+    python analytics_store.py migrate           # import data/analytics.csv
+    python analytics_store.py info
+"""
+
+import os
+import re
+import tempfile
+import time
+from datetime import date
+
+import numpy as np
+from json_store import file_lock
+
+# Column name -> storage kind, in CSV column order
+ANALYTICS_COLUMNS = {
+    "timestamp": "text",
+    "session_id": "dict",
+    "user_id": "dict",
+    "session_duration": "float",
+    "action": "dict",
+    "data": "text",
+    "event_id": "text",
+    "device_type": "dict",
+    "page": "dict",
+    "scene": "dict",
+    "product_id": "dict",
+    "order_total": "float",
+    "cart_value": "float",
+    "message_text": "text",
+}
+
+UNDATED_PARTITION = "undated"
+
+# Segments per day partition that trigger a merge
+COMPACT_SEGMENTS = 64
+
+_DAY_PATTERN = re.compile(r"^\d{4}-\d{2}-\d{2}$")
+_REPLACES = "_replaces"
+
+
+def partition_of(timestamp) -> str:
+    """The day partition (YYYY-MM-DD) of an ISO timestamp."""
+    day = str(timestamp or "")[:10]
+    try:
+        date.fromisoformat(day)
+    except ValueError:
+        return UNDATED_PARTITION
+    return day
+
+
+# ---- column encoding ----
+
+
+def _encode_text(arrays: dict, name: str, values):
+    encoded = [("" if value is None else str(value)).encode("utf-8") for value in values]
+    offsets = np.zeros(len(encoded) + 1, dtype=np.int64)
+    np.cumsum([len(value) for value in encoded], out=offsets[1:])
+    arrays[name + ".offsets"] = offsets
+    arrays[name + ".bytes"] = np.frombuffer(b"".join(encoded), dtype=np.uint8)
+
+
+def _decode_text(segment, name: str) -> list:
+    offsets = segment[name + ".offsets"].tolist()
+    raw = segment[name + ".bytes"].tobytes()
+    return [raw[start:end].decode("utf-8") for start, end in zip(offsets, offsets[1:])]
+
+
+def _encode_dict(arrays: dict, name: str, values):
+    lookup = {}
+    codes = [lookup.setdefault("" if value is None else str(value), len(lookup)) for value in values]
+    dtype = np.uint8 if len(lookup) <= 0xFF else np.uint16 if len(lookup) <= 0xFFFF else np.uint32
+    arrays[name + ".codes"] = np.asarray(codes, dtype=dtype)
+    _encode_text(arrays, name + ".values", lookup)
+
+
+def _decode_dict(segment, name: str) -> list:
+    values = _decode_text(segment, name + ".values")
+    return [values[code] for code in segment[name + ".codes"].tolist()]
+
+
+def _to_float(value) -> float:
+    try:
+        return float(value) if value not in (None, "") else np.nan
+    except (TypeError, ValueError):
+        return np.nan
+
+
+def _encode_float(arrays: dict, name: str, values):
+    arrays[name] = np.asarray([_to_float(value) for value in values], dtype=np.float64)
+
+
+def _decode_float(segment, name: str) -> list:
+    return [None if value != value else value for value in segment[name].tolist()]
+
+
+_ENCODERS = {"text": _encode_text, "dict": _encode_dict, "float": _encode_float}
+_DECODERS = {"text": _decode_text, "dict": _decode_dict, "float": _decode_float}
+
+
+def encode_segment(records: list) -> dict:
+    """Arrays of a segment holding records (dicts keyed by ANALYTICS_COLUMNS)."""
+    arrays = {"rows": np.asarray([len(records)], dtype=np.int64)}
+    for name, kind in ANALYTICS_COLUMNS.items():
+        _ENCODERS[kind](arrays, name, [record.get(name) for record in records])
+    return arrays
+
+
+def decode_column(segment, name: str) -> list:
+    """One column of an open segment as Python values (floats may be None)."""
+    return _DECODERS[ANALYTICS_COLUMNS[name]](segment, name)
+
+
+# ---- store ----
+
+
+class AnalyticsStore:
+    """Analytics events in day-partitioned columnar segments under root."""
+
+    def __init__(self, root: str):
+        self.root = root
+        self._sequence = 0
+
+    def _partition_dir(self, partition: str) -> str:
+        return os.path.join(self.root, partition)
+
+    def partitions(self, start: str = None, end: str = None) -> list:
+        """Partition names, oldest first; start/end (inclusive days) skip "undated"."""
+        try:
+            names = sorted(os.listdir(self.root))
+        except FileNotFoundError:
+            return []
+        partitions = []
+        for name in names:
+            if _DAY_PATTERN.match(name):
+                if (start and name < start) or (end and name > end):
+                    continue
+            elif name != UNDATED_PARTITION or start or end:
+                continue
+            partitions.append(name)
+        return partitions
+
+    def _segment_names(self, partition: str) -> list:
+        try:
+            return sorted(
+                name for name in os.listdir(self._partition_dir(partition)) if name.endswith(".npz")
+            )
+        except FileNotFoundError:
+            return []
+
+    def _write_segment(self, partition: str, arrays: dict, name: str = None) -> str:
+        directory = self._partition_dir(partition)
+        os.makedirs(directory, exist_ok=True)
+        if name is None:
+            self._sequence += 1
+            name = f"{time.time_ns():020d}-{os.getpid()}-{self._sequence}.npz"
+        fd, tmp_path = tempfile.mkstemp(dir=directory, suffix=".tmp")
+        try:
+            with os.fdopen(fd, "wb") as f:
+                np.savez(f, **arrays)
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(tmp_path, os.path.join(directory, name))
+        except BaseException:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+        return name
+
+    def append(self, records: list):
+        """Write records (dicts keyed by column name) as one segment per day."""
+        by_partition = {}
+        for record in records:
+            by_partition.setdefault(partition_of(record.get("timestamp")), []).append(record)
+        with file_lock(self.root):
+            for partition, partition_records in by_partition.items():
+                self._write_segment(partition, encode_segment(partition_records))
+                if len(self._segment_names(partition)) >= COMPACT_SEGMENTS:
+                    self._compact(partition)
+
+    def _open_segments(self, partition: str) -> list:
+        """Open the live segments of a partition (lock held); caller closes them."""
+        directory = self._partition_dir(partition)
+        segments = {}
+        replaced = set()
+        for name in self._segment_names(partition):
+            try:
+                segment = np.load(os.path.join(directory, name), allow_pickle=False)
+            except FileNotFoundError:
+                continue
+            segments[name] = segment
+            if _REPLACES + ".offsets" in segment.files:
+                replaced.update(_decode_text(segment, _REPLACES))
+        live = []
+        for name, segment in segments.items():
+            if name in replaced:
+                segment.close()
+            else:
+                live.append((name, segment))
+        return live
+
+    def _compact(self, partition: str):
+        """Merge a partition's segments into one (lock held)."""
+        # Every file is replaced, including leftovers an earlier merge superseded
+        names = self._segment_names(partition)
+        segments = self._open_segments(partition)
+        try:
+            records = []
+            for _, segment in segments:
+                columns = {name: decode_column(segment, name) for name in ANALYTICS_COLUMNS}
+                records.extend(dict(zip(columns, values)) for values in zip(*columns.values()))
+        finally:
+            for _, segment in segments:
+                segment.close()
+        arrays = encode_segment(records)
+        _encode_text(arrays, _REPLACES, names)
+        # Sorts right after the oldest merged segment, before any newer one
+        merged = self._write_segment(partition, arrays, name=names[0][:-len(".npz")] + "-m.npz")
+        directory = self._partition_dir(partition)
+        for name in names:
+            if name != merged:
+                try:
+                    os.remove(os.path.join(directory, name))
+                except FileNotFoundError:
+                    pass
+
+    def scan(self, columns=None, start: str = None, end: str = None) -> dict:
+        """
+        {column: [values]} of the events in the day range, oldest partition
+        first and in ingestion order within a day. Only the named columns of
+        the matching partitions are read.
+        """
+        columns = list(ANALYTICS_COLUMNS if columns is None else columns)
+        unknown = [name for name in columns if name not in ANALYTICS_COLUMNS]
+        if unknown:
+            raise ValueError(f"Unknown analytics columns: {', '.join(unknown)}")
+
+        with file_lock(self.root):
+            segments = [
+                segment
+                for partition in self.partitions(start, end)
+                for _, segment in self._open_segments(partition)
+            ]
+        result = {name: [] for name in columns}
+        try:
+            for segment in segments:
+                for name in columns:
+                    result[name].extend(decode_column(segment, name))
+        finally:
+            for segment in segments:
+                segment.close()
+        return result
+
+    def rows(self, columns=None, start: str = None, end: str = None):
+        """The events of scan() as one dict per event."""
+        columns = self.scan(columns, start, end)
+        return [dict(zip(columns, values)) for values in zip(*columns.values())]
+
+    def count(self, start: str = None, end: str = None, partitions=None) -> int:
+        """Events in the day range (or in the named partitions)."""
+        if partitions is None:
+            partitions = self.partitions(start, end)
+        with file_lock(self.root):
+            segments = [
+                segment for partition in partitions for _, segment in self._open_segments(partition)
+            ]
+        try:
+            return sum(int(segment["rows"][0]) for segment in segments)
+        finally:
+            for segment in segments:
+                segment.close()
+
+    def clear(self):
+        """Delete every partition."""
+        with file_lock(self.root):
+            for partition in self.partitions():
+                directory = self._partition_dir(partition)
+                for name in os.listdir(directory):
+                    os.remove(os.path.join(directory, name))
+                os.rmdir(directory)
+
+
+def main():
+    import argparse
+
+    from admin_endpoints import ANALYTICS_FILE, analytics_store, migrate_analytics_csv
+
+    parser = argparse.ArgumentParser(description="Manage the columnar analytics store.")
+    parser.add_argument("command", choices=("migrate", "info"))
+    args = parser.parse_args()
+
+    if args.command == "migrate":
+        # admin_endpoints already migrates on import; this reports the result
+        print(f"Imported {migrate_analytics_csv()} new events from {ANALYTICS_FILE}")
+    for partition in analytics_store.partitions():
+        segments = len(analytics_store._segment_names(partition))
+        events = analytics_store.count(partitions=[partition])
+        print(f"{partition}: {events} events, {segments} segments")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,594 @@
+"""
+Materialized analytics summary, maintained as events are ingested.
+
+get_analytics_summary used to re-read every event, re-parse every data blob
+and timestamp, and rebuild all of its aggregates per request. SummaryState
+holds those aggregates (sessions, users, funnel sets, product funnel, scene
+transitions, peak hours/days, device/referrer/chat intent counts and the
+per-session first/last timestamps) and folds in one event at a time.
+AnalyticsSummary keeps the state next to the store:
+
+    - AnalyticsLog calls apply(events) after each batch is stored; the batch
+      is folded in and its summary columns appended as one line to
+      data/analytics_summary.journal under an advisory lock, so a batch
+      costs O(batch) however much history there is
+    - once the journal holds JOURNAL_COMPACT_BATCHES batches the state is
+      checkpointed to data/analytics_summary.json and the journal started
+      afresh
+    - get() stats the checkpoint and the journal; another worker's batches
+      are replayed from the last journal offset (a new checkpoint triggers a
+      full reload). The rendered summary is cached until the state changes;
+      version() identifies checkpoint and journal for HTTP caching
+    - at startup a state whose event count disagrees with the store (e.g. a
+      crash between storing a batch and journaling it) is rebuilt from a
+      full scan
+
+Aggregates do not depend on the order events arrive in ("first" means
+earliest timestamp), so incremental and rebuilt states agree:
+
+    python analytics_summary.py check      # compare with a full scan
+    python analytics_summary.py rebuild    # replace the state with a full scan
+"""
+
+import json
+import os
+import threading
+from datetime import datetime
+
+from json_store import atomic_write_json, file_lock, read_json, stat_signature
+
+# Journal batches folded into the checkpoint before it is rewritten
+JOURNAL_COMPACT_BATCHES = 200
+
+# Columns SummaryState reads from each event
+SUMMARY_COLUMNS = [
+    "timestamp", "session_id", "user_id", "action", "data",
+    "device_type", "page", "scene", "product_id", "message_text",
+]
+
+FUNNEL_ACTIONS = ("view_product", "add_to_cart", "start_checkout", "complete_checkout")
+
+PRODUCT_FUNNEL_FIELDS = {
+    "view_product": "views",
+    "add_to_cart": "addToCart",
+    "start_checkout": "startCheckout",
+    "complete_checkout": "purchased",
+}
+
+CHAT_INTENT_KEYWORDS = [
+    ("pricing", ["price", "cost", "expensive", "cheap", "$"]),
+    ("sizing", ["size", "fit", "dimension", "measurement"]),
+    ("shipping", ["ship", "delivery", "arrive", "track"]),
+    ("returns", ["return", "refund", "exchange"]),
+    ("availability", ["stock", "available", "availability"]),
+    ("product_details", ["material", "fabric", "color"]),
+]
+
+
+def infer_device_type(user_agent: str) -> str:
+    if not user_agent:
+        return "desktop"
+    ua = user_agent.lower()
+    if "mobile" in ua or "iphone" in ua or "android" in ua:
+        return "mobile"
+    if "ipad" in ua or "tablet" in ua:
+        return "tablet"
+    return "desktop"
+
+
+def chat_intent(message_text: str) -> str:
+    text = message_text.lower()
+    for intent, keywords in CHAT_INTENT_KEYWORDS:
+        if any(k in text for k in keywords):
+            return intent
+    return "other"
+
+
+def parse_ts(value):
+    if not value:
+        return None
+    try:
+        return datetime.fromisoformat(value.replace("Z", "+00:00"))
+    except ValueError:
+        return None
+
+
+def _avg(values):
+    return round(sum(values) / len(values), 2) if values else 0
+
+
+def _median(values):
+    if not values:
+        return 0
+    vals = sorted(values)
+    mid = len(vals) // 2
+    if len(vals) % 2 == 0:
+        return round((vals[mid - 1] + vals[mid]) / 2, 2)
+    return round(vals[mid], 2)
+
+
+def _p90(values):
+    if not values:
+        return 0
+    vals = sorted(values)
+    idx = int(len(vals) * 0.9) - 1
+    idx = max(min(idx, len(vals) - 1), 0)
+    return round(vals[idx], 2)
+
+
+def _top(counts: dict, label: str, limit: int) -> list:
+    """[{label: key, 'count': n}] by count, ties by key."""
+    ranked = sorted(counts.items(), key=lambda item: (-item[1], item[0]))[:limit]
+    return [{label: key, "count": count} for key, count in ranked]
+
+
+def _set_min(target: dict, key, value):
+    if key not in target or value < target[key]:
+        target[key] = value
+
+
+class SummaryState:
+    """Aggregates of get_analytics_summary, updated one event at a time."""
+
+    def __init__(self):
+        self.events = 0
+        self.sessions = {}  # session id -> the summary's session record
+        self.users = {}  # user id -> {'sessions': [...], 'totalActions': n}
+        # Per-session timestamps as epoch seconds
+        self.session_earliest = {}  # earliest event; sessions[...]['startTime']
+        self.session_start_times = {}  # earliest session_start
+        self.session_last = {}  # [ts, action] of the latest event
+        self.session_first_action = {}  # earliest event other than session_start
+        self.session_actions = {}
+        self.session_scenes = {}  # session id -> set of scenes
+        self.funnel_sessions = {action: set() for action in FUNNEL_ACTIONS}
+        self.checkout_times = {action: {} for action in FUNNEL_ACTIONS[1:]}  # earliest per session
+        self.product_funnel = {}
+        self.transition_counts = {}
+        self.peak_hours = {str(i): 0 for i in range(24)}
+        self.peak_days = {str(i): 0 for i in range(7)}
+        self.device_breakdown = {}
+        self.referrer_counts = {}
+        self.chat_intents = {}
+
+    def add(self, event: dict):
+        """Fold in one event (a dict with the SUMMARY_COLUMNS)."""
+        self.events += 1
+        session_id = event.get("session_id") or ""
+        user_id = event.get("user_id") or ""
+        action = event.get("action") or ""
+        data = json.loads(event["data"]) if event.get("data") else {}
+        timestamp = event.get("timestamp") or ""
+        product_id = event.get("product_id") or data.get("productId") or data.get("hotspotId") or ""
+        scene = event.get("scene") or data.get("scene") or data.get("sceneId") or data.get("toScene") or ""
+        device_type = event.get("device_type") or infer_device_type(data.get("userAgent", ""))
+        referrer = data.get("referrer") or event.get("page") or ""
+        message_text = event.get("message_text") or data.get("messageText") or data.get("message") or ""
+
+        parsed = parse_ts(timestamp)
+        ts = parsed.timestamp() if parsed else None
+
+        if session_id:
+            session = self.sessions.get(session_id)
+            if session is None:
+                session = self.sessions[session_id] = {
+                    "userId": user_id,
+                    "startTime": timestamp,
+                    "actionCount": 0,
+                    "scenes": {},
+                    "totalDuration": 0,
+                }
+            elif not session["userId"]:
+                session["userId"] = user_id
+            if ts is not None and (
+                session_id not in self.session_earliest or ts < self.session_earliest[session_id]
+            ):
+                self.session_earliest[session_id] = ts
+                session["startTime"] = timestamp
+            session["actionCount"] += 1
+            self.session_actions[session_id] = session["actionCount"]
+            if scene:
+                self.session_scenes.setdefault(session_id, set()).add(scene)
+
+            # Time in scenes
+            if action == "navigate" and "timeInPreviousScene" in data:
+                from_scene = data.get("fromScene", "unknown")
+                session["scenes"][from_scene] = session["scenes"].get(from_scene, 0) + data["timeInPreviousScene"]
+
+            if action == "session_end" and "totalDuration" in data:
+                session["totalDuration"] = max(session["totalDuration"], data["totalDuration"])
+
+            if ts is not None:
+                if action == "session_start":
+                    _set_min(self.session_start_times, session_id, ts)
+                else:
+                    _set_min(self.session_first_action, session_id, ts)
+                last = self.session_last.get(session_id)
+                if last is None or [ts, action] > last:
+                    self.session_last[session_id] = [ts, action]
+                if action in self.checkout_times:
+                    _set_min(self.checkout_times[action], session_id, ts)
+
+            if action in self.funnel_sessions:
+                self.funnel_sessions[action].add(session_id)
+
+        if user_id:
+            user = self.users.setdefault(user_id, {"sessions": [], "totalActions": 0})
+            if session_id and session_id not in user["sessions"]:
+                user["sessions"].append(session_id)
+            user["totalActions"] += 1
+
+        if product_id:
+            product = self.product_funnel.setdefault(
+                product_id,
+                {"productId": product_id, "views": 0, "addToCart": 0, "startCheckout": 0, "purchased": 0},
+            )
+            if action in PRODUCT_FUNNEL_FIELDS:
+                product[PRODUCT_FUNNEL_FIELDS[action]] += 1
+
+        if action == "navigate":
+            from_scene = data.get("fromScene") or ""
+            to_scene = data.get("toScene") or ""
+            if from_scene and to_scene:
+                key = f"{from_scene} -> {to_scene}"
+                self.transition_counts[key] = self.transition_counts.get(key, 0) + 1
+
+        if action == "session_start":
+            if parsed:
+                self.peak_hours[str(parsed.hour)] += 1
+                self.peak_days[str(parsed.weekday())] += 1
+            if device_type:
+                self.device_breakdown[device_type] = self.device_breakdown.get(device_type, 0) + 1
+            if referrer:
+                self.referrer_counts[referrer] = self.referrer_counts.get(referrer, 0) + 1
+
+        if action == "send_chat_message" and message_text:
+            intent = chat_intent(message_text)
+            self.chat_intents[intent] = self.chat_intents.get(intent, 0) + 1
+
+    def render(self) -> dict:
+        """The summary response."""
+        time_to_first = []
+        for session_id, first_action_ts in self.session_first_action.items():
+            start_ts = self.session_start_times.get(session_id, self.session_earliest.get(session_id))
+            if start_ts is not None and first_action_ts - start_ts >= 0:
+                time_to_first.append(first_action_ts - start_ts)
+
+        add_to_cart_time = self.checkout_times["add_to_cart"]
+        start_checkout_time = self.checkout_times["start_checkout"]
+        complete_checkout_time = self.checkout_times["complete_checkout"]
+        time_to_checkout = []
+        time_to_purchase = []
+        for session_id, add_ts in add_to_cart_time.items():
+            start_ts = start_checkout_time.get(session_id)
+            if start_ts is not None and start_ts - add_ts >= 0:
+                time_to_checkout.append(start_ts - add_ts)
+        for session_id, start_ts in start_checkout_time.items():
+            complete_ts = complete_checkout_time.get(session_id)
+            if complete_ts is not None and complete_ts - start_ts >= 0:
+                time_to_purchase.append(complete_ts - start_ts)
+
+        actions_per_session = list(self.session_actions.values())
+        scenes_per_session = [len(scenes) for scenes in self.session_scenes.values()]
+
+        drop_offs = {}
+        for _, action in self.session_last.values():
+            drop_offs[action] = drop_offs.get(action, 0) + 1
+
+        top_products = sorted(
+            self.product_funnel.values(), key=lambda x: (-x["views"], x["productId"])
+        )[:10]
+
+        user_session_counts = [len(user["sessions"]) for user in self.users.values()]
+        returning_users = len([count for count in user_session_counts if count > 1])
+        total_users = len(self.users)
+        return_rate = round((returning_users / total_users) * 100, 2) if total_users else 0
+
+        insights = {
+            "funnel": {
+                "viewProductSessions": len(self.funnel_sessions["view_product"]),
+                "addToCartSessions": len(self.funnel_sessions["add_to_cart"]),
+                "startCheckoutSessions": len(self.funnel_sessions["start_checkout"]),
+                "completeCheckoutSessions": len(self.funnel_sessions["complete_checkout"]),
+            },
+            "dropOffs": _top(drop_offs, "action", 10),
+            "sceneTransitions": _top(self.transition_counts, "path", 10),
+            "timeToFirstAction": {
+                "averageSeconds": _avg(time_to_first),
+                "medianSeconds": _median(time_to_first),
+                "p90Seconds": _p90(time_to_first),
+            },
+            "timeToCheckout": {
+                "addToCheckoutAvgSeconds": _avg(time_to_checkout),
+                "checkoutToPurchaseAvgSeconds": _avg(time_to_purchase),
+            },
+            "cartAbandonment": {
+                "startCheckoutSessions": len(start_checkout_time),
+                "completeCheckoutSessions": len(complete_checkout_time),
+                "abandonmentRate": round(
+                    (1 - (len(complete_checkout_time) / len(start_checkout_time))) * 100, 2
+                ) if start_checkout_time else 0,
+            },
+            "engagement": {
+                "actionsPerSessionAvg": _avg(actions_per_session),
+                "actionsPerSessionMedian": _median(actions_per_session),
+                "actionsPerSessionP90": _p90(actions_per_session),
+                "scenesPerSessionAvg": _avg(scenes_per_session),
+                "scenesPerSessionMedian": _median(scenes_per_session),
+                "scenesPerSessionP90": _p90(scenes_per_session),
+            },
+            "peakHours": dict(self.peak_hours),
+            "peakDays": dict(self.peak_days),
+            "repeatUsers": {
+                "returningUsers": returning_users,
+                "returnRate": return_rate,
+                "avgSessionsPerUser": _avg(user_session_counts),
+            },
+            "topChatIntents": _top(self.chat_intents, "intent", 8),
+            "topReferrers": _top(self.referrer_counts, "referrer", 8),
+            "deviceBreakdown": dict(self.device_breakdown),
+            "productFunnel": [dict(product) for product in top_products],
+        }
+
+        # Copies of the mutable records: the state keeps changing while
+        # responses are serialized
+        return {
+            "sessions": {
+                session_id: {**session, "scenes": dict(session["scenes"])}
+                for session_id, session in self.sessions.items()
+            },
+            "users": {
+                user_id: {**user, "sessions": list(user["sessions"])}
+                for user_id, user in self.users.items()
+            },
+            "totalSessions": len(self.sessions),
+            "totalUsers": len(self.users),
+            "insights": insights,
+        }
+
+    # ---- checkpoints ----
+
+    def to_dict(self) -> dict:
+        document = dict(vars(self))
+        document["session_scenes"] = {key: sorted(value) for key, value in self.session_scenes.items()}
+        document["funnel_sessions"] = {key: sorted(value) for key, value in self.funnel_sessions.items()}
+        return document
+
+    @classmethod
+    def from_dict(cls, document: dict) -> "SummaryState":
+        state = cls()
+        for key, value in document.items():
+            if hasattr(state, key):
+                setattr(state, key, value)
+        state.session_scenes = {key: set(value) for key, value in state.session_scenes.items()}
+        state.funnel_sessions = {key: set(value) for key, value in state.funnel_sessions.items()}
+        for session_id, session in state.sessions.items():
+            # Checkpoints written before sessions dropped their action lists
+            if "actions" in session:
+                del session["actions"]
+                session["actionCount"] = state.session_actions.get(session_id, 0)
+        return state
+
+
+def canonical(summary: dict) -> dict:
+    """A rendered summary with arrival-order-dependent lists sorted, for comparisons."""
+    summary = json.loads(json.dumps(summary))
+    for user in summary["users"].values():
+        user["sessions"].sort()
+    return summary
+
+
+class AnalyticsSummary:
+    """
+    A SummaryState kept in step with store, persisted as a checkpoint at path
+    plus a journal of the batches applied since (like HotspotRepository).
+    """
+
+    def __init__(self, path: str, store, journal_path: str = None):
+        self.path = path
+        self.journal_path = journal_path or os.path.splitext(path)[0] + ".journal"
+        self.store = store
+        self._lock = threading.Lock()
+        self._state = SummaryState()
+        self._snapshot_signature = None
+        self._journal_inode = None
+        self._journal_offset = 0
+        self._journal_entries = 0
+        self._loaded = False
+        self._rendered = None
+        self._stale = False  # a batch was stored but not folded in
+
+    def scan(self) -> SummaryState:
+        """A fresh state built from every stored event."""
+        state = SummaryState()
+        for event in self.store.rows(SUMMARY_COLUMNS):
+            state.add(event)
+        return state
+
+    # ---- persistence ----
+
+    def _journal_signature(self):
+        signature = stat_signature(self.journal_path)
+        return (signature[0], signature[2]) if signature is not None else None
+
+    def _replay(self, offset: int):
+        """Fold in journal batches from offset on; returns the new offset."""
+        try:
+            with open(self.journal_path, "rb") as f:
+                f.seek(offset)
+                for line in f:
+                    if not line.endswith(b"\n"):
+                        break  # partially written tail, picked up next time
+                    offset += len(line)
+                    self._journal_entries += 1
+                    for event in json.loads(line):
+                        self._state.add(event)
+                    self._rendered = None
+        except FileNotFoundError:
+            return 0
+        return offset
+
+    def _reload(self):
+        """Bring the state up to date with the files (lock held)."""
+        snapshot_signature = stat_signature(self.path)
+        journal_signature = self._journal_signature()
+        if self._loaded and snapshot_signature == self._snapshot_signature:
+            if journal_signature is None and self._journal_inode is None:
+                return
+            if (
+                journal_signature is not None
+                and journal_signature[0] == self._journal_inode
+                and journal_signature[1] >= self._journal_offset
+            ):
+                if journal_signature[1] > self._journal_offset:
+                    self._journal_offset = self._replay(self._journal_offset)
+                return
+
+        document = read_json(self.path) if snapshot_signature is not None else None
+        self._state = SummaryState.from_dict(document) if document else SummaryState()
+        self._rendered = None
+        self._journal_entries = 0
+        self._journal_offset = self._replay(0)
+        self._journal_inode = journal_signature[0] if journal_signature is not None else None
+        self._snapshot_signature = snapshot_signature
+        self._loaded = True
+
+    def _fresh(self) -> bool:
+        if not self._loaded or stat_signature(self.path) != self._snapshot_signature:
+            return False
+        journal_signature = self._journal_signature()
+        if journal_signature is None:
+            return self._journal_inode is None
+        return journal_signature == (self._journal_inode, self._journal_offset)
+
+    def _checkpoint(self):
+        """Write the state as the checkpoint and drop the journal (lock held)."""
+        atomic_write_json(self.path, self._state.to_dict(), indent=None)
+        try:
+            os.remove(self.journal_path)
+        except FileNotFoundError:
+            pass
+        self._snapshot_signature = stat_signature(self.path)
+        self._journal_inode = None
+        self._journal_offset = 0
+        self._journal_entries = 0
+        self._loaded = True
+        self._rendered = None
+
+    def _rescan(self):
+        """Replace the state with a full scan and checkpoint it (lock held)."""
+        self._state = self.scan()
+        self._checkpoint()
+        self._stale = False
+
+    # ---- public API ----
+
+    def load(self):
+        """Load the checkpoint, rebuilding it if it does not match the store."""
+        with self._lock, file_lock(self.path):
+            self._reload()
+            if self._stale or self._snapshot_signature is None or self._state.events != self.store.count():
+                self._rescan()
+
+    def invalidate(self):
+        """
+        Mark the state out of step with the store (a stored batch could not
+        be applied); the next load, apply or get rebuilds it from a scan.
+        """
+        self._stale = True
+
+    def apply(self, events: list):
+        """Fold in a batch of newly stored events and append it to the journal."""
+        batch = [{name: event.get(name) for name in SUMMARY_COLUMNS} for event in events]
+        line = (json.dumps(batch, separators=(",", ":")) + "\n").encode("utf-8")
+        with self._lock, file_lock(self.path):
+            if self._stale:
+                self._rescan()  # the scan already includes events
+                return
+            self._reload()
+            try:
+                for event in batch:
+                    self._state.add(event)
+                self._rendered = None
+                with open(self.journal_path, "ab") as f:
+                    f.write(line)
+                self._journal_inode, self._journal_offset = self._journal_signature()
+                self._journal_entries += 1
+                if self._journal_entries >= JOURNAL_COMPACT_BATCHES:
+                    self._checkpoint()
+            except BaseException:
+                self._loaded = False  # memory may be ahead of disk; reload next time
+                raise
+
+    def reset(self):
+        with self._lock, file_lock(self.path):
+            self._state = SummaryState()
+            self._checkpoint()
+            self._stale = False
+
+    def rebuild(self) -> dict:
+        """Replace the state with a full scan; returns the previous summary."""
+        with self._lock, file_lock(self.path):
+            self._reload()
+            previous = self._state.render()
+            self._rescan()
+            return previous
+
+    def version(self) -> str:
+        """Changes whenever any worker applies a batch or checkpoints."""
+        return f"{stat_signature(self.path)}:{stat_signature(self.journal_path)}"
+
+    def get(self) -> dict:
+        """The rendered summary (shared; treat as read-only)."""
+        with self._lock:
+            if self._stale or not self._fresh():
+                with file_lock(self.path):
+                    if self._stale:
+                        self._rescan()
+                    else:
+                        self._reload()
+            if self._rendered is None:
+                self._rendered = self._state.render()
+            return self._rendered
+
+
+def _differences(left, right, path="") -> list:
+    if isinstance(left, dict) and isinstance(right, dict):
+        found = []
+        for key in sorted(set(left) | set(right), key=str):
+            found.extend(_differences(left.get(key), right.get(key), f"{path}.{key}" if path else str(key)))
+        return found
+    return [] if left == right else [path]
+
+
+def main():
+    import argparse
+
+    from admin_endpoints import analytics_log, analytics_summary
+
+    parser = argparse.ArgumentParser(description="Check or rebuild the materialized analytics summary.")
+    parser.add_argument("command", choices=("check", "rebuild"))
+    args = parser.parse_args()
+
+    analytics_log.flush()
+    if args.command == "rebuild":
+        previous = analytics_summary.rebuild()
+        current = analytics_summary.get()
+    else:
+        previous = analytics_summary.get()
+        current = analytics_summary.scan().render()
+
+    differences = _differences(canonical(previous), canonical(current))
+    for path in differences[:50]:
+        print(f"differs: {path}")
+    if len(differences) > 50:
+        print(f"... and {len(differences) - 50} more")
+    print(f"{len(differences)} differences from a full scan of {analytics_summary.store.count()} events")
+    if args.command == "rebuild":
+        print(f"Rebuilt {analytics_summary.path}")
+    elif differences:
+        raise SystemExit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,246 @@
+"""
+Hotspot repository with a per-hotspot id index and an append-only journal.
+
+The hotspot endpoints used to scan a scene's list for the matching id and
+then rewrite all of hotspots.json for every edit. HotspotRepository keeps
+the scenes in memory together with a (scene_id, hotspot_id) -> record index,
+so lookups and patches are O(1), and persists each change as one JSON line
+appended to hotspots.journal instead of rewriting the document. Once the
+journal holds JOURNAL_COMPACT_ENTRIES operations it is folded back into
+hotspots.json (written atomically) and started afresh.
+
+Other workers' changes are picked up by stat-ing the snapshot and the
+journal on read: a journal that only grew is replayed from the last offset,
+anything else triggers a full reload. Writers and reloads hold the same
+advisory file lock, so a reload never sees a half-compacted state.
+"""
+
+import copy
+import json
+import os
+import threading
+
+from json_store import atomic_write_json, file_lock, read_json, stat_signature
+
+# Journal operations folded into the snapshot before it is rewritten
+JOURNAL_COMPACT_ENTRIES = 1000
+
+
+class HotspotRepository:
+    """
+    Hotspots per scene, backed by a JSON snapshot plus an operation journal.
+    Methods raise KeyError for unknown hotspots and IndexError for image
+    indexes out of range; nothing is persisted when they do. Returned
+    records and lists are shared with the repository - treat them as
+    read-only.
+    """
+
+    def __init__(self, path: str, default: dict, journal_path: str = None):
+        self.path = path
+        self.journal_path = journal_path or os.path.splitext(path)[0] + ".journal"
+        self.default = default
+        self._lock = threading.Lock()
+        self._scenes = {}
+        self._index = {}  # scene_id -> {hotspot_id: record in self._scenes}
+        self._snapshot_signature = None
+        self._journal_inode = None
+        self._journal_offset = 0
+        self._journal_entries = 0
+        self._loaded = False
+
+    # ---- in-memory state ----
+
+    def _index_scene(self, scene_id: str):
+        scene_index = self._index[scene_id] = {}
+        for record in self._scenes.get(scene_id, []):
+            if record.get("id") is not None:
+                scene_index.setdefault(record["id"], record)
+
+    def _record(self, scene_id: str, hotspot_id: str) -> dict:
+        record = self._index.get(scene_id, {}).get(hotspot_id)
+        if record is None:
+            raise KeyError(hotspot_id)
+        return record
+
+    def _apply(self, op: dict):
+        """Apply one journal operation to the in-memory state; returns its result."""
+        kind = op["op"]
+        scene_id = op.get("scene")
+        if kind == "reset":
+            self._scenes = copy.deepcopy(op["document"])
+            self._index = {}
+            for reset_scene in self._scenes:
+                self._index_scene(reset_scene)
+            return None
+        if kind == "set_scene":
+            self._scenes[scene_id] = copy.deepcopy(op["hotspots"])
+            self._index_scene(scene_id)
+            return None
+
+        record = self._record(scene_id, op["id"])
+        if kind == "patch":
+            fields = copy.deepcopy(op["fields"])
+            new_id = fields.get("id", record.get("id"))
+            if new_id != record.get("id"):
+                scene_index = self._index[scene_id]
+                scene_index.pop(record.get("id"), None)
+                scene_index.setdefault(new_id, record)
+            record.update(fields)
+            return record
+        if kind == "set_images":
+            record["images"] = list(op["images"])
+            return record["images"]
+        if kind == "add_image":
+            record.setdefault("images", []).append(op["image"])
+            return op["image"]
+        if kind == "remove_image":
+            images = record.get("images", [])
+            if not 0 <= op["index"] < len(images):
+                raise IndexError(op["index"])
+            removed = images.pop(op["index"])
+            record["images"] = images
+            return removed
+        raise ValueError(f"Unknown hotspot journal operation {kind!r}")
+
+    # ---- persistence ----
+
+    def _journal_signature(self):
+        signature = stat_signature(self.journal_path)
+        return (signature[0], signature[2]) if signature is not None else None
+
+    def _replay(self, offset: int):
+        """Apply journal lines from offset on; returns the new offset."""
+        try:
+            with open(self.journal_path, "rb") as f:
+                f.seek(offset)
+                for line in f:
+                    if not line.endswith(b"\n"):
+                        break  # partially written tail, picked up next time
+                    offset += len(line)
+                    self._journal_entries += 1
+                    try:
+                        self._apply(json.loads(line))
+                    except (KeyError, IndexError):
+                        pass  # validated against a state this op raced with
+        except FileNotFoundError:
+            return 0
+        return offset
+
+    def _reload(self):
+        """Bring the in-memory state up to date with the files (lock held)."""
+        snapshot_signature = stat_signature(self.path)
+        journal_signature = self._journal_signature()
+        if self._loaded and snapshot_signature == self._snapshot_signature:
+            if journal_signature is None and self._journal_inode is None:
+                return
+            if (
+                journal_signature is not None
+                and journal_signature[0] == self._journal_inode
+                and journal_signature[1] >= self._journal_offset
+            ):
+                if journal_signature[1] > self._journal_offset:
+                    self._journal_offset = self._replay(self._journal_offset)
+                return
+
+        document = read_json(self.path) if snapshot_signature is not None else None
+        self._apply({"op": "reset", "document": self.default if document is None else document})
+        self._journal_entries = 0
+        self._journal_offset = self._replay(0)
+        self._journal_inode = journal_signature[0] if journal_signature is not None else None
+        self._snapshot_signature = snapshot_signature
+        self._loaded = True
+
+    def _fresh(self) -> bool:
+        if not self._loaded or stat_signature(self.path) != self._snapshot_signature:
+            return False
+        journal_signature = self._journal_signature()
+        if journal_signature is None:
+            return self._journal_inode is None
+        return journal_signature == (self._journal_inode, self._journal_offset)
+
+    def _compact(self):
+        """Fold the journal into the snapshot (lock held)."""
+        atomic_write_json(self.path, self._scenes)
+        try:
+            os.remove(self.journal_path)
+        except FileNotFoundError:
+            pass
+        self._snapshot_signature = stat_signature(self.path)
+        self._journal_inode = None
+        self._journal_offset = 0
+        self._journal_entries = 0
+
+    def _commit(self, op: dict):
+        """Validate and apply op, then append it to the journal."""
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        with self._lock, file_lock(self.path):
+            self._reload()
+            result = self._apply(op)
+            try:
+                line = (json.dumps(op) + "\n").encode("utf-8")
+                with open(self.journal_path, "ab") as f:
+                    f.write(line)
+                journal_signature = self._journal_signature()
+                self._journal_inode = journal_signature[0]
+                self._journal_offset = journal_signature[1]
+                self._journal_entries += 1
+                if self._journal_entries >= JOURNAL_COMPACT_ENTRIES:
+                    self._compact()
+            except BaseException:
+                self._loaded = False  # memory may be ahead of disk; reload next time
+                raise
+            return result
+
+    def _read(self):
+        if not self._fresh():
+            with self._lock, file_lock(self.path):
+                self._reload()
+
+    # ---- public API ----
+
+    def all(self) -> dict:
+        """Every scene's hotspot list, keyed by scene id."""
+        self._read()
+        return self._scenes
+
+    def scene(self, scene_id: str) -> list:
+        self._read()
+        return self._scenes.get(scene_id, [])
+
+    def get(self, scene_id: str, hotspot_id: str):
+        """One hotspot record, or None."""
+        self._read()
+        return self._index.get(scene_id, {}).get(hotspot_id)
+
+    def version(self) -> str:
+        """Changes whenever the snapshot or the journal is written."""
+        return f"{stat_signature(self.path)}:{stat_signature(self.journal_path)}"
+
+    def set_scene(self, scene_id: str, hotspots: list):
+        self._commit({"op": "set_scene", "scene": scene_id, "hotspots": hotspots})
+
+    def patch(self, scene_id: str, hotspot_id: str, fields: dict) -> dict:
+        """Merge fields into a hotspot; returns the updated record."""
+        return self._commit({"op": "patch", "scene": scene_id, "id": hotspot_id, "fields": fields})
+
+    def set_images(self, scene_id: str, hotspot_id: str, images: list) -> list:
+        return self._commit(
+            {"op": "set_images", "scene": scene_id, "id": hotspot_id, "images": images}
+        )
+
+    def add_image(self, scene_id: str, hotspot_id: str, image: str) -> str:
+        return self._commit({"op": "add_image", "scene": scene_id, "id": hotspot_id, "image": image})
+
+    def remove_image(self, scene_id: str, hotspot_id: str, index: int):
+        """Remove the image at index; returns it."""
+        return self._commit(
+            {"op": "remove_image", "scene": scene_id, "id": hotspot_id, "index": index}
+        )
+
+    def reset(self, document: dict):
+        """Replace every scene's hotspots and start a fresh snapshot."""
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        with self._lock, file_lock(self.path):
+            self._apply({"op": "reset", "document": document})
+            self._compact()
+            self._loaded = True
@@ -0,0 +1,99 @@
+"""
+Conditional, pre-compressed JSON responses for read-heavy admin endpoints.
+
+Every storefront visitor fetches the hotspots and scene overrides. Instead of
+re-serializing the document per request, ResponseCache keeps the serialized
+body (plus gzip and, when the brotli module is installed, brotli encodings)
+per resource, tagged with the storage version it was built from. Requests
+carrying a matching If-None-Match get a bodyless 304 without touching the
+document at all; other requests get the cached bytes in the best encoding
+the client accepts. Storage versions change on every save, so a new version
+simply rebuilds the entry.
+"""
+
+import gzip
+import hashlib
+import json
+import threading
+
+from fastapi import Response
+
+try:
+    import brotli
+except ImportError:  # optional; gzip only
+    brotli = None
+
+# Revalidate on every use, but allow clients and proxies to keep a copy
+CACHE_CONTROL = "no-cache"
+
+# Bodies smaller than this are not worth compressing
+MIN_COMPRESS_BYTES = 512
+
+
+def _accepted_encodings(header: str) -> set:
+    encodings = set()
+    for part in (header or "").split(","):
+        name, _, params = part.strip().partition(";")
+        if name and params.replace(" ", "") not in ("q=0", "q=0.0"):
+            encodings.add(name.strip().lower())
+    return encodings
+
+
+def _etag_matches(header: str, etag: str) -> bool:
+    if not header:
+        return False
+    if header.strip() == "*":
+        return True
+    # Weak comparison: W/ prefixes are ignored
+    opaque = etag[2:] if etag.startswith("W/") else etag
+    return any(
+        (tag.strip()[2:] if tag.strip().startswith("W/") else tag.strip()) == opaque
+        for tag in header.split(",")
+    )
+
+
+class _Entry:
+    def __init__(self, version: str, etag: str, body: bytes):
+        self.version = version
+        self.etag = etag
+        self.bodies = {"identity": body}
+        if len(body) >= MIN_COMPRESS_BYTES:
+            self.bodies["gzip"] = gzip.compress(body, compresslevel=6, mtime=0)
+            if brotli is not None:
+                self.bodies["br"] = brotli.compress(body, quality=5)
+
+
+class ResponseCache:
+    """Serialized JSON documents keyed by resource name and storage version."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._entries = {}
+
+    @staticmethod
+    def etag(key: str, version: str) -> str:
+        return 'W/"' + hashlib.sha1(f"{key}\0{version}".encode("utf-8")).hexdigest()[:20] + '"'
+
+    def respond(self, request, key: str, version: str, load) -> Response:
+        """
+        Response for resource key at version. load() is only called when no
+        serialized body for this version is cached.
+        """
+        etag = self.etag(key, version)
+        headers = {"ETag": etag, "Cache-Control": CACHE_CONTROL, "Vary": "Accept-Encoding"}
+        if _etag_matches(request.headers.get("if-none-match"), etag):
+            return Response(status_code=304, headers=headers)
+
+        entry = self._entries.get(key)
+        if entry is None or entry.version != version:
+            body = json.dumps(load(), separators=(",", ":")).encode("utf-8")
+            entry = _Entry(version, etag, body)
+            with self._lock:
+                self._entries[key] = entry
+
+        accepted = _accepted_encodings(request.headers.get("accept-encoding"))
+        for encoding in ("br", "gzip"):
+            if encoding in entry.bodies and encoding in accepted:
+                headers["Content-Encoding"] = encoding
+                return Response(entry.bodies[encoding], media_type="application/json", headers=headers)
+        return Response(entry.bodies["identity"], media_type="application/json", headers=headers)
@@ -0,0 +1,135 @@
+"""
+Process-wide cache and atomic writer for the admin JSON documents.
+
+hotspots.json and scenes.json used to be re-read and re-parsed on every
+request. JsonDocumentStore keeps the parsed document in memory and only
+re-reads the file when its inode, mtime or size changes (e.g. another worker
+or an editor replaced it). Updates run read-modify-write under a thread lock
+plus an advisory file lock, so concurrent PUTs - in this process or another
+worker - cannot lose each other's changes, and the new document is written
+to a temp file and renamed over the old one so readers never see a partial
+file.
+"""
+
+import copy
+import json
+import os
+import tempfile
+import threading
+from contextlib import contextmanager
+
+try:
+    import fcntl
+except ImportError:  # Windows: thread lock only
+    fcntl = None
+
+
+@contextmanager
+def file_lock(path: str):
+    """Exclusive advisory lock on path + ".lock" (a no-op without fcntl)."""
+    if fcntl is None:
+        yield
+        return
+    with open(path + ".lock", "a") as lock_file:
+        fcntl.flock(lock_file, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+
+def stat_signature(path: str):
+    """(inode, mtime, size) of path, or None if it does not exist."""
+    try:
+        stat = os.stat(path)
+    except FileNotFoundError:
+        return None
+    return (stat.st_ino, stat.st_mtime_ns, stat.st_size)
+
+
+def read_json(path: str):
+    """Parse a JSON file; None if it is missing or malformed."""
+    try:
+        with open(path, "r") as f:
+            return json.load(f)
+    except (json.JSONDecodeError, IOError):
+        return None
+
+
+def atomic_write_json(path: str, document, indent: int = 2):
+    """Write a JSON file through a temp file and rename."""
+    directory = os.path.dirname(path) or "."
+    fd, tmp_path = tempfile.mkstemp(dir=directory, suffix=".tmp")
+    try:
+        with os.fdopen(fd, "w") as f:
+            json.dump(document, f, indent=indent)
+        os.replace(tmp_path, path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+
+
+class JsonDocumentStore:
+    """
+    A JSON document on disk with an mtime-validated in-memory copy.
+
+        store = JsonDocumentStore(path, default={})
+        doc = store.get()                    # shared, do not mutate
+        store.update(lambda doc: doc.update(x=1))
+
+    get() returns the cached object itself, so readers pay no parse or copy
+    cost; mutate documents only inside update().
+    """
+
+    def __init__(self, path: str, default=None, indent: int = 2):
+        self.path = path
+        self.default = {} if default is None else default
+        self.indent = indent
+        self._lock = threading.Lock()
+        self._signature = None
+        self._document = None
+
+    def _refresh(self):
+        """Re-read the file if it changed since it was last parsed."""
+        signature = stat_signature(self.path)
+        if signature is not None and signature == self._signature:
+            return self._document
+        document = read_json(self.path) if signature is not None else None
+        if document is None:
+            document = copy.deepcopy(self.default)
+        self._document = document
+        self._signature = signature
+        return document
+
+    def get(self):
+        """The current document (shared; treat as read-only)."""
+        signature = stat_signature(self.path)
+        if signature is not None and signature == self._signature:
+            return self._document
+        with self._lock:
+            return self._refresh()
+
+    def _write(self, document):
+        atomic_write_json(self.path, document, self.indent)
+        self._document = document
+        self._signature = stat_signature(self.path)
+
+    def update(self, mutate):
+        """
+        Apply mutate(document) to a private copy of the latest document and
+        write it atomically. Returns mutate's result. If mutate raises,
+        nothing is written.
+        """
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        with self._lock, file_lock(self.path):
+            document = copy.deepcopy(self._refresh())
+            result = mutate(document)
+            self._write(document)
+            return result
+
+    def replace(self, document):
+        """Overwrite the whole document."""
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        with self._lock, file_lock(self.path):
+            self._write(copy.deepcopy(document))
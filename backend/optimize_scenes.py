@@ -0,0 +1,228 @@
+"""
+Offline optimization of published scene PLYs.
+
+Scenes uploaded through the admin panel are stored as raw Sharp output
+(56 bytes per Gaussian). This command walks the scene overrides in the
+configured admin storage (SHOPIVERSE_STORAGE: data/admin.sqlite3 by
+default, data/scenes.json with "json"; see admin_storage), and for every
+scene PLY in a process pool:
+
+    - memory-maps the file (only the vertex block is read)
+    - drops Gaussians below the pipeline's pruning opacity
+    - writes a quantized compressed PLY next to the original (~3.5x smaller)
+    - optionally writes compressed LOD levels ranked by importance
+
+The variants are added to the scene index and recorded in the override:
+"ply" points at the compressed file, "plyOriginal" keeps the raw upload and
+"plyLods" lists {"fraction", "ply"} per level. Scenes whose override already
+has "plyOriginal" are skipped unless --force is given.
+
+    python optimize_scenes.py
+    python optimize_scenes.py --lods 0.5 0.2 --workers 4
+    python optimize_scenes.py --scene customScene_backroom_1768737499220 --dry-run
+"""
+
+import hashlib
+import mmap
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+from ply_ingest import inspect_ply
+from sharp_pipeline import PRUNE_MIN_OPACITY
+from splat_io import encode_compressed_ply, read_ply, splat_from_vertex
+
+COMPRESSED_SUFFIX = ".compressed.ply"
+
+
+class EmptyScene(ValueError):
+    """Pruning left no Gaussians; the scene is skipped rather than optimized."""
+
+
+def _logit(p: float) -> float:
+    return float(np.log(p / (1.0 - p)))
+
+
+def splat_importance(splat: dict) -> np.ndarray:
+    """
+    Opacity times approximate footprint over squared distance from the origin
+    (the Sharp camera); the offline counterpart of gaussian_importance_gpu.
+    """
+    opacity = 1.0 / (1.0 + np.exp(-splat["opacity"].astype(np.float64)))
+    log_scales = np.sort(splat["scale"].astype(np.float64), axis=1)
+    footprint = np.exp(log_scales[:, 1] + log_scales[:, 2])
+    distance_sq = np.maximum((splat["xyz"].astype(np.float64) ** 2).sum(axis=1), 1e-12)
+    return opacity * footprint / distance_sq
+
+
+def subset_splat(splat: dict, index) -> dict:
+    return {key: value[index] for key, value in splat.items()}
+
+
+def lod_splat(splat: dict, importance: np.ndarray, fraction: float) -> dict:
+    """Keep the most important fraction of Gaussians, in their original order."""
+    num_gaussians = len(importance)
+    keep_count = max(1, int(round(num_gaussians * fraction)))
+    if keep_count >= num_gaussians:
+        return splat
+    indices = np.sort(np.argpartition(-importance, keep_count - 1)[:keep_count])
+    return subset_splat(splat, indices)
+
+
+def variant_path(path: str, fraction: float = 1.0) -> str:
+    stem = path[: -len(".ply")] if path.lower().endswith(".ply") else path
+    if fraction < 1.0:
+        stem += f".lod{int(round(fraction * 100))}"
+    return stem + COMPRESSED_SUFFIX
+
+
+def _write_variant(path: str, data) -> dict:
+    """
+    Write data to path atomically and describe it like a scene index entry.
+    The temp file is validated before it replaces path and removed if it
+    is rejected.
+    """
+    tmp_path = path + ".tmp"
+    try:
+        with open(tmp_path, "wb") as f:
+            f.write(data)
+        metadata = inspect_ply(tmp_path)
+        os.replace(tmp_path, path)
+    finally:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+    return {
+        "filename": os.path.basename(path),
+        "bytes": len(data),
+        "sha256": hashlib.sha256(data).hexdigest(),
+        **metadata,
+        "ingested_at": time.time(),
+    }
+
+
+def optimize_ply(path: str, min_opacity: float = PRUNE_MIN_OPACITY, lod_fractions=()) -> dict:
+    """
+    Prune and quantize one float32 scene PLY, writing the compressed variant
+    (and one per LOD fraction) next to it. Runs in a worker process.
+    Returns {"source", "kept", "dropped", "bytes", "variants"} where each
+    variant holds its fraction, path and scene index entry. Raises
+    EmptyScene, before writing anything, if no Gaussian reaches min_opacity.
+    """
+    with open(path, "rb") as f:
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as data:
+            elements = read_ply(data)
+            if "chunk" in elements:
+                raise ValueError("already a compressed PLY")
+            vertex = elements["vertex"]
+            keep = vertex["opacity"] >= _logit(min_opacity)
+            splat = splat_from_vertex(vertex[keep])
+            del elements, vertex
+    if not keep.any():
+        raise EmptyScene(f"all {len(keep)} Gaussians are below opacity {min_opacity:.4f}")
+
+    importance = splat_importance(splat) if any(f < 1.0 for f in lod_fractions) else None
+    variants = []
+    for fraction in (1.0, *lod_fractions):
+        level = splat if fraction >= 1.0 else lod_splat(splat, importance, fraction)
+        output_path = variant_path(path, fraction)
+        entry = _write_variant(output_path, encode_compressed_ply(level))
+        variants.append({"fraction": fraction, "path": output_path, "entry": entry})
+
+    return {
+        "source": path,
+        "kept": int(keep.sum()),
+        "dropped": int(len(keep) - keep.sum()),
+        "bytes": os.path.getsize(path),
+        "variants": variants,
+    }
+
+
+def _public_path(public_dir: str, file_path: str) -> str:
+    """The web path (e.g. /scenes/x.ply) of a file under public_dir."""
+    return "/" + os.path.relpath(file_path, public_dir).replace(os.sep, "/")
+
+
+def main():
+    import argparse
+
+    from admin_endpoints import PUBLIC_DIR, load_scene_overrides, scene_index, storage
+
+    parser = argparse.ArgumentParser(description="Prune and compress published scene PLYs.")
+    parser.add_argument("--scene", action="append", help="only this scene id (repeatable)")
+    parser.add_argument("--lods", nargs="*", type=float, default=[], help="LOD fractions in (0, 1)")
+    parser.add_argument("--min-opacity", type=float, default=PRUNE_MIN_OPACITY)
+    parser.add_argument("--workers", type=int, default=None, help="worker processes")
+    parser.add_argument("--force", action="store_true", help="reprocess optimized scenes")
+    parser.add_argument("--dry-run", action="store_true", help="list scenes without writing")
+    args = parser.parse_args()
+
+    if not all(0.0 < f < 1.0 for f in args.lods):
+        parser.error("LOD fractions must be in (0, 1)")
+
+    jobs = {}
+    for scene_id, override in load_scene_overrides().items():
+        if args.scene and scene_id not in args.scene:
+            continue
+        override = override or {}
+        if "plyOriginal" in override and not args.force:
+            continue
+        source = override.get("plyOriginal") or override.get("ply")
+        if not source:
+            continue
+        path = os.path.normpath(os.path.join(PUBLIC_DIR, source.lstrip("/")))
+        if not os.path.isfile(path):
+            print(f"{scene_id}: missing {source}, skipped")
+            continue
+        jobs[scene_id] = (source, path)
+
+    if args.dry_run or not jobs:
+        for scene_id, (source, _) in jobs.items():
+            print(f"{scene_id}: {source}")
+        print(f"{len(jobs)} scenes to optimize")
+        return
+
+    start_time = time.time()
+    with ProcessPoolExecutor(max_workers=args.workers) as pool:
+        futures = {
+            scene_id: pool.submit(optimize_ply, path, args.min_opacity, tuple(args.lods))
+            for scene_id, (_, path) in jobs.items()
+        }
+        results = {}
+        for scene_id, future in futures.items():
+            try:
+                results[scene_id] = future.result()
+            except EmptyScene as e:
+                print(f"{scene_id}: skipped ({e})")
+            except Exception as e:
+                print(f"{scene_id}: failed ({e})")
+
+    for scene_id, result in results.items():
+        full = result["variants"][0]
+        for variant in result["variants"]:
+            scene_index.put(variant["entry"]["filename"], variant["entry"])
+        print(
+            f"{scene_id}: {result['bytes'] / 1e6:.1f} MB -> {full['entry']['bytes'] / 1e6:.1f} MB, "
+            f"dropped {result['dropped']} of {result['kept'] + result['dropped']} Gaussians"
+        )
+
+    # Applied to the latest overrides, so edits made while the pool ran are kept
+    for scene_id, result in results.items():
+        full, *lods = result["variants"]
+
+        def record_variants(override, source=jobs[scene_id][0], full=full, lods=lods):
+            override["plyOriginal"] = source
+            override["ply"] = _public_path(PUBLIC_DIR, full["path"])
+            override["plyLods"] = [
+                {"fraction": variant["fraction"], "ply": _public_path(PUBLIC_DIR, variant["path"])}
+                for variant in lods
+            ]
+
+        storage.update_scene(scene_id, record_variants)
+
+    elapsed = time.time() - start_time
+    print(f"Optimized {len(results)} of {len(jobs)} scenes in {elapsed:.1f}s")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,232 @@
+"""
+Server-side ingestion of uploaded Gaussian splat PLYs.
+
+Uploads to /api/upload-ply are streamed to a temp file next to their
+destination while being hashed and size-capped, then checked before they
+become visible under public/scenes: the header is parsed, the property
+layout must be a Sharp float32 PLY or a compressed PLY (see splat_io), the
+file size must match the header exactly, and the vertex block is
+memory-mapped to compute the bounding box and reject non-finite positions.
+Nothing beyond the header and vertex block is read.
+
+The results go into a scene metadata index (data/scene_index.json) keyed by
+file name, so the admin UI can list vertex counts, bounds and checksums
+without downloading any scene.
+"""
+
+import hashlib
+import os
+import tempfile
+import threading
+import time
+
+import numpy as np
+from json_store import atomic_write_json, file_lock, read_json
+from splat_io import (
+    CHUNK_PROPERTIES,
+    COMPRESSED_VERTEX_DTYPE,
+    VERTEX_PROPERTIES,
+    parse_ply_header,
+)
+
+# Largest upload accepted, and the most Gaussians a scene may hold
+MAX_PLY_BYTES = int(os.environ.get("SHOPIVERSE_MAX_PLY_BYTES", str(1024**3)))
+MAX_GAUSSIANS = int(os.environ.get("SHOPIVERSE_MAX_GAUSSIANS", "12000000"))
+
+# Size of the pieces the upload is copied and hashed in
+COPY_CHUNK_BYTES = 1024 * 1024
+
+# Vertex rows reduced at a time when computing bounds from the memory map
+BOUNDS_CHUNK_ROWS = 1 << 20
+
+
+class PlyRejected(ValueError):
+    """An uploaded PLY failed validation; status is the HTTP code to answer with."""
+
+    def __init__(self, message: str, status: int = 400):
+        super().__init__(message)
+        self.status = status
+
+
+def copy_upload(source, destination_dir: str, max_bytes: int = MAX_PLY_BYTES):
+    """
+    Stream a file object into a temp file in destination_dir.
+    Returns (temp_path, size, sha256 hex digest). The temp file is removed
+    and PlyRejected (413) raised as soon as the upload exceeds max_bytes.
+    """
+    digest = hashlib.sha256()
+    size = 0
+    fd, tmp_path = tempfile.mkstemp(dir=destination_dir, suffix=".upload")
+    try:
+        with os.fdopen(fd, "wb") as f:
+            while True:
+                chunk = source.read(COPY_CHUNK_BYTES)
+                if not chunk:
+                    break
+                size += len(chunk)
+                if size > max_bytes:
+                    raise PlyRejected(f"PLY exceeds the {max_bytes} byte upload limit", 413)
+                digest.update(chunk)
+                f.write(chunk)
+    except BaseException:
+        os.remove(tmp_path)
+        raise
+    return tmp_path, size, digest.hexdigest()
+
+
+def _layout_format(elements) -> str:
+    """Classify the element layout as "ply" or "compressed_ply", or reject it."""
+    layout = {name: dtype for name, dtype, _ in elements}
+    vertex = layout.get("vertex")
+    if vertex is None:
+        raise PlyRejected("PLY has no vertex element")
+
+    if "chunk" in layout:
+        if vertex != COMPRESSED_VERTEX_DTYPE:
+            raise PlyRejected("Compressed PLY vertex properties do not match packed layout")
+        missing = [name for name in CHUNK_PROPERTIES if name not in layout["chunk"].names]
+        if missing:
+            raise PlyRejected(f"Compressed PLY chunk element is missing {', '.join(missing)}")
+        return "compressed_ply"
+
+    missing = [name for name in VERTEX_PROPERTIES if name not in vertex.names]
+    if missing:
+        raise PlyRejected(f"PLY vertex element is missing {', '.join(missing)}")
+    wrong = [name for name in VERTEX_PROPERTIES if vertex[name] != np.dtype("<f4")]
+    if wrong:
+        raise PlyRejected(f"PLY vertex properties must be float: {', '.join(wrong)}")
+    return "ply"
+
+
+def _element_offsets(elements, header_size: int) -> dict:
+    """Byte offset of each element's data in the file."""
+    offsets = {}
+    offset = header_size
+    for name, dtype, count in elements:
+        offsets[name] = offset
+        offset += dtype.itemsize * count
+    return offsets
+
+
+def _vertex_bounds(path: str, dtype: np.dtype, count: int, offset: int):
+    """Min/max corners of the x/y/z of a float vertex block, read through a memory map."""
+    vertex = np.memmap(path, dtype=dtype, mode="r", offset=offset, shape=(count,))
+    lo = np.full(3, np.inf)
+    hi = np.full(3, -np.inf)
+    for start in range(0, count, BOUNDS_CHUNK_ROWS):
+        rows = vertex[start : start + BOUNDS_CHUNK_ROWS]
+        xyz = np.stack([rows["x"], rows["y"], rows["z"]], axis=1)
+        if not np.isfinite(xyz).all():
+            raise PlyRejected("PLY contains non-finite vertex positions")
+        lo = np.minimum(lo, xyz.min(axis=0))
+        hi = np.maximum(hi, xyz.max(axis=0))
+    del vertex
+    return lo, hi
+
+
+def _chunk_bounds(path: str, dtype: np.dtype, count: int, offset: int):
+    """Min/max corners of a compressed PLY, from its per-chunk position ranges."""
+    chunks = np.memmap(path, dtype=dtype, mode="r", offset=offset, shape=(count,))
+    lo = np.array([chunks[name].min() for name in ("min_x", "min_y", "min_z")], dtype=np.float64)
+    hi = np.array([chunks[name].max() for name in ("max_x", "max_y", "max_z")], dtype=np.float64)
+    del chunks
+    if not (np.isfinite(lo).all() and np.isfinite(hi).all()):
+        raise PlyRejected("PLY contains non-finite chunk bounds")
+    return lo, hi
+
+
+def inspect_ply(path: str, max_gaussians: int = MAX_GAUSSIANS) -> dict:
+    """
+    Validate a splat PLY on disk and describe it.
+    Returns format, vertex_count, bbox ({"min": [...], "max": [...]}) and
+    the vertex property names. Raises PlyRejected for malformed, truncated,
+    oversized or non-splat files.
+    """
+    file_size = os.path.getsize(path)
+    with open(path, "rb") as f:
+        head = f.read(65536)
+    try:
+        elements, header_size = parse_ply_header(head)
+    except ValueError as e:
+        raise PlyRejected(str(e))
+
+    output_format = _layout_format(elements)
+    expected_size = header_size + sum(dtype.itemsize * count for _, dtype, count in elements)
+    if file_size != expected_size:
+        raise PlyRejected(
+            f"PLY size {file_size} does not match its header ({expected_size} bytes)"
+        )
+
+    counts = {name: count for name, _, count in elements}
+    dtypes = {name: dtype for name, dtype, _ in elements}
+    offsets = _element_offsets(elements, header_size)
+    vertex_count = counts["vertex"]
+    if vertex_count == 0:
+        raise PlyRejected("PLY has no Gaussians")
+    if vertex_count > max_gaussians:
+        raise PlyRejected(f"PLY has {vertex_count} Gaussians, limit is {max_gaussians}", 413)
+
+    if output_format == "compressed_ply":
+        lo, hi = _chunk_bounds(path, dtypes["chunk"], counts["chunk"], offsets["chunk"])
+    else:
+        lo, hi = _vertex_bounds(path, dtypes["vertex"], vertex_count, offsets["vertex"])
+
+    return {
+        "format": output_format,
+        "vertex_count": vertex_count,
+        "bbox": {"min": lo.tolist(), "max": hi.tolist()},
+        "properties": list(dtypes["vertex"].names),
+    }
+
+
+class SceneIndex:
+    """
+    JSON-file index of ingested scene PLYs, keyed by file name.
+    Updates run read-modify-write under a thread lock plus an advisory file
+    lock, so uploads in other workers and optimize_scenes.py cannot lose each
+    other's entries, and are written atomically (see json_store).
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self._lock = threading.Lock()
+
+    def load(self) -> dict:
+        return read_json(self.path) or {}
+
+    def get(self, filename: str):
+        return self.load().get(filename)
+
+    def put(self, filename: str, entry: dict):
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        with self._lock, file_lock(self.path):
+            entries = self.load()
+            entries[filename] = entry
+            atomic_write_json(self.path, entries)
+
+
+def ingest_ply(source, filename: str, destination_dir: str, index: SceneIndex) -> dict:
+    """
+    Copy an uploaded PLY into destination_dir under filename, validating it
+    first, and record it in the scene index. Returns the index entry.
+    Rejected uploads never reach destination_dir.
+    """
+    os.makedirs(destination_dir, exist_ok=True)
+    tmp_path, size, checksum = copy_upload(source, destination_dir)
+    try:
+        metadata = inspect_ply(tmp_path)
+        os.replace(tmp_path, os.path.join(destination_dir, filename))
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+
+    entry = {
+        "filename": filename,
+        "bytes": size,
+        "sha256": checksum,
+        **metadata,
+        "ingested_at": time.time(),
+    }
+    index.put(filename, entry)
+    return entry
@@ -11,12 +11,26 @@ Usage:
 """
 
 import base64
-import io
 import os
 import tempfile
 from pathlib import Path
 
 import modal
+from sharp_pipeline import (
+    CHECKPOINT_NAME,
+    DEFAULT_INFERENCE_MODE,
+    DEFAULT_LOD_FRACTIONS,
+    INFERENCE_MODES,
+    INTERNAL_SHAPE,
+    OUTPUT_FORMATS,
+    POSTPROCESS_BENCHMARK_SIZES,
+    PRECISION_TOLERANCE,
+    PRUNE_MIN_OPACITY,
+    PRUNE_MIN_SCREEN_SIZE_PX,
+    benchmark_covariance_decomposition,
+    benchmark_quaternions,
+    download_image,
+)
 
 # Create the Modal app
 app = modal.App("apple-sharp")
@@ -77,281 +91,26 @@ sharp_image = (
         # Force cache bust
         "echo 'Image built: 2024-12-21-v15-fast-ply'",
     )
+    # Local helper modules shipped alongside this file
+    .add_local_python_source("sharp_executor", "sharp_metrics", "sharp_pipeline", "splat_cache", "splat_io", "splat_jobs")
 )
 
 # Volume to cache the model weights
 model_cache = modal.Volume.from_name("sharp-model-cache", create_if_missing=True)
 
 MODEL_CACHE_PATH = "/cache/models"
-DEFAULT_MODEL_URL = "https://ml-site.cdn-apple.com/models/sharp/sharp_2572gikvuh.pt"
-
-
-# =============================================================================
-# OPTIMIZED GPU-BASED POSTPROCESSING
-# The original Sharp code moves tensors to CPU for SVD and scipy for quaternions.
-# These functions keep everything on GPU for ~10x speedup.
-# =============================================================================
-
-
-def quaternions_from_rotation_matrices_gpu(matrices: "torch.Tensor") -> "torch.Tensor":
-    """
-    Pure PyTorch GPU implementation of rotation matrix to quaternion conversion.
-    Avoids the CPU/scipy bottleneck in the original Sharp code.
-    Based on the Shepperd method for numerical stability.
-    Input: (..., 3, 3) rotation matrices
-    Output: (..., 4) quaternions [w, x, y, z]
-    """
-    import torch
-
-    batch_shape = matrices.shape[:-2]
-    matrices = matrices.reshape(-1, 3, 3)
-
-    # Extract matrix elements
-    m00, m01, m02 = matrices[:, 0, 0], matrices[:, 0, 1], matrices[:, 0, 2]
-    m10, m11, m12 = matrices[:, 1, 0], matrices[:, 1, 1], matrices[:, 1, 2]
-    m20, m21, m22 = matrices[:, 2, 0], matrices[:, 2, 1], matrices[:, 2, 2]
-
-    # Compute quaternion components using Shepperd's method
-    trace = m00 + m11 + m22
-
-    # Allocate output
-    quaternions = torch.zeros(
-        matrices.shape[0], 4, device=matrices.device, dtype=matrices.dtype
-    )
-
-    # Case 1: trace > 0
-    mask1 = trace > 0
-    if mask1.any():
-        s = torch.sqrt(trace[mask1] + 1.0) * 2  # s = 4 * w
-        quaternions[mask1, 0] = 0.25 * s
-        quaternions[mask1, 1] = (m21[mask1] - m12[mask1]) / s
-        quaternions[mask1, 2] = (m02[mask1] - m20[mask1]) / s
-        quaternions[mask1, 3] = (m10[mask1] - m01[mask1]) / s
-
-    # Case 2: m00 > m11 and m00 > m22
-    mask2 = (~mask1) & (m00 > m11) & (m00 > m22)
-    if mask2.any():
-        s = torch.sqrt(1.0 + m00[mask2] - m11[mask2] - m22[mask2]) * 2  # s = 4 * x
-        quaternions[mask2, 0] = (m21[mask2] - m12[mask2]) / s
-        quaternions[mask2, 1] = 0.25 * s
-        quaternions[mask2, 2] = (m01[mask2] + m10[mask2]) / s
-        quaternions[mask2, 3] = (m02[mask2] + m20[mask2]) / s
-
-    # Case 3: m11 > m22
-    mask3 = (~mask1) & (~mask2) & (m11 > m22)
-    if mask3.any():
-        s = torch.sqrt(1.0 + m11[mask3] - m00[mask3] - m22[mask3]) * 2  # s = 4 * y
-        quaternions[mask3, 0] = (m02[mask3] - m20[mask3]) / s
-        quaternions[mask3, 1] = (m01[mask3] + m10[mask3]) / s
-        quaternions[mask3, 2] = 0.25 * s
-        quaternions[mask3, 3] = (m12[mask3] + m21[mask3]) / s
-
-    # Case 4: remaining (m22 is largest)
-    mask4 = (~mask1) & (~mask2) & (~mask3)
-    if mask4.any():
-        s = torch.sqrt(1.0 + m22[mask4] - m00[mask4] - m11[mask4]) * 2  # s = 4 * z
-        quaternions[mask4, 0] = (m10[mask4] - m01[mask4]) / s
-        quaternions[mask4, 1] = (m02[mask4] + m20[mask4]) / s
-        quaternions[mask4, 2] = (m12[mask4] + m21[mask4]) / s
-        quaternions[mask4, 3] = 0.25 * s
-
-    # Normalize quaternions
-    quaternions = quaternions / torch.linalg.norm(quaternions, dim=-1, keepdim=True)
-
-    # Reshape to original batch shape
-    return quaternions.reshape(batch_shape + (4,))
-
-
-def fast_decompose_covariance_matrices_gpu(covariance_matrices: "torch.Tensor"):
-    """GPU-optimized SVD decomposition - stays entirely on GPU."""
-    import torch
-
-    device = covariance_matrices.device
-    dtype = covariance_matrices.dtype
-
-    # Keep on GPU! The original code does .cpu() here which is the bottleneck
-    rotations, singular_values_2, _ = torch.linalg.svd(covariance_matrices)
-
-    # Fix reflection matrices (same logic as original)
-    det = torch.linalg.det(rotations)
-    reflection_mask = det < 0
-    if reflection_mask.any():
-        # Flip the last column of reflections to make them rotations
-        rotations[reflection_mask, :, -1] *= -1
-
-    # Use our pure PyTorch GPU implementation instead of scipy
-    quaternions = quaternions_from_rotation_matrices_gpu(rotations)
-    singular_values = singular_values_2.sqrt()
-
-    return quaternions.to(dtype=dtype), singular_values.to(dtype=dtype)
-
-
-def fast_apply_transform_gpu(gaussians: "Gaussians3D", transform: "torch.Tensor"):
-    """GPU-optimized transform - uses fast GPU SVD."""
-    import torch
-    from sharp.utils.gaussians import Gaussians3D, compose_covariance_matrices
-
-    transform_linear = transform[..., :3, :3]
-    transform_offset = transform[..., :3, 3]
-
-    mean_vectors = gaussians.mean_vectors @ transform_linear.T + transform_offset
-    covariance_matrices = compose_covariance_matrices(
-        gaussians.quaternions, gaussians.singular_values
-    )
-    covariance_matrices = (
-        transform_linear @ covariance_matrices @ transform_linear.transpose(-1, -2)
-    )
-
-    # Use our fast GPU-based decomposition instead of the slow CPU one
-    quaternions, singular_values = fast_decompose_covariance_matrices_gpu(
-        covariance_matrices
-    )
-
-    return Gaussians3D(
-        mean_vectors=mean_vectors,
-        singular_values=singular_values,
-        quaternions=quaternions,
-        colors=gaussians.colors,
-        opacities=gaussians.opacities,
-    )
-
 
-def fast_unproject_gaussians_gpu(gaussians_ndc, extrinsics, intrinsics, image_shape):
-    """GPU-optimized unprojection - keeps all ops on GPU."""
-    from sharp.utils.gaussians import get_unprojection_matrix
-
-    unprojection_matrix = get_unprojection_matrix(extrinsics, intrinsics, image_shape)
-    gaussians = fast_apply_transform_gpu(gaussians_ndc, unprojection_matrix[:3])
-    return gaussians
-
-
-def fast_save_ply_bytes(gaussians, f_px: float, image_shape: tuple) -> bytes:
-    """
-    Optimized PLY export that returns bytes directly (no temp file).
-    Minimizes GPU->CPU transfers and uses efficient numpy operations.
-    """
-    import io
-
-    import numpy as np
-    import torch
-    from plyfile import PlyData, PlyElement
-    from sharp.utils import color_space as cs_utils
-    from sharp.utils.gaussians import convert_rgb_to_spherical_harmonics
-
-    # Move everything to CPU in one batch
-    with torch.no_grad():
-        xyz = gaussians.mean_vectors.flatten(0, 1).cpu()
-        scale_logits = torch.log(gaussians.singular_values).flatten(0, 1).cpu()
-        quaternions = gaussians.quaternions.flatten(0, 1).cpu()
-        colors_linear = gaussians.colors.flatten(0, 1).cpu()
-        opacities = gaussians.opacities.flatten(0, 1).cpu()
-
-        # Color space conversion on CPU (fast)
-        colors_srgb = cs_utils.linearRGB2sRGB(colors_linear)
-        colors = convert_rgb_to_spherical_harmonics(colors_srgb)
-
-        # Opacity logits
-        opacity_logits = torch.log(opacities / (1.0 - opacities)).unsqueeze(-1)
-
-        # Disparity calculation
-        disparity = 1.0 / gaussians.mean_vectors[0, ..., -1].cpu()
-        quantiles = torch.quantile(disparity, q=torch.tensor([0.1, 0.9])).numpy()
-
-    # Convert to numpy efficiently (single operation per tensor)
-    xyz_np = xyz.numpy()
-    colors_np = colors.numpy()
-    opacity_np = opacity_logits.numpy()
-    scale_np = scale_logits.numpy()
-    quat_np = quaternions.numpy()
-
-    num_gaussians = len(xyz_np)
-    image_height, image_width = image_shape
-
-    # Build structured array directly (avoid list(map(tuple, ...)) which is slow)
-    dtype_full = np.dtype(
-        [
-            ("x", "f4"),
-            ("y", "f4"),
-            ("z", "f4"),
-            ("f_dc_0", "f4"),
-            ("f_dc_1", "f4"),
-            ("f_dc_2", "f4"),
-            ("opacity", "f4"),
-            ("scale_0", "f4"),
-            ("scale_1", "f4"),
-            ("scale_2", "f4"),
-            ("rot_0", "f4"),
-            ("rot_1", "f4"),
-            ("rot_2", "f4"),
-            ("rot_3", "f4"),
-        ]
-    )
+# Status records for the async job API (submit_job/job_status/job_result)
+job_records = modal.Dict.from_name("sharp-jobs", create_if_missing=True)
 
-    elements = np.empty(num_gaussians, dtype=dtype_full)
-    elements["x"] = xyz_np[:, 0]
-    elements["y"] = xyz_np[:, 1]
-    elements["z"] = xyz_np[:, 2]
-    elements["f_dc_0"] = colors_np[:, 0]
-    elements["f_dc_1"] = colors_np[:, 1]
-    elements["f_dc_2"] = colors_np[:, 2]
-    elements["opacity"] = opacity_np[:, 0]
-    elements["scale_0"] = scale_np[:, 0]
-    elements["scale_1"] = scale_np[:, 1]
-    elements["scale_2"] = scale_np[:, 2]
-    elements["rot_0"] = quat_np[:, 0]
-    elements["rot_1"] = quat_np[:, 1]
-    elements["rot_2"] = quat_np[:, 2]
-    elements["rot_3"] = quat_np[:, 3]
-
-    vertex_elements = PlyElement.describe(elements, "vertex")
-
-    # Metadata elements (small, fast)
-    image_size_arr = np.array(
-        [(image_width,), (image_height,)], dtype=[("image_size", "u4")]
-    )
-    intrinsic_arr = np.array(
-        [
-            (f_px,),
-            (0,),
-            (image_width * 0.5,),
-            (0,),
-            (f_px,),
-            (image_height * 0.5,),
-            (0,),
-            (0,),
-            (1,),
-        ],
-        dtype=[("intrinsic", "f4")],
-    )
-    extrinsic_arr = np.array(
-        [(v,) for v in np.eye(4).flatten()], dtype=[("extrinsic", "f4")]
-    )
-    frame_arr = np.array([(1,), (num_gaussians,)], dtype=[("frame", "i4")])
-    disparity_arr = np.array(
-        [(quantiles[0],), (quantiles[1],)], dtype=[("disparity", "f4")]
-    )
-    color_space_arr = np.array(
-        [(cs_utils.encode_color_space("sRGB"),)], dtype=[("color_space", "u1")]
-    )
-    version_arr = np.array([(1,), (5,), (0,)], dtype=[("version", "u1")])
-
-    plydata = PlyData(
-        [
-            vertex_elements,
-            PlyElement.describe(extrinsic_arr, "extrinsic"),
-            PlyElement.describe(intrinsic_arr, "intrinsic"),
-            PlyElement.describe(image_size_arr, "image_size"),
-            PlyElement.describe(frame_arr, "frame"),
-            PlyElement.describe(disparity_arr, "disparity"),
-            PlyElement.describe(color_space_arr, "color_space"),
-            PlyElement.describe(version_arr, "version"),
-        ]
-    )
+# Size cap for the generated-splat result cache (LRU eviction beyond this)
+SPLAT_CACHE_MAX_BYTES = int(
+    os.environ.get("SHARP_SPLAT_CACHE_MAX_BYTES", str(10 * 1024**3))
+)
 
-    # Write to memory buffer instead of file
-    buffer = io.BytesIO()
-    plydata.write(buffer)
-    return buffer.getvalue()
+# Requests a container accepts at once; they overlap in the pipelined executor
+# (decode of one image while another is in inference and a third is exported)
+MAX_CONCURRENT_INPUTS = int(os.environ.get("SHARP_MAX_CONCURRENT_INPUTS", "4"))
 
 
 @app.cls(
@@ -361,216 +120,232 @@ def fast_save_ply_bytes(gaussians, f_px: float, image_shape: tuple) -> bytes:
     volumes={MODEL_CACHE_PATH: model_cache},
     scaledown_window=300,  # Keep container warm for 5 minutes
 )
+@modal.concurrent(max_inputs=MAX_CONCURRENT_INPUTS)
 class SharpModel:
     """Sharp model class for image-to-3D Gaussian splat conversion.
     The model is loaded once when the container starts and kept in GPU memory
     for fast inference (<1 second per image).
+    inference_mode selects fp32, bf16/fp16 autocast or a torch.compile variant
+    (see INFERENCE_MODES); use check_precision to validate a mode against fp32.
+    Concurrent inputs share one PipelinedExecutor (see sharp_executor).
     """
 
+    inference_mode: str = modal.parameter(default=DEFAULT_INFERENCE_MODE)
+
     @modal.enter()
     def load_model(self):
         """Load the Sharp model into GPU memory when the container starts."""
-        import subprocess
         import time
 
-        import torch
+        from sharp_executor import PipelinedExecutor
+        from sharp_pipeline import SharpPipeline, ensure_checkpoint
 
         start_time = time.time()
 
         # Set cache directory
         os.environ["TORCH_HOME"] = MODEL_CACHE_PATH
 
-        # Determine device
-        if torch.cuda.is_available():
-            self.device = torch.device("cuda")
-            print(f"Using CUDA device: {torch.cuda.get_device_name(0)}")
-        else:
-            self.device = torch.device("cpu")
-            print("Warning: CUDA not available, using CPU")
-
         # Download checkpoint if not cached
-        checkpoint_path = Path(MODEL_CACHE_PATH) / "sharp_2572gikvuh.pt"
-        if not checkpoint_path.exists():
-            print(f"Downloading Sharp model checkpoint from {DEFAULT_MODEL_URL}...")
-            subprocess.run(
-                ["wget", "-q", DEFAULT_MODEL_URL, "-O", str(checkpoint_path)],
-                check=True,
-            )
+        checkpoint_path = Path(MODEL_CACHE_PATH) / CHECKPOINT_NAME
+        if ensure_checkpoint(str(checkpoint_path)):
             model_cache.commit()
             print("Model checkpoint downloaded and cached.")
         else:
             print("Using cached model checkpoint.")
 
-        # Import Sharp modules
-        from sharp.models import PredictorParams, create_predictor
-
-        # Load the model weights
-        print("Loading model weights...")
-        state_dict = torch.load(
-            checkpoint_path, weights_only=True, map_location=self.device
-        )
+        self.pipeline = SharpPipeline(str(checkpoint_path), inference_mode=self.inference_mode)
+        self.executor = PipelinedExecutor(self.pipeline)
 
-        # Create and initialize the predictor
-        print("Creating predictor model...")
-        self.predictor = create_predictor(PredictorParams())
-        self.predictor.load_state_dict(state_dict)
-        self.predictor.eval()
-        self.predictor.to(self.device)
+        # Result cache for repeat generations, stored on the model cache volume
+        from splat_cache import SplatCache, default_cache_dir
 
-        # Warmup: Run a dummy forward pass to ensure CUDA kernels are compiled
-        print("Warming up model with dummy inference...")
-        with torch.no_grad():
-            import torch.nn.functional as F
+        self.splat_cache = SplatCache(
+            default_cache_dir(MODEL_CACHE_PATH),
+            max_bytes=SPLAT_CACHE_MAX_BYTES,
+            on_write=model_cache.commit,
+        )
+        print(f"Splat cache: {self.splat_cache.directory} {self.splat_cache.stats()}")
 
-            dummy_image = torch.randn(1, 3, 1536, 1536, device=self.device)
-            dummy_disparity = torch.tensor([1.0], device=self.device)
-            _ = self.predictor(dummy_image, dummy_disparity)
+        # Async jobs are dispatched to run_job on any SharpModel container
+        from splat_jobs import JobQueue, ModalDictJobStore
 
-        # Sync CUDA to ensure warmup is complete
-        if torch.cuda.is_available():
-            torch.cuda.synchronize()
+        self.jobs = JobQueue(ModalDictJobStore(job_records), self._dispatch_job)
 
         elapsed = time.time() - start_time
         print(f"Sharp model loaded and ready in {elapsed:.2f}s!")
 
+    def _postprocess_params(self, output_format: str, lod_fraction: float = 1.0) -> dict:
+        """Parameters that affect the exported splats; part of the cache key."""
+        return {
+            "internal_shape": list(INTERNAL_SHAPE),
+            "inference_mode": self.inference_mode,
+            "prune_min_opacity": PRUNE_MIN_OPACITY,
+            "prune_min_screen_size_px": PRUNE_MIN_SCREEN_SIZE_PX,
+            "lod_fraction": lod_fraction,
+            "format": output_format,
+        }
+
+    def _cache_key(self, image_bytes: bytes, output_format: str, lod_fraction: float = 1.0) -> str:
+        from splat_cache import splat_cache_key
+
+        return splat_cache_key(
+            image_bytes,
+            CHECKPOINT_NAME,
+            self._postprocess_params(output_format, lod_fraction),
+        )
+
+    def _cached_predict(
+        self, image_bytes: bytes, output_format: str = "ply", lod_fractions=(1.0,)
+    ):
+        """
+        Return (ply_list, cache_hit, timings) for an image with one output per
+        LOD fraction, running inference only when some level is not already in
+        the splat cache. timings holds per-stage seconds (empty on a hit).
+        """
+        import time
+
+        if output_format not in OUTPUT_FORMATS:
+            raise ValueError(
+                f"Unknown output format {output_format!r}, expected one of {', '.join(OUTPUT_FORMATS)}"
+            )
+        if not lod_fractions or not all(0.0 < f <= 1.0 for f in lod_fractions):
+            raise ValueError("LOD fractions must be in (0, 1]")
+
+        lookup_start = time.time()
+        keys = [self._cache_key(image_bytes, output_format, f) for f in lod_fractions]
+        cached = [self.splat_cache.get(key) for key in keys]
+        if all(ply_bytes is not None for ply_bytes in cached):
+            print(
+                f"Splat cache hit {keys[0][:12]} in {time.time() - lookup_start:.3f}s "
+                f"{self.splat_cache.stats()}"
+            )
+            return cached, True, {}
+
+        ply_list, timings = self.executor.submit(image_bytes, output_format, lod_fractions).result()
+        for key, ply_bytes in zip(keys, ply_list):
+            self.splat_cache.put(key, ply_bytes)
+        return ply_list, False, timings
+
     @modal.method()
-    def predict(self, image_bytes: bytes) -> bytes:
+    def predict(self, image_bytes: bytes, output_format: str = "ply") -> bytes:
         """
         Convert an image to 3D Gaussian splats.
+        Results are served from the splat cache when the same image has
+        already been converted with the same model and parameters.
         Args:
             image_bytes: The input image as bytes (PNG, JPG, or WebP)
+            output_format: "ply" (float32), "chunked_ply" (float32 in spatial
+                order) or "compressed_ply" (quantized)
         Returns:
             The PLY file containing 3D Gaussian splats as bytes
         """
-        import time
+        ply_list, _, _ = self._cached_predict(image_bytes, output_format)
+        return ply_list[0]
 
-        import numpy as np
-        import torch
-        import torch.nn.functional as F
-        from PIL import Image
+    @modal.method()
+    def predict_lods(
+        self,
+        image_bytes: bytes,
+        lod_fractions: list[float] = DEFAULT_LOD_FRACTIONS,
+        output_format: str = "ply",
+    ) -> list[bytes]:
+        """
+        Convert an image to 3D Gaussian splats at several levels of detail.
+        Each level keeps the given fraction of the pruned Gaussians, ranked by
+        opacity times projected footprint, so clients can fetch a light level
+        first. All levels come from a single inference pass.
+        Returns:
+            One PLY file per fraction, in the order given
+        """
+        ply_list, _, _ = self._cached_predict(image_bytes, output_format, tuple(lod_fractions))
+        return ply_list
 
-        # Note: we use fast_save_ply_bytes instead of sharp.utils.gaussians.save_ply
-        from sharp.utils.io import convert_focallength
+    @modal.method()
+    def predict_batch(self, images: list[bytes], output_format: str = "ply") -> list[bytes]:
+        """
+        Convert several images to 3D Gaussian splats in batched forward passes.
+        Images are resized to the internal resolution, stacked into micro-batches
+        of up to MAX_BATCH_SIZE and run through the predictor together; the
+        unprojection and PLY export then fan back out per image. Images already
+        in the splat cache (or repeated within the batch) skip inference.
+        Args:
+            images: The input images as bytes (PNG, JPG, or WebP)
+            output_format: "ply" (float32), "chunked_ply" (float32 in spatial
+                order) or "compressed_ply" (quantized)
+        Returns:
+            One PLY file per input image, in input order
+        """
+        import time
 
         start_time = time.time()
-
-        # Load and preprocess the image
-        img_pil = Image.open(io.BytesIO(image_bytes))
-
-        # Convert to RGB if necessary
-        if img_pil.mode in ("RGBA", "LA", "P"):
-            img_pil = img_pil.convert("RGB")
-        elif img_pil.mode != "RGB":
-            img_pil = img_pil.convert("RGB")
-
-        image = np.array(img_pil)
-        height, width = image.shape[:2]
-
-        # Calculate focal length (default to 30mm equivalent)
-        # This matches Sharp's default behavior when EXIF is missing
-        f_35mm = 30.0
-        f_px = convert_focallength(width, height, f_35mm)
-
-        print(f"Processing image: {width}x{height}, focal length: {f_px:.2f}px")
-
-        # Internal resolution for Sharp model
-        internal_shape = (1536, 1536)
-
-        # Preprocess image
-        image_pt = (
-            torch.from_numpy(image.copy()).float().to(self.device).permute(2, 0, 1)
-            / 255.0
+        if output_format not in OUTPUT_FORMATS:
+            raise ValueError(
+                f"Unknown output format {output_format!r}, expected one of {', '.join(OUTPUT_FORMATS)}"
+            )
+        keys = [self._cache_key(image_bytes, output_format) for image_bytes in images]
+        results = [None] * len(images)
+
+        # Indices of the first occurrence of each uncached image
+        pending = {}
+        for i, key in enumerate(keys):
+            if key in pending:
+                continue
+            cached = self.splat_cache.get(key)
+            if cached is not None:
+                results[i] = cached
+            else:
+                pending[key] = i
+        pending_indices = list(pending.values())
+        print(
+            f"Batch of {len(images)}: {len(images) - len(pending_indices)} from cache, "
+            f"{len(pending_indices)} to generate"
         )
-        disparity_factor = torch.tensor([f_px / width], device=self.device).float()
 
-        image_resized = F.interpolate(
-            image_pt[None],
-            size=(internal_shape[1], internal_shape[0]),
-            mode="bilinear",
-            align_corners=True,
+        generated = self.pipeline.predict_batch(
+            [images[i] for i in pending_indices], output_format
         )
+        for i, ply_bytes in zip(pending_indices, generated):
+            results[i] = ply_bytes
+            self.splat_cache.put(keys[i], ply_bytes)
 
-        # Run inference
-        print("Running inference...")
-        inference_start = time.time()
-        with torch.no_grad():
-            gaussians_ndc = self.predictor(image_resized, disparity_factor)
-
-        if torch.cuda.is_available():
-            torch.cuda.synchronize()
-        inference_time = time.time() - inference_start
-        print(f"Inference completed in {inference_time:.3f}s")
+        # Fill in duplicates of images generated in this batch
+        for i, key in enumerate(keys):
+            if results[i] is None:
+                results[i] = results[pending[key]]
 
-        # DEBUG: Check inference output
-        print(f"Gaussians NDC stats:")
-        print(
-            f"  Mean vectors range: {gaussians_ndc.mean_vectors.min():.3f} to {gaussians_ndc.mean_vectors.max():.3f}"
-        )
-        print(
-            f"  Colors range: {gaussians_ndc.colors.min():.3f} to {gaussians_ndc.colors.max():.3f}"
-        )
-        print(
-            f"  Opacities range: {gaussians_ndc.opacities.min():.3f} to {gaussians_ndc.opacities.max():.3f}"
-        )
+        elapsed = time.time() - start_time
+        print(f"Batch of {len(images)} processed in {elapsed:.3f}s")
 
-        # Postprocess: Convert to metric space
-        print("Running postprocessing...")
-        postprocess_start = time.time()
-
-        intrinsics = torch.tensor(
-            [
-                [f_px, 0, width / 2, 0],
-                [0, f_px, height / 2, 0],
-                [0, 0, 1, 0],
-                [0, 0, 0, 1],
-            ],
-            dtype=torch.float32,
-            device=self.device,
-        )
-        intrinsics_resized = intrinsics.clone()
-        intrinsics_resized[0] *= internal_shape[0] / width
-        intrinsics_resized[1] *= internal_shape[1] / height
-
-        unproject_start = time.time()
-        # Use fast GPU-based unprojection (original Sharp code moves to CPU for SVD)
-        gaussians = fast_unproject_gaussians_gpu(
-            gaussians_ndc,
-            torch.eye(4, device=self.device),
-            intrinsics_resized,
-            internal_shape,
-        )
-        if torch.cuda.is_available():
-            torch.cuda.synchronize()
-        unproject_time = time.time() - unproject_start
-        print(f"  unproject_gaussians (GPU): {unproject_time:.3f}s")
+        return results
 
-        # DEBUG: Check unprojection output
-        print(f"Gaussians after unproject:")
-        print(
-            f"  Mean vectors range: {gaussians.mean_vectors.min():.3f} to {gaussians.mean_vectors.max():.3f}"
+    def _dispatch_job(self, job_id: str, payload: dict):
+        self.run_job.spawn(
+            job_id, payload["image_bytes"], payload["format"], payload["lod"]
         )
-        print(
-            f"  Colors range: {gaussians.colors.min():.3f} to {gaussians.colors.max():.3f}"
-        )
-        print(
-            f"  Opacities range: {gaussians.opacities.min():.3f} to {gaussians.opacities.max():.3f}"
-        )
-
-        # Save to PLY (in-memory, no temp files)
-        save_start = time.time()
-        ply_bytes = fast_save_ply_bytes(gaussians, f_px, (height, width))
-        save_time = time.time() - save_start
-        print(f"  save_ply (fast): {save_time:.3f}s")
-
-        postprocess_time = time.time() - postprocess_start
-        print(f"  postprocessing total: {postprocess_time:.3f}s")
 
-        elapsed = time.time() - start_time
-        print(
-            f"Total processing time: {elapsed:.3f}s (inference: {inference_time:.3f}s)"
+    @modal.method()
+    def run_job(
+        self, job_id: str, image_bytes: bytes, output_format: str, lod_fraction: float
+    ):
+        """
+        Worker for the async job API: generate (or look up) the splat and
+        leave it in the splat cache, where job_result reads it back.
+        """
+        self.jobs.run(
+            job_id,
+            lambda: self._cached_predict(image_bytes, output_format, (lod_fraction,)),
         )
 
-        return ply_bytes
+    @modal.method()
+    def check_precision(
+        self, image_bytes: bytes, tolerance: float = PRECISION_TOLERANCE, runs: int = 3
+    ) -> dict:
+        """
+        Compare this container's inference mode against eager fp32 on one image.
+        Returns per-field errors, whether every field is within tolerance, and
+        the median inference latency of both paths so modes can be ranked.
+        """
+        return self.pipeline.check_precision(image_bytes, tolerance, runs)
 
     @modal.fastapi_endpoint(method="POST")
     def generate(self, request: dict) -> dict:
@@ -579,15 +354,28 @@ class SharpModel:
         Request body:
             {
                 "image": "<base64-encoded image data>",
-                "image_url": "<URL to image>" (alternative to base64)
+                "image_url": "<URL to image>" (alternative to base64),
+                "format": "ply" | "chunked_ply" | "compressed_ply" (optional, default "ply"),
+                "lod_levels": [1.0, 0.5, 0.2] (optional)
             }
         Response:
             {
                 "success": true,
                 "ply_base64": "<base64-encoded PLY data>",
+                "format": "ply",
+                "cached": false,
+                "timings": {"decode_seconds": 0.05, "inference_seconds": 0.6, ...},
                 "message": "3D Gaussian splats generated successfully"
             }
+        timings has one entry per pipeline stage and is empty for cache hits.
+        When lod_levels is given, "lods" is added with one
+        {"fraction": 0.5, "ply_base64": "..."} entry per level and ply_base64
+        holds the first level. For "chunked_ply", "chunk_index" (and one per
+        LOD entry) lists the byte range and bounding box of each spatial chunk
+        of the file, so a viewer can range-request the nearest chunks first.
         """
+        from splat_io import ply_chunk_index
+
         try:
             # Get image data from request
             image_bytes = None
@@ -597,28 +385,45 @@ class SharpModel:
                 image_bytes = base64.b64decode(request["image"])
             elif "image_url" in request and request["image_url"]:
                 # Download from URL
-                import requests
-
-                response = requests.get(request["image_url"], timeout=30)
-                response.raise_for_status()
-                image_bytes = response.content
+                image_bytes = download_image(request["image_url"])
             else:
                 return {
                     "success": False,
                     "error": "No image provided. Send 'image' (base64) or 'image_url'.",
                 }
 
-            # Run prediction - use .local() to call the Modal method from within the class
-            ply_bytes = self.predict.local(image_bytes)
+            # Run prediction (served from the splat cache on repeat uploads)
+            output_format = request.get("format") or "ply"
+            lod_fractions = tuple(float(f) for f in request.get("lod_levels") or (1.0,))
+            ply_list, cache_hit, timings = self._cached_predict(
+                image_bytes, output_format, lod_fractions
+            )
 
             # Encode result as base64
-            ply_base64 = base64.b64encode(ply_bytes).decode("utf-8")
+            ply_base64 = base64.b64encode(ply_list[0]).decode("utf-8")
 
-            return {
+            response = {
                 "success": True,
                 "ply_base64": ply_base64,
+                "format": output_format,
+                "cached": cache_hit,
+                "timings": timings,
                 "message": "3D Gaussian splats generated successfully using Apple Sharp",
             }
+            chunked = output_format == "chunked_ply"
+            if chunked:
+                response["chunk_index"] = ply_chunk_index(ply_list[0])
+            if request.get("lod_levels"):
+                response["lods"] = []
+                for fraction, ply_bytes in zip(lod_fractions, ply_list):
+                    lod = {
+                        "fraction": fraction,
+                        "ply_base64": base64.b64encode(ply_bytes).decode("utf-8"),
+                    }
+                    if chunked:
+                        lod["chunk_index"] = ply_chunk_index(ply_bytes)
+                    response["lods"].append(lod)
+            return response
 
         except Exception as e:
             print(f"Error during generation: {e}")
@@ -627,6 +432,299 @@ class SharpModel:
             traceback.print_exc()
             return {"success": False, "error": str(e)}
 
+    @modal.fastapi_endpoint(method="POST")
+    def generate_stream(self, request: dict):
+        """
+        Web endpoint returning the generated PLY as a raw binary stream.
+        Takes the same request body as generate ("image" or "image_url",
+        optional "format" and a single optional "lod" fraction) but skips the
+        base64/JSON wrapping: the body is streamed in chunks as soon as the
+        Gaussians are on the CPU, with Content-Length known up front.
+        Response headers:
+            X-Sharp-Cache: "hit" | "miss"
+            X-Sharp-Format: output format
+            X-Sharp-Gaussians: number of Gaussians in the file (misses only)
+            Server-Timing: per-stage durations up to export (misses only)
+        Errors are returned as JSON {"success": false, "error": "..."} with a
+        4xx/5xx status.
+        """
+        from fastapi.responses import JSONResponse, Response, StreamingResponse
+        from sharp_metrics import server_timing_header
+        from splat_io import element_count, iter_ply, ply_size
+
+        try:
+            if request.get("image"):
+                image_bytes = base64.b64decode(request["image"])
+            elif request.get("image_url"):
+                image_bytes = download_image(request["image_url"])
+            else:
+                return JSONResponse(
+                    {
+                        "success": False,
+                        "error": "No image provided. Send 'image' (base64) or 'image_url'.",
+                    },
+                    status_code=400,
+                )
+
+            output_format = request.get("format") or "ply"
+            lod_fraction = float(request.get("lod") or 1.0)
+            if output_format not in OUTPUT_FORMATS or not 0.0 < lod_fraction <= 1.0:
+                return JSONResponse(
+                    {"success": False, "error": "Invalid 'format' or 'lod'"},
+                    status_code=400,
+                )
+
+            headers = {"X-Sharp-Format": output_format}
+            key = self._cache_key(image_bytes, output_format, lod_fraction)
+            cached = self.splat_cache.get(key)
+            if cached is not None:
+                headers["X-Sharp-Cache"] = "hit"
+                return Response(
+                    content=cached, media_type="application/octet-stream", headers=headers
+                )
+
+            levels, timings = self.executor.submit(
+                image_bytes, output_format, (lod_fraction,), encode=False
+            ).result()
+            elements = levels[0]
+            num_gaussians = element_count(elements)
+            headers.update(
+                {
+                    "X-Sharp-Cache": "miss",
+                    "X-Sharp-Gaussians": str(num_gaussians),
+                    "Server-Timing": server_timing_header(timings),
+                    "Content-Length": str(ply_size(elements)),
+                }
+            )
+            # Tee into the cache while streaming; a dropped client discards the entry
+            return StreamingResponse(
+                self.splat_cache.tee(key, iter_ply(elements)),
+                media_type="application/octet-stream",
+                headers=headers,
+            )
+
+        except Exception as e:
+            print(f"Error during streaming generation: {e}")
+            import traceback
+
+            traceback.print_exc()
+            return JSONResponse({"success": False, "error": str(e)}, status_code=500)
+
+    @modal.fastapi_endpoint(method="POST")
+    def generate_batch(self, request: dict) -> dict:
+        """
+        Web endpoint for generating 3D Gaussian splats from several images at once.
+        Request body:
+            {
+                "images": ["<base64-encoded image data>", ...],
+                "image_urls": ["<URL to image>", ...] (alternative to base64),
+                "format": "ply" | "chunked_ply" | "compressed_ply" (optional, default "ply")
+            }
+        Response:
+            {
+                "success": true,
+                "count": 2,
+                "results": [{"ply_base64": "<base64-encoded PLY data>"}, ...],
+                "message": "3D Gaussian splats generated successfully"
+            }
+        Results are returned in the same order as the input images.
+        """
+        try:
+            if request.get("images"):
+                images = [base64.b64decode(image) for image in request["images"]]
+            elif request.get("image_urls"):
+                images = [download_image(url) for url in request["image_urls"]]
+            else:
+                return {
+                    "success": False,
+                    "error": "No images provided. Send 'images' (base64 list) or 'image_urls'.",
+                }
+
+            output_format = request.get("format") or "ply"
+            ply_list = self.predict_batch.local(images, output_format)
+
+            return {
+                "success": True,
+                "format": output_format,
+                "count": len(ply_list),
+                "results": [
+                    {"ply_base64": base64.b64encode(ply_bytes).decode("utf-8")}
+                    for ply_bytes in ply_list
+                ],
+                "message": f"Generated {len(ply_list)} 3D Gaussian splat scenes using Apple Sharp",
+            }
+
+        except Exception as e:
+            print(f"Error during batch generation: {e}")
+            import traceback
+
+            traceback.print_exc()
+            return {"success": False, "error": str(e)}
+
+    @modal.fastapi_endpoint(method="POST")
+    def submit_job(self, request: dict) -> dict:
+        """
+        Queue a splat generation job and return immediately.
+        Request body: same as generate_stream ("image" or "image_url",
+        optional "format" and "lod").
+        Response:
+            {
+                "success": true,
+                "job_id": "<id>",
+                "status": "queued" | "running" | "done",
+                "deduplicated": false
+            }
+        The job id is derived from the image and parameters, so submitting the
+        same request again returns the existing job ("deduplicated": true).
+        Poll job_status?job_id=... and fetch job_result?job_id=... when done.
+        """
+        try:
+            if request.get("image"):
+                image_bytes = base64.b64decode(request["image"])
+            elif request.get("image_url"):
+                image_bytes = download_image(request["image_url"])
+            else:
+                return {
+                    "success": False,
+                    "error": "No image provided. Send 'image' (base64) or 'image_url'.",
+                }
+
+            output_format = request.get("format") or "ply"
+            lod_fraction = float(request.get("lod") or 1.0)
+            if output_format not in OUTPUT_FORMATS or not 0.0 < lod_fraction <= 1.0:
+                return {"success": False, "error": "Invalid 'format' or 'lod'"}
+
+            job_id = self._cache_key(image_bytes, output_format, lod_fraction)
+            record, created = self.jobs.submit(
+                job_id,
+                {"image_bytes": image_bytes, "format": output_format, "lod": lod_fraction},
+                {"format": output_format, "lod": lod_fraction},
+            )
+            return {
+                "success": True,
+                "job_id": job_id,
+                "status": record["status"],
+                "deduplicated": not created,
+            }
+
+        except Exception as e:
+            print(f"Error submitting job: {e}")
+            import traceback
+
+            traceback.print_exc()
+            return {"success": False, "error": str(e)}
+
+    @modal.fastapi_endpoint(method="GET")
+    def job_status(self, job_id: str) -> dict:
+        """Status record of an async job (see submit_job)."""
+        record = self.jobs.status(job_id)
+        if record is None:
+            return {"success": False, "error": f"Unknown job {job_id}"}
+        return {"success": True, **record}
+
+    @modal.fastapi_endpoint(method="GET")
+    def job_result(self, job_id: str):
+        """
+        Binary PLY result of a finished async job (application/octet-stream).
+        Returns 404 for unknown jobs, 409 while the job is still queued or
+        running and 500 if it failed.
+        """
+        from fastapi.responses import JSONResponse, Response
+
+        record = self.jobs.status(job_id)
+        if record is None:
+            return JSONResponse(
+                {"success": False, "error": f"Unknown job {job_id}"}, status_code=404
+            )
+        if record["status"] != "done":
+            return JSONResponse(
+                {"success": False, "status": record["status"], "error": record["error"]},
+                status_code=500 if record["status"] == "failed" else 409,
+            )
+
+        ply_bytes = self.splat_cache.get(job_id)
+        if ply_bytes is None:
+            # Written by another container: pick up its volume commit
+            model_cache.reload()
+            ply_bytes = self.splat_cache.get(job_id)
+        if ply_bytes is None:
+            self.jobs.fail(job_id, "Result evicted from cache")
+            return JSONResponse(
+                {"success": False, "error": "Result evicted from cache, resubmit the job"},
+                status_code=410,
+            )
+        return Response(
+            content=ply_bytes,
+            media_type="application/octet-stream",
+            headers={"X-Sharp-Format": record["params"].get("format", "ply")},
+        )
+
+    @modal.fastapi_endpoint(method="GET")
+    def metrics(self, format: str = "json"):
+        """
+        Per-stage timing histograms of the requests served by this container.
+        format=json (default) returns count, sum, mean, approximate p50/p90/p99
+        and cumulative buckets per stage; format=prometheus returns the
+        Prometheus text exposition format.
+        """
+        from fastapi.responses import PlainTextResponse
+
+        if format == "prometheus":
+            return PlainTextResponse(self.pipeline.histograms.prometheus())
+        return {
+            "success": True,
+            "inference_mode": self.inference_mode,
+            "stages": self.pipeline.histograms.snapshot(),
+        }
+
+    @modal.fastapi_endpoint(method="GET")
+    def cache_stats(self) -> dict:
+        """Hit/miss counters and size of the splat result cache in this container."""
+        return {"success": True, "cache": self.splat_cache.stats()}
+
+
+def compare_inference_modes(image_bytes: bytes, tolerance: float = PRECISION_TOLERANCE):
+    """
+    Run check_precision for every inference mode and report the fastest one
+    whose output stays within tolerance of fp32.
+    """
+    results = []
+    for mode in INFERENCE_MODES:
+        try:
+            result = SharpModel(inference_mode=mode).check_precision.remote(
+                image_bytes, tolerance
+            )
+        except Exception as e:
+            print(f"{mode:>14}: failed ({e})")
+            continue
+        results.append(result)
+        worst = max(e["relative"] for e in result["errors"].values())
+        print(
+            f"{mode:>14}: {result['latency_seconds'] * 1000:8.1f} ms "
+            f"(fp32 {result['fp32_latency_seconds'] * 1000:8.1f} ms), "
+            f"max relative error {worst:.2e}, "
+            f"{'OK' if result['within_tolerance'] else 'OUT OF TOLERANCE'}"
+        )
+
+    accepted = [r for r in results if r["within_tolerance"]]
+    if accepted:
+        best = min(accepted, key=lambda r: r["latency_seconds"])
+        print(f"Fastest mode within tolerance {tolerance}: {best['inference_mode']}")
+    else:
+        print(f"No mode stayed within tolerance {tolerance}")
+
+
+@app.function(image=sharp_image, gpu="A10G", timeout=600)
+def benchmark_quaternions_gpu(sizes=POSTPROCESS_BENCHMARK_SIZES) -> list:
+    """Run benchmark_quaternions on the deployment GPU."""
+    return benchmark_quaternions(sizes, "cuda")
+
+
+@app.function(image=sharp_image, gpu="A10G", timeout=600)
+def benchmark_covariance_decomposition_gpu(sizes=POSTPROCESS_BENCHMARK_SIZES) -> list:
+    """Run benchmark_covariance_decomposition on the deployment GPU."""
+    return benchmark_covariance_decomposition(sizes, "cuda")
+
 
 @app.local_entrypoint()
 def main():
@@ -634,24 +732,53 @@ def main():
     import sys
 
     if len(sys.argv) < 2:
-        print("Usage: modal run sharp_api.py -- <image_path>")
-        print("  Converts an image to 3D Gaussian splats")
+        print("Usage: modal run sharp_api.py -- <image_path> [<image_path> ...]")
+        print("  Converts one or more images to 3D Gaussian splats")
+        print("       modal run sharp_api.py -- --compare-modes <image_path> [tolerance]")
+        print("  Benchmarks every inference mode against fp32 on one image")
+        print("       modal run sharp_api.py -- --bench-quaternions [count ...]")
+        print("  Benchmarks rotation matrix to quaternion conversion on the GPU")
+        print("       modal run sharp_api.py -- --bench-covariance [count ...]")
+        print("  Benchmarks covariance decomposition (Jacobi vs SVD) on the GPU")
+        return
+
+    if sys.argv[1] == "--bench-covariance":
+        sizes = [int(n) for n in sys.argv[2:]] or list(POSTPROCESS_BENCHMARK_SIZES)
+        benchmark_covariance_decomposition_gpu.remote(sizes)
+        return
+
+    if sys.argv[1] == "--bench-quaternions":
+        sizes = [int(n) for n in sys.argv[2:]] or list(POSTPROCESS_BENCHMARK_SIZES)
+        benchmark_quaternions_gpu.remote(sizes)
+        return
+
+    if sys.argv[1] == "--compare-modes":
+        with open(sys.argv[2], "rb") as f:
+            image_bytes = f.read()
+        tolerance = float(sys.argv[3]) if len(sys.argv) > 3 else PRECISION_TOLERANCE
+        compare_inference_modes(image_bytes, tolerance)
         return
 
-    image_path = sys.argv[1]
+    image_paths = sys.argv[1:]
 
-    print(f"Processing image: {image_path}")
+    print(f"Processing images: {', '.join(image_paths)}")
 
-    with open(image_path, "rb") as f:
-        image_bytes = f.read()
+    images = []
+    for image_path in image_paths:
+        with open(image_path, "rb") as f:
+            images.append(f.read())
 
-    # Run prediction
+    # Run prediction (batched when more than one image is given)
     model = SharpModel()
-    ply_bytes = model.predict.remote(image_bytes)
+    if len(images) == 1:
+        ply_list = [model.predict.remote(images[0])]
+    else:
+        ply_list = model.predict_batch.remote(images)
 
     # Save output
-    output_path = Path(image_path).stem + "_gaussian.ply"
-    with open(output_path, "wb") as f:
-        f.write(ply_bytes)
+    for image_path, ply_bytes in zip(image_paths, ply_list):
+        output_path = Path(image_path).stem + "_gaussian.ply"
+        with open(output_path, "wb") as f:
+            f.write(ply_bytes)
 
-    print(f"Saved 3D Gaussian splats to: {output_path}")
\ No newline at end of file
+        print(f"Saved 3D Gaussian splats to: {output_path}")
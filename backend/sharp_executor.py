@@ -0,0 +1,235 @@
+"""
+Pipelined execution of the Sharp pipeline for a stream of requests.
+
+SharpPipeline.predict runs decode, inference and export strictly in series,
+so the GPU idles while an image is decoded or a PLY is serialized.
+PipelinedExecutor splits a request into three stages, each on its own thread
+(and CUDA stream), connected by bounded queues:
+
+    prepare    decode + upload + resize             (prepare stream)
+    inference  predictor forward pass               (inference stream)
+    export     unproject, prune, LOD, device->host  (export stream)
+               copy into pinned buffers, PLY encode
+
+While one request is in inference, the next is being decoded and the
+previous one exported. Cross-stream hand-offs wait on CUDA events, so no
+stage blocks the device. On CPU the streams are no-ops, but decode and
+encode still overlap with inference in the thread pool.
+"""
+
+import queue
+import threading
+from concurrent.futures import Future
+from contextlib import nullcontext
+
+from sharp_metrics import StageTimer
+
+# Requests buffered between two stages; bounds memory held by in-flight work
+DEFAULT_QUEUE_DEPTH = 2
+
+# Headroom when (re)allocating pinned staging buffers, so slightly larger
+# scenes do not force a new page-locked allocation every time
+PINNED_GROWTH = 1.25
+
+
+class PinnedHostBuffers:
+    """
+    Reusable page-locked staging buffers for device -> host copies.
+    Copies into pinned memory can run asynchronously on the copying stream.
+    Each LOD level has its own set of buffers, reused between requests, so
+    the returned tensors are only valid until the next to_host call for the
+    same level (the export stage encodes every level before then).
+    """
+
+    def __init__(self):
+        self._buffers = {}
+
+    def _copy(self, key: tuple, tensor):
+        import torch
+
+        numel = tensor.numel()
+        buffer = self._buffers.get(key)
+        if buffer is None or buffer.numel() < numel or buffer.dtype != tensor.dtype:
+            buffer = torch.empty(int(numel * PINNED_GROWTH), dtype=tensor.dtype, pin_memory=True)
+            self._buffers[key] = buffer
+        host = buffer[:numel].view(tensor.shape)
+        host.copy_(tensor, non_blocking=True)
+        return host
+
+    def to_host(self, gaussians, level: int = 0):
+        """Copy Gaussians3D to level's pinned host tensors and wait for the copies."""
+        import torch
+        from sharp.utils.gaussians import Gaussians3D
+
+        host = Gaussians3D(
+            **{
+                name: self._copy((level, name), getattr(gaussians, name))
+                for name in Gaussians3D._fields
+            }
+        )
+        copied = torch.cuda.Event()
+        copied.record()
+        copied.synchronize()
+        return host
+
+
+class _Request:
+    """A request moving through the stages, with its intermediate results."""
+
+    def __init__(self, image_bytes, output_format, lod_fractions, encode, timer):
+        self.future = Future()
+        self.image_bytes = image_bytes
+        self.output_format = output_format
+        self.lod_fractions = lod_fractions
+        self.encode = encode
+        self.timer = timer
+        self.ready = None  # CUDA event marking the previous stage's output
+        self.prepared = None
+        self.gaussians_ndc = None
+
+
+class PipelinedExecutor:
+    """
+    Runs requests through a SharpPipeline in overlapping stages.
+
+        executor = PipelinedExecutor(pipeline)
+        future = executor.submit(image_bytes)
+        ply_list, timings = future.result()
+
+    Results match SharpPipeline.predict_timed (or predict_elements with
+    encode=False, which skips the pinned staging buffers).
+    """
+
+    def __init__(self, pipeline, queue_depth: int = DEFAULT_QUEUE_DEPTH):
+        import torch
+
+        self.pipeline = pipeline
+        self._cuda = pipeline.device.type == "cuda"
+        self._pinned = PinnedHostBuffers() if self._cuda else None
+
+        stages = (
+            ("prepare", self._prepare),
+            ("inference", self._infer),
+            ("export", self._export),
+        )
+        self._queues = [queue.Queue(maxsize=queue_depth) for _ in stages]
+        self._threads = []
+        for i, (name, work) in enumerate(stages):
+            stream = torch.cuda.Stream(pipeline.device) if self._cuda else None
+            outbox = self._queues[i + 1] if i + 1 < len(stages) else None
+            thread = threading.Thread(
+                target=self._run_stage,
+                args=(work, stream, self._queues[i], outbox),
+                name=f"sharp-{name}",
+                daemon=True,
+            )
+            thread.start()
+            self._threads.append(thread)
+
+    def submit(
+        self, image_bytes: bytes, output_format: str = "ply", lod_fractions=(1.0,), encode=True
+    ) -> Future:
+        """
+        Queue one image. The future resolves to (ply_list, timings), or to
+        (levels, timings) with PLY elements per LOD fraction if encode=False.
+        Blocks while the first stage's queue is full.
+        """
+        request = _Request(
+            image_bytes, output_format, tuple(lod_fractions), encode, StageTimer(self.pipeline.device)
+        )
+        self._queues[0].put(request)
+        return request.future
+
+    def map(self, images: list, output_format: str = "ply") -> list:
+        """Run several images through the pipeline; returns one PLY per image, in order."""
+        futures = [self.submit(image_bytes, output_format) for image_bytes in images]
+        return [future.result()[0][0] for future in futures]
+
+    def close(self):
+        """Finish queued requests and stop the stage threads."""
+        self._queues[0].put(None)
+        for thread in self._threads:
+            thread.join()
+
+    def _record_ready(self, request):
+        import torch
+
+        if self._cuda:
+            request.ready = torch.cuda.Event()
+            request.ready.record()
+
+    def _wait_ready(self, request, *tensors):
+        import torch
+
+        if self._cuda and request.ready is not None:
+            stream = torch.cuda.current_stream()
+            stream.wait_event(request.ready)
+            # Tensors allocated on another stream must not be reused by the
+            # caching allocator until this stream is done with them
+            for tensor in tensors:
+                tensor.record_stream(stream)
+
+    def _run_stage(self, work, stream, inbox, outbox):
+        import torch
+
+        context = torch.cuda.stream(stream) if stream is not None else nullcontext()
+        while True:
+            request = inbox.get()
+            if request is None:
+                if outbox is not None:
+                    outbox.put(None)
+                return
+            if request.future.done():
+                continue
+            try:
+                with context:
+                    work(request)
+            except Exception as e:
+                request.future.set_exception(e)
+                continue
+            if outbox is not None:
+                outbox.put(request)
+
+    def _prepare(self, request):
+        request.prepared = self.pipeline.prepare_image(request.image_bytes, request.timer)
+        request.image_bytes = None
+        self._record_ready(request)
+
+    def _infer(self, request):
+        image_resized, disparity_factor, f_px, width, height = request.prepared
+        self._wait_ready(request, image_resized, disparity_factor)
+        with request.timer.span("inference"):
+            request.gaussians_ndc = self.pipeline.forward(image_resized, disparity_factor)
+        request.prepared = (f_px, width, height)
+        self._record_ready(request)
+
+    def _export(self, request):
+        from splat_io import element_count, write_ply
+
+        gaussians_ndc = request.gaussians_ndc
+        self._wait_ready(request, *gaussians_ndc)
+        self.pipeline.print_debug_stats("Gaussians NDC stats", gaussians_ndc)
+
+        f_px, width, height = request.prepared
+        to_host = self._pinned.to_host if self._pinned is not None and request.encode else None
+        levels = self.pipeline.level_elements(
+            gaussians_ndc,
+            f_px,
+            width,
+            height,
+            request.output_format,
+            request.lod_fractions,
+            request.timer,
+            to_host,
+        )
+        request.gaussians_ndc = None
+
+        if not request.encode:
+            timings = self.pipeline.observe(request.timer, element_count(levels[0]))
+            request.future.set_result((levels, timings))
+            return
+
+        with request.timer.span("encode"):
+            ply_list = [write_ply(elements) for elements in levels]
+        timings = self.pipeline.observe(request.timer, element_count(levels[0]))
+        request.future.set_result((ply_list, timings))
@@ -0,0 +1,149 @@
+"""
+Per-stage timing for the Sharp pipeline.
+
+StageTimer records named spans (decode, resize, inference, unproject, prune,
+export, encode) for one request. On CUDA the spans are CUDA events recorded
+on the current stream, so timing a GPU stage adds no synchronization; the
+events are resolved once at the end of the request, after the export has
+already waited for the GPU. On CPU plain perf_counter timestamps are used.
+
+TimingHistograms aggregates the per-request timings into cumulative
+histograms per stage (Prometheus-style buckets), for the metrics endpoint.
+"""
+
+import threading
+import time
+from contextlib import contextmanager
+
+# Pipeline stages in execution order
+STAGES = ("decode", "resize", "inference", "unproject", "prune", "export", "encode")
+
+# Histogram bucket upper bounds in seconds
+HISTOGRAM_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+
+class StageTimer:
+    """Collects named timing spans for one request on a given torch device."""
+
+    def __init__(self, device):
+        self._cuda = device.type == "cuda"
+        self._spans = []  # (stage, start mark, end mark)
+
+    def _mark(self):
+        if self._cuda:
+            import torch
+
+            event = torch.cuda.Event(enable_timing=True)
+            event.record()
+            return event
+        return time.perf_counter()
+
+    @contextmanager
+    def span(self, stage: str):
+        """Time the enclosed block as stage (repeated stages are summed)."""
+        start = self._mark()
+        try:
+            yield
+        finally:
+            self._spans.append((stage, start, self._mark()))
+
+    def seconds(self) -> dict:
+        """
+        Resolve the spans to {"<stage>_seconds": ..., "total_seconds": ...}.
+        total_seconds runs from the first span start to the last span end.
+        On CUDA this waits for the last recorded event.
+        """
+        if not self._spans:
+            return {"total_seconds": 0.0}
+
+        if self._cuda:
+            self._spans[-1][2].synchronize()
+            elapsed = lambda start, end: start.elapsed_time(end) / 1000.0
+        else:
+            elapsed = lambda start, end: end - start
+
+        timings = {}
+        for stage, start, end in self._spans:
+            key = f"{stage}_seconds"
+            timings[key] = timings.get(key, 0.0) + elapsed(start, end)
+        timings["total_seconds"] = elapsed(self._spans[0][1], self._spans[-1][2])
+        return timings
+
+
+def server_timing_header(timings: dict) -> str:
+    """Format timings as an HTTP Server-Timing header value (milliseconds)."""
+    return ", ".join(
+        f"{key[: -len('_seconds')]};dur={seconds * 1000:.1f}"
+        for key, seconds in timings.items()
+        if key.endswith("_seconds")
+    )
+
+
+class TimingHistograms:
+    """Thread-safe cumulative histograms of per-stage request timings."""
+
+    def __init__(self, buckets=HISTOGRAM_BUCKETS):
+        self.buckets = tuple(buckets)
+        self._lock = threading.Lock()
+        self._stages = {}  # stage -> {"counts": [...], "count": n, "sum": seconds}
+
+    def observe(self, timings: dict, prefix: str = ""):
+        """Add one request's timings ({"<stage>_seconds": ...})."""
+        with self._lock:
+            for key, seconds in timings.items():
+                if not key.endswith("_seconds"):
+                    continue
+                stage = prefix + key[: -len("_seconds")]
+                entry = self._stages.setdefault(
+                    stage, {"counts": [0] * (len(self.buckets) + 1), "count": 0, "sum": 0.0}
+                )
+                entry["count"] += 1
+                entry["sum"] += seconds
+                for i, bound in enumerate(self.buckets):
+                    if seconds <= bound:
+                        entry["counts"][i] += 1
+                        break
+                else:
+                    entry["counts"][-1] += 1
+
+    def _quantile(self, counts: list, total: int, q: float) -> float:
+        """Upper bucket bound containing quantile q (None if beyond the last bucket)."""
+        target = q * total
+        running = 0
+        for bound, count in zip(self.buckets, counts):
+            running += count
+            if running >= target:
+                return bound
+        return None
+
+    def snapshot(self) -> dict:
+        """Per-stage count, sum, mean, cumulative buckets and approximate quantiles."""
+        with self._lock:
+            result = {}
+            for stage, entry in self._stages.items():
+                cumulative = []
+                running = 0
+                for bound, count in zip(self.buckets, entry["counts"]):
+                    running += count
+                    cumulative.append({"le": bound, "count": running})
+                cumulative.append({"le": "+Inf", "count": entry["count"]})
+                result[stage] = {
+                    "count": entry["count"],
+                    "sum_seconds": entry["sum"],
+                    "mean_seconds": entry["sum"] / entry["count"],
+                    "p50_seconds": self._quantile(entry["counts"], entry["count"], 0.5),
+                    "p90_seconds": self._quantile(entry["counts"], entry["count"], 0.9),
+                    "p99_seconds": self._quantile(entry["counts"], entry["count"], 0.99),
+                    "buckets": cumulative,
+                }
+            return result
+
+    def prometheus(self, metric: str = "sharp_stage_seconds") -> str:
+        """Render the histograms in the Prometheus text exposition format."""
+        lines = [f"# TYPE {metric} histogram"]
+        for stage, entry in self.snapshot().items():
+            for bucket in entry["buckets"]:
+                lines.append(f'{metric}_bucket{{stage="{stage}",le="{bucket["le"]}"}} {bucket["count"]}')
+            lines.append(f'{metric}_sum{{stage="{stage}"}} {entry["sum_seconds"]}')
+            lines.append(f'{metric}_count{{stage="{stage}"}} {entry["count"]}')
+        return "\n".join(lines) + "\n"
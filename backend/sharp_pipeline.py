@@ -0,0 +1,1454 @@
+"""
+The Sharp image -> 3D Gaussian splat pipeline, independent of Modal.
+
+Holds the model loading, preprocessing, inference and on-device
+postprocessing (unprojection, covariance decomposition, pruning, LOD and
+PLY export) used by sharp_api.SharpModel. SharpPipeline runs on a CUDA device
+or fully on CPU, so splats can be generated on CPU-only build boxes and in
+local tests:
+
+    python sharp_pipeline.py photo.jpg --device cpu --threads 8
+    python sharp_pipeline.py photo.jpg --device cpu --benchmark 3
+"""
+
+import io
+import os
+import statistics
+import time
+
+from sharp_metrics import StageTimer, TimingHistograms
+
+DEFAULT_MODEL_URL = "https://ml-site.cdn-apple.com/models/sharp/sharp_2572gikvuh.pt"
+CHECKPOINT_NAME = "sharp_2572gikvuh.pt"
+
+# Inference modes: plain fp32, bf16/fp16 autocast, and torch.compile variants.
+# Select one per deployment with SharpModel(inference_mode="compile-bf16").
+INFERENCE_MODES = ("fp32", "bf16", "fp16", "compile", "compile-bf16", "compile-fp16")
+DEFAULT_INFERENCE_MODE = "fp32"
+
+# Maximum relative error vs fp32 accepted by check_precision
+PRECISION_TOLERANCE = 1e-2
+
+# Splat output formats: full float32 PLY, the same PLY with Gaussians in
+# spatial order for chunked range requests (see splat_io.ply_chunk_index), or
+# the quantized chunked layout (~3.5x smaller) that gaussian-splats-3d loads
+# as a compressed PLY
+OUTPUT_FORMATS = ("ply", "chunked_ply", "compressed_ply")
+
+# Spatial order of chunked_ply output (one of splat_io.SPATIAL_ORDERS)
+CHUNKED_PLY_ORDER = "depth"
+
+# Pruning between unprojection and export. Gaussians below 1/255 opacity
+# cannot change an 8-bit pixel, and ones under a tenth of a source-image
+# pixel across are sub-pixel noise.
+PRUNE_MIN_OPACITY = 1.0 / 255.0
+PRUNE_MIN_SCREEN_SIZE_PX = 0.1
+
+# Level-of-detail fractions (share of Gaussians kept, ranked by importance)
+DEFAULT_LOD_FRACTIONS = (1.0, 0.5, 0.2)
+
+# Internal resolution for Sharp model
+INTERNAL_SHAPE = (1536, 1536)
+
+# Warmup resolution on CPU, where a full-size pass is slow; the warmup only
+# needs to initialize the thread pools and oneDNN primitives
+CPU_WARMUP_SHAPE = (384, 384)
+
+# Largest number of images stacked into one forward pass by predict_batch.
+# Batches that do not fit in GPU memory are split in half automatically.
+MAX_BATCH_SIZE = int(os.environ.get("SHARP_MAX_BATCH_SIZE", "4"))
+
+
+# =============================================================================
+# OPTIMIZED GPU-BASED POSTPROCESSING
+# The original Sharp code moves tensors to CPU for SVD and scipy for quaternions.
+# These functions keep everything on GPU for ~10x speedup.
+# =============================================================================
+
+
+def quaternions_from_rotation_matrices_gpu(matrices):
+    """
+    Branch-free rotation matrix to quaternion conversion (Shepperd's method).
+    All four Shepperd candidates are evaluated for every matrix and the case
+    is picked with where/gather, so there are no mask.any() device syncs or
+    boolean scatters. The case selection matches the mask-based version
+    (trace > 0, else largest diagonal element), so results are identical.
+    Accepts torch tensors on any device or NumPy arrays (CPU fallback).
+    Input: (..., 3, 3) rotation matrices
+    Output: (..., 4) quaternions [w, x, y, z]
+    """
+    import numpy as np
+
+    if isinstance(matrices, np.ndarray):
+        xp_stack, xp_where, xp_sqrt = np.stack, np.where, np.sqrt
+        take = lambda values, index: np.take_along_axis(values, index, axis=-1)
+        clamp_min = np.maximum
+        norm = lambda q: np.linalg.norm(q, axis=-1, keepdims=True)
+        arange = np.arange(4)
+    else:
+        import torch
+
+        xp_stack, xp_where, xp_sqrt = torch.stack, torch.where, torch.sqrt
+        take = lambda values, index: torch.gather(values, -1, index)
+        clamp_min = lambda values, low: torch.clamp(values, min=low)
+        norm = lambda q: torch.linalg.norm(q, dim=-1, keepdim=True)
+        arange = torch.arange(4, device=matrices.device)
+
+    batch_shape = matrices.shape[:-2]
+    matrices = matrices.reshape(-1, 3, 3)
+
+    # Extract matrix elements
+    m00, m01, m02 = matrices[:, 0, 0], matrices[:, 0, 1], matrices[:, 0, 2]
+    m10, m11, m12 = matrices[:, 1, 0], matrices[:, 1, 1], matrices[:, 1, 2]
+    m20, m21, m22 = matrices[:, 2, 0], matrices[:, 2, 1], matrices[:, 2, 2]
+    trace = m00 + m11 + m22
+
+    # Case per matrix: 0 if trace > 0, else the largest diagonal element (1..3)
+    case = xp_where(
+        trace > 0,
+        0,
+        xp_where((m00 > m11) & (m00 > m22), 1, xp_where(m11 > m22, 2, 3)),
+    )[:, None]
+
+    # s = 4 * (the case's dominant component). Unselected candidates may be
+    # negative under the sqrt; clamp them so they stay finite.
+    s_all = xp_sqrt(
+        clamp_min(
+            xp_stack(
+                [
+                    trace + 1.0,
+                    1.0 + m00 - m11 - m22,
+                    1.0 + m11 - m00 - m22,
+                    1.0 + m22 - m00 - m11,
+                ],
+                -1,
+            ),
+            1e-12,
+        )
+    ) * 2
+    s = take(s_all, case)
+
+    # Off-diagonal numerators, one row of [w, x, y, z] per case
+    # (the dominant component is filled in from s below)
+    zero = m00 * 0
+    numerators = xp_stack(
+        [
+            xp_stack([zero, m21 - m12, m02 - m20, m10 - m01], -1),
+            xp_stack([m21 - m12, zero, m01 + m10, m02 + m20], -1),
+            xp_stack([m02 - m20, m01 + m10, zero, m12 + m21], -1),
+            xp_stack([m10 - m01, m02 + m20, m12 + m21, zero], -1),
+        ],
+        -1,
+    )  # (N, 4 components, 4 cases)
+    quaternions = take(numerators, xp_stack([case] * 4, 1))[..., 0] / s
+    quaternions = xp_where(arange == case, 0.25 * s, quaternions)
+
+    # Normalize quaternions
+    quaternions = quaternions / norm(quaternions)
+
+    # Reshape to original batch shape
+    return quaternions.reshape(tuple(batch_shape) + (4,))
+
+
+def quaternions_from_rotation_matrices_masked(matrices: "torch.Tensor") -> "torch.Tensor":
+    """
+    Previous mask-based Shepperd conversion, kept as the reference for
+    benchmark_quaternions. Each mask.any() forces a device sync.
+    Input: (..., 3, 3) rotation matrices
+    Output: (..., 4) quaternions [w, x, y, z]
+    """
+    import torch
+
+    batch_shape = matrices.shape[:-2]
+    matrices = matrices.reshape(-1, 3, 3)
+
+    # Extract matrix elements
+    m00, m01, m02 = matrices[:, 0, 0], matrices[:, 0, 1], matrices[:, 0, 2]
+    m10, m11, m12 = matrices[:, 1, 0], matrices[:, 1, 1], matrices[:, 1, 2]
+    m20, m21, m22 = matrices[:, 2, 0], matrices[:, 2, 1], matrices[:, 2, 2]
+
+    # Compute quaternion components using Shepperd's method
+    trace = m00 + m11 + m22
+
+    # Allocate output
+    quaternions = torch.zeros(
+        matrices.shape[0], 4, device=matrices.device, dtype=matrices.dtype
+    )
+
+    # Case 1: trace > 0
+    mask1 = trace > 0
+    if mask1.any():
+        s = torch.sqrt(trace[mask1] + 1.0) * 2  # s = 4 * w
+        quaternions[mask1, 0] = 0.25 * s
+        quaternions[mask1, 1] = (m21[mask1] - m12[mask1]) / s
+        quaternions[mask1, 2] = (m02[mask1] - m20[mask1]) / s
+        quaternions[mask1, 3] = (m10[mask1] - m01[mask1]) / s
+
+    # Case 2: m00 > m11 and m00 > m22
+    mask2 = (~mask1) & (m00 > m11) & (m00 > m22)
+    if mask2.any():
+        s = torch.sqrt(1.0 + m00[mask2] - m11[mask2] - m22[mask2]) * 2  # s = 4 * x
+        quaternions[mask2, 0] = (m21[mask2] - m12[mask2]) / s
+        quaternions[mask2, 1] = 0.25 * s
+        quaternions[mask2, 2] = (m01[mask2] + m10[mask2]) / s
+        quaternions[mask2, 3] = (m02[mask2] + m20[mask2]) / s
+
+    # Case 3: m11 > m22
+    mask3 = (~mask1) & (~mask2) & (m11 > m22)
+    if mask3.any():
+        s = torch.sqrt(1.0 + m11[mask3] - m00[mask3] - m22[mask3]) * 2  # s = 4 * y
+        quaternions[mask3, 0] = (m02[mask3] - m20[mask3]) / s
+        quaternions[mask3, 1] = (m01[mask3] + m10[mask3]) / s
+        quaternions[mask3, 2] = 0.25 * s
+        quaternions[mask3, 3] = (m12[mask3] + m21[mask3]) / s
+
+    # Case 4: remaining (m22 is largest)
+    mask4 = (~mask1) & (~mask2) & (~mask3)
+    if mask4.any():
+        s = torch.sqrt(1.0 + m22[mask4] - m00[mask4] - m11[mask4]) * 2  # s = 4 * z
+        quaternions[mask4, 0] = (m10[mask4] - m01[mask4]) / s
+        quaternions[mask4, 1] = (m02[mask4] + m20[mask4]) / s
+        quaternions[mask4, 2] = (m12[mask4] + m21[mask4]) / s
+        quaternions[mask4, 3] = 0.25 * s
+
+    # Normalize quaternions
+    quaternions = quaternions / torch.linalg.norm(quaternions, dim=-1, keepdim=True)
+
+    # Reshape to original batch shape
+    return quaternions.reshape(batch_shape + (4,))
+
+
+# Cyclic Jacobi sweeps for symmetric_eigh_3x3. Convergence is quadratic; four
+# sweeps already reach float32 round-off, the rest is margin.
+JACOBI_SWEEPS = 6
+
+
+def symmetric_eigh_3x3(matrices: "torch.Tensor"):
+    """
+    Batched eigendecomposition of symmetric 3x3 matrices by cyclic Jacobi
+    rotations with a fixed number of sweeps. Only elementwise ops on the six
+    unique entries, so it is sync-free and fast on both CPU and CUDA, unlike
+    the general batched torch.linalg.svd.
+    Input: (N, 3, 3) symmetric matrices
+    Returns (eigenvalues (N, 3) sorted descending, eigenvectors (N, 3, 3) as
+    columns). The eigenvector matrix is always a proper rotation (det +1).
+    """
+    import torch
+
+    # Scale each matrix to unit max entry to keep the rotation formulas in range
+    norm = matrices.abs().amax(dim=(-2, -1))
+    norm = torch.where(norm > 0, norm, torch.ones_like(norm))
+    a = matrices / norm[:, None, None]
+
+    entries = {(i, j): a[:, i, j] for i in range(3) for j in range(i, 3)}
+    ones = torch.ones_like(norm)
+    zeros = torch.zeros_like(norm)
+    # v[i][j]: row i of eigenvector column j
+    v = [[ones if i == j else zeros for j in range(3)] for i in range(3)]
+
+    for _ in range(JACOBI_SWEEPS):
+        for p, q, r in ((0, 1, 2), (0, 2, 1), (1, 2, 0)):
+            apq = entries[(p, q)]
+            app = entries[(p, p)]
+            aqq = entries[(q, q)]
+            arp = entries[tuple(sorted((r, p)))]
+            arq = entries[tuple(sorted((r, q)))]
+
+            # Rotation angle that zeroes a_pq (Numerical Recipes, section 11.1)
+            skip = apq == 0
+            theta = (aqq - app) / (2 * torch.where(skip, ones, apq))
+            t = torch.where(theta >= 0, ones, -ones) / (
+                theta.abs() + torch.sqrt(theta * theta + 1)
+            )
+            t = torch.where(skip, zeros, t)
+            c = torch.rsqrt(t * t + 1)
+            s = t * c
+
+            entries[(p, p)] = app - t * apq
+            entries[(q, q)] = aqq + t * apq
+            entries[(p, q)] = zeros
+            entries[tuple(sorted((r, p)))] = c * arp - s * arq
+            entries[tuple(sorted((r, q)))] = s * arp + c * arq
+            for row in v:
+                vp, vq = row[p], row[q]
+                row[p] = c * vp - s * vq
+                row[q] = s * vp + c * vq
+
+    eigenvalues = torch.stack([entries[(i, i)] for i in range(3)], -1) * norm[:, None]
+    eigenvectors = torch.stack([torch.stack(row, -1) for row in v], -2)
+
+    # Sort descending like singular values, permuting eigenvector columns
+    eigenvalues, order = torch.sort(eigenvalues, dim=-1, descending=True)
+    eigenvectors = torch.gather(eigenvectors, -1, order[:, None, :].expand(-1, 3, -1))
+
+    # Sorting can turn the rotation into a reflection; rebuilding the last
+    # column as a cross product is the sync-free version of flipping it
+    third = torch.linalg.cross(eigenvectors[..., 0], eigenvectors[..., 1], dim=-1)
+    eigenvectors = torch.cat([eigenvectors[..., :2], third[..., None]], dim=-1)
+
+    return eigenvalues, eigenvectors
+
+
+def fast_decompose_covariance_matrices_gpu(covariance_matrices: "torch.Tensor"):
+    """
+    Decompose covariance matrices into rotation quaternions and singular
+    values (standard deviations along the principal axes) without SVD.
+    Covariances are symmetric PSD, so the SVD the original code uses is just
+    the eigendecomposition; symmetric_eigh_3x3 computes it directly and stays
+    on whatever device the input is on.
+    """
+    dtype = covariance_matrices.dtype
+    batch_shape = covariance_matrices.shape[:-2]
+
+    eigenvalues, rotations = symmetric_eigh_3x3(covariance_matrices.reshape(-1, 3, 3))
+
+    # Use our pure PyTorch implementation instead of scipy
+    quaternions = quaternions_from_rotation_matrices_gpu(rotations)
+    # Round-off can leave tiny negative eigenvalues for degenerate Gaussians
+    singular_values = eigenvalues.clamp(min=0).sqrt()
+
+    return (
+        quaternions.reshape(batch_shape + (4,)).to(dtype=dtype),
+        singular_values.reshape(batch_shape + (3,)).to(dtype=dtype),
+    )
+
+
+def decompose_covariance_matrices_svd(covariance_matrices: "torch.Tensor"):
+    """
+    Previous SVD-based decomposition, kept as the reference for
+    benchmark_covariance_decomposition.
+    """
+    import torch
+
+    device = covariance_matrices.device
+    dtype = covariance_matrices.dtype
+
+    # Keep on GPU! The original code does .cpu() here which is the bottleneck
+    rotations, singular_values_2, _ = torch.linalg.svd(covariance_matrices)
+
+    # Fix reflection matrices (same logic as original)
+    det = torch.linalg.det(rotations)
+    reflection_mask = det < 0
+    if reflection_mask.any():
+        # Flip the last column of reflections to make them rotations
+        rotations[reflection_mask, :, -1] *= -1
+
+    # Use our pure PyTorch GPU implementation instead of scipy
+    quaternions = quaternions_from_rotation_matrices_gpu(rotations)
+    singular_values = singular_values_2.sqrt()
+
+    return quaternions.to(dtype=dtype), singular_values.to(dtype=dtype)
+
+
+def fast_apply_transform_gpu(gaussians: "Gaussians3D", transform: "torch.Tensor"):
+    """GPU-optimized transform - uses fast GPU SVD."""
+    import torch
+    from sharp.utils.gaussians import Gaussians3D, compose_covariance_matrices
+
+    transform_linear = transform[..., :3, :3]
+    transform_offset = transform[..., :3, 3]
+
+    mean_vectors = gaussians.mean_vectors @ transform_linear.T + transform_offset
+    covariance_matrices = compose_covariance_matrices(
+        gaussians.quaternions, gaussians.singular_values
+    )
+    covariance_matrices = (
+        transform_linear @ covariance_matrices @ transform_linear.transpose(-1, -2)
+    )
+
+    # Use our fast GPU-based decomposition instead of the slow CPU one
+    quaternions, singular_values = fast_decompose_covariance_matrices_gpu(
+        covariance_matrices
+    )
+
+    return Gaussians3D(
+        mean_vectors=mean_vectors,
+        singular_values=singular_values,
+        quaternions=quaternions,
+        colors=gaussians.colors,
+        opacities=gaussians.opacities,
+    )
+
+
+def fast_unproject_gaussians_gpu(gaussians_ndc, extrinsics, intrinsics, image_shape):
+    """GPU-optimized unprojection - keeps all ops on GPU."""
+    from sharp.utils.gaussians import get_unprojection_matrix
+
+    unprojection_matrix = get_unprojection_matrix(extrinsics, intrinsics, image_shape)
+    gaussians = fast_apply_transform_gpu(gaussians_ndc, unprojection_matrix[:3])
+    return gaussians
+
+
+def subset_gaussians(gaussians, index):
+    """Keep the Gaussians selected by index (bool mask or indices over N) of a single image."""
+    from sharp.utils.gaussians import Gaussians3D
+
+    return Gaussians3D(
+        mean_vectors=gaussians.mean_vectors[:, index],
+        singular_values=gaussians.singular_values[:, index],
+        quaternions=gaussians.quaternions[:, index],
+        colors=gaussians.colors[:, index],
+        opacities=gaussians.opacities[:, index],
+    )
+
+
+def gaussian_screen_size_gpu(gaussians, f_px: float) -> "torch.Tensor":
+    """Largest axis of each metric-space Gaussian projected to source-image pixels."""
+    depth = gaussians.mean_vectors[..., 2].clamp_min(1e-6)
+    return gaussians.singular_values.amax(dim=-1) * f_px / depth
+
+
+def gaussian_importance_gpu(gaussians, f_px: float) -> "torch.Tensor":
+    """Opacity times the approximate projected footprint area in pixels^2."""
+    depth = gaussians.mean_vectors[..., 2].clamp_min(1e-6)
+    footprint = gaussians.singular_values.topk(2, dim=-1).values.prod(dim=-1)
+    return gaussians.opacities * footprint * (f_px / depth) ** 2
+
+
+def prune_gaussians_gpu(
+    gaussians,
+    f_px: float,
+    min_opacity: float = PRUNE_MIN_OPACITY,
+    min_screen_size_px: float = PRUNE_MIN_SCREEN_SIZE_PX,
+):
+    """Drop near-transparent and sub-pixel Gaussians from a single-image batch."""
+    keep = (gaussians.opacities >= min_opacity) & (
+        gaussian_screen_size_gpu(gaussians, f_px) >= min_screen_size_px
+    )
+    return subset_gaussians(gaussians, keep[0])
+
+
+def lod_gaussians_gpu(gaussians, importance: "torch.Tensor", fraction: float):
+    """
+    Keep the most important fraction of Gaussians.
+    Selected Gaussians stay in their original order so spatial locality
+    (and thus compression) is preserved.
+    """
+    import torch
+
+    num_gaussians = importance.shape[-1]
+    keep_count = max(1, int(round(num_gaussians * fraction)))
+    if keep_count >= num_gaussians:
+        return gaussians
+    indices = torch.topk(importance[0], keep_count, sorted=False).indices.sort().values
+    return subset_gaussians(gaussians, indices)
+
+
+def gaussians_to_numpy(gaussians):
+    """
+    Move Gaussians to CPU in PLY conventions.
+    Returns (splat, disparity_quantiles) where splat holds float32 blocks:
+    xyz, f_dc (sRGB SH DC), opacity logits, log scales and rot (w, x, y, z).
+    """
+    import torch
+    from sharp.utils import color_space as cs_utils
+    from sharp.utils.gaussians import convert_rgb_to_spherical_harmonics
+
+    # Move everything to CPU in one batch
+    with torch.no_grad():
+        xyz = gaussians.mean_vectors.flatten(0, 1).cpu()
+        scale_logits = torch.log(gaussians.singular_values).flatten(0, 1).cpu()
+        quaternions = gaussians.quaternions.flatten(0, 1).cpu()
+        colors_linear = gaussians.colors.flatten(0, 1).cpu()
+        opacities = gaussians.opacities.flatten(0, 1).cpu()
+
+        # Color space conversion on CPU (fast)
+        colors_srgb = cs_utils.linearRGB2sRGB(colors_linear)
+        colors = convert_rgb_to_spherical_harmonics(colors_srgb)
+
+        # Opacity logits
+        opacity_logits = torch.log(opacities / (1.0 - opacities))
+
+        # Disparity calculation
+        disparity = 1.0 / gaussians.mean_vectors[0, ..., -1].cpu()
+        quantiles = torch.quantile(disparity, q=torch.tensor([0.1, 0.9])).numpy()
+
+    # Convert to numpy efficiently (single operation per tensor)
+    splat = {
+        "xyz": xyz.numpy(),
+        "f_dc": colors.numpy(),
+        "opacity": opacity_logits.numpy(),
+        "scale": scale_logits.numpy(),
+        "rot": quaternions.numpy(),
+    }
+    return splat, quantiles
+
+
+def splat_ply_elements(gaussians, f_px: float, image_shape: tuple, order: str = None):
+    """
+    Build the float32 PLY elements (vertex block plus Sharp metadata) for
+    metric-space Gaussians, ready for splat_io.write_ply or iter_ply.
+    order optionally sorts the Gaussians by one of splat_io.SPATIAL_ORDERS
+    instead of keeping predictor order.
+    """
+    from sharp.utils import color_space as cs_utils
+    from splat_io import VERTEX_DTYPE, reorder_splat, sharp_metadata_elements
+
+    splat, quantiles = gaussians_to_numpy(gaussians)
+    if order is not None:
+        splat = reorder_splat(splat, order)
+    num_gaussians = len(splat["xyz"])
+
+    # Property blocks in file order: x y z, f_dc_0..2, opacity, scale_0..2,
+    # rot_0..3. write_ply concatenates them straight into the output buffer.
+    vertex_blocks = [splat["xyz"], splat["f_dc"], splat["opacity"], splat["scale"], splat["rot"]]
+
+    # Metadata elements (small, fast)
+    metadata = sharp_metadata_elements(
+        f_px,
+        image_shape,
+        num_gaussians,
+        quantiles,
+        cs_utils.encode_color_space("sRGB"),
+    )
+
+    return [("vertex", VERTEX_DTYPE, vertex_blocks)] + metadata
+
+
+def fast_save_ply_bytes(gaussians, f_px: float, image_shape: tuple) -> bytearray:
+    """
+    Optimized PLY export that returns bytes directly (no temp file).
+    Minimizes GPU->CPU transfers and writes the property blocks straight
+    into a single preallocated PLY buffer (see splat_io.write_ply), which is
+    byte-for-byte identical to the plyfile output but avoids the structured
+    array and BytesIO copies.
+    """
+    from splat_io import write_ply
+
+    return write_ply(splat_ply_elements(gaussians, f_px, image_shape))
+
+
+def fast_save_compressed_ply_bytes(gaussians) -> bytearray:
+    """
+    Quantized export in the chunked compressed PLY layout (see
+    splat_io.encode_compressed_ply): ~16 bytes per Gaussian instead of 56.
+    The Sharp camera metadata elements are not included.
+    """
+    from splat_io import encode_compressed_ply
+
+    splat, _ = gaussians_to_numpy(gaussians)
+    return encode_compressed_ply(splat)
+
+
+def splat_elements(gaussians, f_px: float, image_shape: tuple, output_format: str):
+    """PLY elements for metric-space Gaussians in one of OUTPUT_FORMATS."""
+    from splat_io import compressed_ply_elements
+
+    if output_format == "ply":
+        return splat_ply_elements(gaussians, f_px, image_shape)
+    if output_format == "chunked_ply":
+        return splat_ply_elements(gaussians, f_px, image_shape, CHUNKED_PLY_ORDER)
+    if output_format == "compressed_ply":
+        splat, _ = gaussians_to_numpy(gaussians)
+        return compressed_ply_elements(splat)
+    raise ValueError(
+        f"Unknown output format {output_format!r}, expected one of {', '.join(OUTPUT_FORMATS)}"
+    )
+
+
+def export_splat_bytes(gaussians, f_px: float, image_shape: tuple, output_format: str):
+    """Export metric-space Gaussians in one of OUTPUT_FORMATS."""
+    from splat_io import write_ply
+
+    return write_ply(splat_elements(gaussians, f_px, image_shape, output_format))
+
+
+def parse_inference_mode(mode: str):
+    """Split an inference mode into (autocast dtype or None, use torch.compile)."""
+    import torch
+
+    if mode not in INFERENCE_MODES:
+        raise ValueError(
+            f"Unknown inference mode {mode!r}, expected one of {', '.join(INFERENCE_MODES)}"
+        )
+    use_compile = mode.startswith("compile")
+    precision = mode.split("-", 1)[1] if "-" in mode else ("fp32" if use_compile else mode)
+    autocast_dtype = {
+        "fp32": None,
+        "bf16": torch.bfloat16,
+        "fp16": torch.float16,
+    }[precision]
+    return autocast_dtype, use_compile
+
+
+def gaussians_to_float32(gaussians):
+    """Cast predictor output back to fp32 so postprocessing runs at full precision."""
+    import torch
+    from sharp.utils.gaussians import Gaussians3D
+
+    return Gaussians3D(
+        mean_vectors=gaussians.mean_vectors.to(torch.float32),
+        singular_values=gaussians.singular_values.to(torch.float32),
+        quaternions=gaussians.quaternions.to(torch.float32),
+        colors=gaussians.colors.to(torch.float32),
+        opacities=gaussians.opacities.to(torch.float32),
+    )
+
+
+def compare_gaussians(reference, candidate) -> dict:
+    """
+    Compare two predictor outputs field by field.
+    Errors are mean absolute differences relative to the mean magnitude of the
+    reference; quaternions are compared by 1 - |dot| so q and -q count as equal.
+    """
+    import torch
+
+    errors = {}
+    for field in ("mean_vectors", "singular_values", "colors", "opacities"):
+        ref = getattr(reference, field).float()
+        cand = getattr(candidate, field).float()
+        diff = (ref - cand).abs()
+        scale = ref.abs().mean().clamp_min(1e-12)
+        errors[field] = {
+            "max_abs": diff.max().item(),
+            "mean_abs": diff.mean().item(),
+            "relative": (diff.mean() / scale).item(),
+        }
+
+    q_ref = torch.nn.functional.normalize(reference.quaternions.float(), dim=-1)
+    q_cand = torch.nn.functional.normalize(candidate.quaternions.float(), dim=-1)
+    angular = 1.0 - (q_ref * q_cand).sum(dim=-1).abs()
+    errors["quaternions"] = {
+        "max_abs": angular.max().item(),
+        "mean_abs": angular.mean().item(),
+        "relative": angular.mean().item(),
+    }
+    return errors
+
+
+def select_gaussians(gaussians, index: int):
+    """Slice a single image (keeping the batch dimension) out of batched Gaussians3D."""
+    from sharp.utils.gaussians import Gaussians3D
+
+    return Gaussians3D(
+        mean_vectors=gaussians.mean_vectors[index : index + 1],
+        singular_values=gaussians.singular_values[index : index + 1],
+        quaternions=gaussians.quaternions[index : index + 1],
+        colors=gaussians.colors[index : index + 1],
+        opacities=gaussians.opacities[index : index + 1],
+    )
+
+
+def download_image(url: str) -> bytes:
+    """Download an input image referenced by URL."""
+    import requests
+
+    response = requests.get(url, timeout=30)
+    response.raise_for_status()
+    return response.content
+
+
+# EXIF tags (the focal lengths live in the Exif sub-IFD)
+EXIF_ORIENTATION = 0x0112
+EXIF_IFD = 0x8769
+EXIF_FOCAL_LENGTH = 0x920A
+EXIF_FOCAL_LENGTH_35MM = 0xA405
+
+# Sharp's default when the photo has no usable focal length
+DEFAULT_FOCAL_LENGTH_35MM = 30.0
+
+# Phone cameras often only record the physical focal length (a few mm); scale
+# those by a typical phone sensor crop factor to get a 35mm equivalent
+PHONE_FOCAL_LENGTH_MAX_MM = 10.0
+PHONE_CROP_FACTOR = 8.4
+
+
+def exif_focal_length_35mm(exif) -> float:
+    """35mm-equivalent focal length from PIL EXIF data, or None if absent."""
+    exif_ifd = exif.get_ifd(EXIF_IFD)
+    f_35mm = exif_ifd.get(EXIF_FOCAL_LENGTH_35MM)
+    if f_35mm:
+        return float(f_35mm)
+    f_mm = exif_ifd.get(EXIF_FOCAL_LENGTH)
+    if not f_mm:
+        return None
+    f_mm = float(f_mm)
+    if f_mm < PHONE_FOCAL_LENGTH_MAX_MM:
+        f_mm *= PHONE_CROP_FACTOR
+    return f_mm
+
+
+def orient_image(image: "torch.Tensor", orientation: int) -> "torch.Tensor":
+    """Apply an EXIF orientation (1-8) to a (C, H, W) image tensor, like ImageOps.exif_transpose."""
+    if orientation == 2:
+        return image.flip(-1)
+    if orientation == 3:
+        return image.flip(-2, -1)
+    if orientation == 4:
+        return image.flip(-2)
+    if orientation == 5:
+        return image.transpose(-2, -1)
+    if orientation == 6:
+        return image.rot90(-1, dims=(-2, -1))
+    if orientation == 7:
+        return image.transpose(-2, -1).flip(-2, -1)
+    if orientation == 8:
+        return image.rot90(1, dims=(-2, -1))
+    return image
+
+
+def default_checkpoint_path() -> str:
+    """Checkpoint location off-Modal: SHARP_CHECKPOINT, else a per-user cache directory."""
+    override = os.environ.get("SHARP_CHECKPOINT")
+    if override:
+        return override
+    return os.path.join(
+        os.path.expanduser("~"), ".cache", "shopiverse", "models", CHECKPOINT_NAME
+    )
+
+
+def ensure_checkpoint(checkpoint_path: str, url: str = DEFAULT_MODEL_URL) -> bool:
+    """Download the Sharp checkpoint if it is missing. Returns True if it was downloaded."""
+    if os.path.exists(checkpoint_path):
+        return False
+
+    import torch
+
+    print(f"Downloading Sharp model checkpoint from {url}...")
+    os.makedirs(os.path.dirname(checkpoint_path) or ".", exist_ok=True)
+    torch.hub.download_url_to_file(url, checkpoint_path, progress=False)
+    return True
+
+
+class SharpPipeline:
+    """
+    The Sharp image -> Gaussian splat pipeline as a plain Python class.
+    Loads the predictor onto a CUDA device or the CPU, and runs decode,
+    inference, unprojection, pruning and export. SharpModel wraps it on Modal
+    (adding the result cache and job queue); it can also be used directly,
+    e.g. on CPU-only build boxes:
+
+        pipeline = SharpPipeline(default_checkpoint_path(), device="cpu", num_threads=8)
+        ply_bytes = pipeline.predict(image_bytes)[0]
+
+    CPU options: num_threads sets torch's intra-op thread pool (which also
+    runs the elementwise postprocessing), channels_last switches the conv
+    layers to NHWC for oneDNN, and warmup_shape controls the resolution of the
+    warmup pass (reduced on CPU, where a full 1536x1536 pass takes seconds).
+
+    gpu_decode decodes JPEGs with nvjpeg on CUDA devices (see decode_image).
+
+    Every request is timed per stage (see sharp_metrics) into histograms.
+    debug_stats (or SHARP_DEBUG_STATS=1) prints value ranges of the
+    intermediate Gaussians, at the cost of a device sync per statistic.
+    """
+
+    def __init__(
+        self,
+        checkpoint_path: str,
+        device: str = None,
+        inference_mode: str = DEFAULT_INFERENCE_MODE,
+        num_threads: int = None,
+        channels_last: bool = False,
+        onednn: bool = True,
+        warmup_shape: tuple = None,
+        debug_stats: bool = None,
+        gpu_decode: bool = True,
+    ):
+        import torch
+
+        start_time = time.time()
+        self.inference_mode = inference_mode
+        self.channels_last = channels_last
+        if debug_stats is None:
+            debug_stats = os.environ.get("SHARP_DEBUG_STATS", "") not in ("", "0")
+        self.debug_stats = debug_stats
+        self.gpu_decode = gpu_decode
+        # Per-stage timing histograms of every request served by this pipeline
+        self.histograms = TimingHistograms()
+
+        # Determine device
+        if device is None:
+            device = "cuda" if torch.cuda.is_available() else "cpu"
+        self.device = torch.device(device)
+        if self.device.type == "cuda":
+            print(f"Using CUDA device: {torch.cuda.get_device_name(self.device)}")
+        else:
+            if num_threads:
+                torch.set_num_threads(num_threads)
+            torch.backends.mkldnn.enabled = onednn
+            print(
+                f"Using CPU: {torch.get_num_threads()} threads, "
+                f"oneDNN {'on' if onednn else 'off'}, channels_last {channels_last}"
+            )
+
+        # Import Sharp modules
+        from sharp.models import PredictorParams, create_predictor
+
+        # Load the model weights
+        print("Loading model weights...")
+        state_dict = torch.load(checkpoint_path, weights_only=True, map_location=self.device)
+
+        # Create and initialize the predictor
+        print("Creating predictor model...")
+        self.predictor = create_predictor(PredictorParams())
+        self.predictor.load_state_dict(state_dict)
+        self.predictor.eval()
+        self.predictor.to(self.device)
+        if channels_last:
+            self.predictor.to(memory_format=torch.channels_last)
+
+        # Keep the eager fp32 module around as the reference for check_precision
+        self.eager_predictor = self.predictor
+        self.autocast_dtype, use_compile = parse_inference_mode(inference_mode)
+        if self.autocast_dtype is torch.bfloat16 and self.device.type == "cuda":
+            if not torch.cuda.is_bf16_supported():
+                raise RuntimeError("bf16 inference requested but not supported by this GPU")
+        if use_compile:
+            # dynamic=False: we only ever see a handful of fixed batch shapes
+            self.predictor = torch.compile(self.predictor, dynamic=False)
+        print(f"Inference mode: {inference_mode}")
+
+        # Warmup: Run a dummy forward pass to ensure kernels are compiled.
+        # With torch.compile this is also the compile step, so trace every
+        # batch shape predict/predict_batch will use up front (at full size).
+        if warmup_shape is None:
+            warmup_shape = (
+                INTERNAL_SHAPE if self.device.type == "cuda" or use_compile else CPU_WARMUP_SHAPE
+            )
+        warmup_batch_sizes = [1]
+        if use_compile and MAX_BATCH_SIZE > 1:
+            warmup_batch_sizes.append(MAX_BATCH_SIZE)
+        print(f"Warming up model with dummy inference at {warmup_shape[0]}x{warmup_shape[1]}...")
+        for batch_size in warmup_batch_sizes:
+            warmup_start = time.time()
+            dummy_image = torch.randn(
+                batch_size, 3, warmup_shape[1], warmup_shape[0], device=self.device
+            )
+            dummy_disparity = torch.ones(batch_size, device=self.device)
+            try:
+                _ = self.forward(dummy_image, dummy_disparity)
+            except RuntimeError as e:
+                if warmup_shape == INTERNAL_SHAPE:
+                    raise
+                # Some predictor variants only accept the internal resolution
+                print(f"  warmup at reduced resolution failed, skipping ({e})")
+                break
+            print(f"  warmup batch {batch_size}: {time.time() - warmup_start:.2f}s")
+
+        # Sync to ensure warmup is complete
+        self.sync()
+
+        elapsed = time.time() - start_time
+        print(f"Sharp pipeline loaded on {self.device} in {elapsed:.2f}s")
+
+    def sync(self):
+        """Wait for queued device work (a no-op on CPU)."""
+        import torch
+
+        if self.device.type == "cuda":
+            torch.cuda.synchronize(self.device)
+
+    def forward(self, images, disparity_factors, predictor=None, autocast_dtype=None):
+        """
+        Run the predictor under the configured precision mode.
+        Outputs are always returned in fp32. Pass predictor/autocast_dtype
+        explicitly to bypass the configured mode (used for the fp32 reference).
+        """
+        import torch
+
+        if predictor is None:
+            predictor = self.predictor
+            autocast_dtype = self.autocast_dtype
+        if self.channels_last:
+            images = images.contiguous(memory_format=torch.channels_last)
+
+        with torch.no_grad(), torch.autocast(
+            device_type=self.device.type,
+            dtype=autocast_dtype or torch.float32,
+            enabled=autocast_dtype is not None,
+        ):
+            gaussians_ndc = predictor(images, disparity_factors)
+
+        if autocast_dtype is None:
+            return gaussians_ndc
+        return gaussians_to_float32(gaussians_ndc)
+
+    def print_debug_stats(self, label: str, gaussians):
+        """
+        Print value ranges of Gaussians when debug_stats is on. Each min/max is
+        a device sync, so production requests skip this.
+        """
+        if not self.debug_stats:
+            return
+        print(f"{label}:")
+        print(
+            f"  Mean vectors range: {gaussians.mean_vectors.min():.3f} to {gaussians.mean_vectors.max():.3f}"
+        )
+        print(
+            f"  Colors range: {gaussians.colors.min():.3f} to {gaussians.colors.max():.3f}"
+        )
+        print(
+            f"  Opacities range: {gaussians.opacities.min():.3f} to {gaussians.opacities.max():.3f}"
+        )
+
+    def decode_image(self, image_bytes: bytes):
+        """
+        Decode an image straight to a uint8 (3, H, W) tensor on the model device.
+        JPEGs are decoded on the GPU with nvjpeg when available; otherwise PIL
+        decodes on the host, using JPEG draft mode to let libjpeg downscale
+        very large photos (by a power of two, never below INTERNAL_SHAPE)
+        during decoding. The EXIF orientation is applied. Returns
+        (image, f_35mm, width, height) where width/height are the full,
+        oriented resolution of the photo (the tensor may be smaller).
+        """
+        import numpy as np
+        import torch
+        from PIL import Image
+
+        # Opening only parses the header; pixels are decoded below
+        img_pil = Image.open(io.BytesIO(image_bytes))
+        exif = img_pil.getexif()
+        orientation = exif.get(EXIF_ORIENTATION, 1)
+        f_35mm = exif_focal_length_35mm(exif) or DEFAULT_FOCAL_LENGTH_35MM
+        width, height = img_pil.size
+        if orientation in (5, 6, 7, 8):
+            width, height = height, width
+
+        image = None
+        if self.gpu_decode and self.device.type == "cuda" and img_pil.format == "JPEG":
+            try:
+                from torchvision.io import ImageReadMode, decode_jpeg
+
+                data = torch.frombuffer(bytearray(image_bytes), dtype=torch.uint8)
+                image = decode_jpeg(data, mode=ImageReadMode.RGB, device=self.device)
+            except (ImportError, RuntimeError) as e:
+                # e.g. CMYK or unusual JPEGs nvjpeg cannot handle
+                print(f"GPU JPEG decode unavailable, using PIL ({e})")
+
+        if image is None:
+            if img_pil.format == "JPEG":
+                img_pil.draft("RGB", INTERNAL_SHAPE)
+            if img_pil.mode != "RGB":
+                img_pil = img_pil.convert("RGB")
+            # Upload uint8 (4x less than float32); HWC -> CHW is a free view
+            image = torch.from_numpy(np.array(img_pil)).to(self.device).permute(2, 0, 1)
+
+        return orient_image(image, orientation), f_35mm, width, height
+
+    def prepare_image(self, image_bytes: bytes, timer=None):
+        """
+        Decode an image and resize it to the model's internal resolution.
+        Returns (image_resized, disparity_factor, f_px, width, height) where
+        image_resized is a (1, 3, H, W) tensor on the model device.
+        """
+        import torch
+        import torch.nn.functional as F
+        from sharp.utils.io import convert_focallength
+
+        timer = timer or StageTimer(self.device)
+
+        with timer.span("decode"):
+            image, f_35mm, width, height = self.decode_image(image_bytes)
+
+        # Focal length from EXIF, defaulting to Sharp's 30mm equivalent
+        f_px = convert_focallength(width, height, f_35mm)
+
+        with timer.span("resize"):
+            # Convert to float on the device, right before the resize
+            image_pt = image.to(torch.float32) / 255.0
+            disparity_factor = torch.tensor([f_px / width], device=self.device).float()
+
+            image_resized = F.interpolate(
+                image_pt[None],
+                size=(INTERNAL_SHAPE[1], INTERNAL_SHAPE[0]),
+                mode="bilinear",
+                align_corners=True,
+            )
+
+        return image_resized, disparity_factor, f_px, width, height
+
+    def level_elements(
+        self,
+        gaussians_ndc,
+        f_px: float,
+        width: int,
+        height: int,
+        output_format: str,
+        lod_fractions=(1.0,),
+        timer=None,
+        to_host=None,
+    ) -> list:
+        """
+        Unproject NDC Gaussians for a single image to metric space, prune them
+        and build the PLY elements for each LOD fraction (not yet serialized).
+        to_host(gaussians, level) optionally moves each level's Gaussians to
+        the CPU first (e.g. through pinned buffers); by default
+        gaussians_to_numpy copies them. "ply" elements are views of what it
+        returns, so it must not reuse one level's memory for another.
+        """
+        import torch
+
+        timer = timer or StageTimer(self.device)
+
+        with timer.span("unproject"):
+            intrinsics = torch.tensor(
+                [
+                    [f_px, 0, width / 2, 0],
+                    [0, f_px, height / 2, 0],
+                    [0, 0, 1, 0],
+                    [0, 0, 0, 1],
+                ],
+                dtype=torch.float32,
+                device=self.device,
+            )
+            intrinsics_resized = intrinsics.clone()
+            intrinsics_resized[0] *= INTERNAL_SHAPE[0] / width
+            intrinsics_resized[1] *= INTERNAL_SHAPE[1] / height
+
+            # Use fast on-device unprojection (original Sharp code moves to CPU for SVD)
+            gaussians = fast_unproject_gaussians_gpu(
+                gaussians_ndc,
+                torch.eye(4, device=self.device),
+                intrinsics_resized,
+                INTERNAL_SHAPE,
+            )
+        self.print_debug_stats("Gaussians after unproject", gaussians)
+
+        # Prune near-transparent and sub-pixel Gaussians
+        with timer.span("prune"):
+            gaussians = prune_gaussians_gpu(gaussians, f_px)
+            importance = None
+            if any(fraction < 1.0 for fraction in lod_fractions):
+                importance = gaussian_importance_gpu(gaussians, f_px)
+
+        # Move to CPU and lay out the PLY elements for each level
+        levels = []
+        with timer.span("export"):
+            for index, fraction in enumerate(lod_fractions):
+                level = gaussians
+                if fraction < 1.0:
+                    level = lod_gaussians_gpu(gaussians, importance, fraction)
+                if to_host is not None:
+                    level = to_host(level, index)
+                levels.append(splat_elements(level, f_px, (height, width), output_format))
+
+        return levels
+
+    def export_gaussians(
+        self,
+        gaussians_ndc,
+        f_px: float,
+        width: int,
+        height: int,
+        output_format: str,
+        lod_fractions=(1.0,),
+        timer=None,
+    ) -> list:
+        """Unproject, prune and export one file per LOD fraction for a single image."""
+        from splat_io import write_ply
+
+        timer = timer or StageTimer(self.device)
+        levels = self.level_elements(
+            gaussians_ndc, f_px, width, height, output_format, lod_fractions, timer
+        )
+
+        # Save to PLY (in-memory, no temp files)
+        with timer.span("encode"):
+            return [write_ply(elements) for elements in levels]
+
+    def infer_micro_batch(self, images, disparity_factors):
+        """
+        Run one forward pass over a stacked micro-batch.
+        If the batch does not fit in GPU memory it is split in half and retried,
+        so a too-large SHARP_MAX_BATCH_SIZE degrades instead of failing.
+        Returns a list with one single-image Gaussians3D per input.
+        """
+        import torch
+
+        batch_size = images.shape[0]
+        try:
+            gaussians_ndc = self.forward(images, disparity_factors)
+        except torch.cuda.OutOfMemoryError:
+            if batch_size == 1:
+                raise
+            torch.cuda.empty_cache()
+            half = batch_size // 2
+            print(f"  OOM at batch size {batch_size}, splitting into {half} + {batch_size - half}")
+            return self.infer_micro_batch(
+                images[:half], disparity_factors[:half]
+            ) + self.infer_micro_batch(images[half:], disparity_factors[half:])
+
+        return [select_gaussians(gaussians_ndc, i) for i in range(batch_size)]
+
+    def predict_elements(
+        self, image_bytes: bytes, output_format: str, lod_fractions=(1.0,), timer=None
+    ):
+        """
+        Decode, infer and postprocess one image up to (but not including)
+        serialization. Returns the PLY elements per LOD fraction; stage spans
+        are recorded on timer.
+        """
+        # Note: we use splat_io.write_ply instead of sharp.utils.gaussians.save_ply
+        timer = timer or StageTimer(self.device)
+
+        image_resized, disparity_factor, f_px, width, height = self.prepare_image(
+            image_bytes, timer
+        )
+
+        # Run inference
+        with timer.span("inference"):
+            gaussians_ndc = self.forward(image_resized, disparity_factor)
+        self.print_debug_stats("Gaussians NDC stats", gaussians_ndc)
+
+        # Postprocess: Convert to metric space and lay out the export
+        return self.level_elements(
+            gaussians_ndc, f_px, width, height, output_format, lod_fractions, timer
+        )
+
+    def observe(self, timer, num_gaussians: int = None, prefix: str = "") -> dict:
+        """Resolve a request's timer, add it to the histograms and log one summary line."""
+        timings = timer.seconds()
+        self.histograms.observe(timings, prefix)
+        stages = " ".join(
+            f"{key[: -len('_seconds')]}={seconds * 1000:.0f}ms" for key, seconds in timings.items()
+        )
+        count = f" gaussians={num_gaussians}" if num_gaussians is not None else ""
+        print(f"{prefix.rstrip('_') or 'predict'}: {stages}{count}")
+        return timings
+
+    def predict(self, image_bytes: bytes, output_format: str = "ply", lod_fractions=(1.0,)):
+        """
+        Run the full decode -> inference -> export pipeline for one image.
+        Returns one PLY file per LOD fraction.
+        """
+        ply_list, _ = self.predict_timed(image_bytes, output_format, lod_fractions)
+        return ply_list
+
+    def predict_timed(self, image_bytes: bytes, output_format: str = "ply", lod_fractions=(1.0,)):
+        """Like predict, but returns (ply_list, timings) with per-stage seconds."""
+        from splat_io import element_count, write_ply
+
+        timer = StageTimer(self.device)
+        levels = self.predict_elements(image_bytes, output_format, lod_fractions, timer)
+
+        # Save to PLY (in-memory, no temp files)
+        with timer.span("encode"):
+            ply_list = [write_ply(elements) for elements in levels]
+
+        return ply_list, self.observe(timer, element_count(levels[0]))
+
+    def predict_batch(self, images: list, output_format: str = "ply") -> list:
+        """
+        Convert several images in batched forward passes (no caching).
+        Images are resized to the internal resolution, stacked into micro-batches
+        of up to MAX_BATCH_SIZE and run through the predictor together; the
+        unprojection and PLY export then fan back out per image. Timings are
+        recorded per micro-batch under "batch_" stage names.
+        Returns one PLY file per input image, in input order.
+        """
+        import torch
+
+        results = []
+        for batch_start in range(0, len(images), MAX_BATCH_SIZE):
+            batch = images[batch_start : batch_start + MAX_BATCH_SIZE]
+            timer = StageTimer(self.device)
+            prepared = [self.prepare_image(image_bytes, timer) for image_bytes in batch]
+
+            batch_images = torch.cat([p[0] for p in prepared], dim=0)
+            batch_disparity = torch.cat([p[1] for p in prepared], dim=0)
+
+            with timer.span("inference"):
+                gaussians_per_image = self.infer_micro_batch(batch_images, batch_disparity)
+
+            # Free the stacked inputs before the per-image postprocessing
+            del batch_images, batch_disparity
+
+            for (_, _, f_px, width, height), gaussians_ndc in zip(prepared, gaussians_per_image):
+                results.extend(
+                    self.export_gaussians(
+                        gaussians_ndc, f_px, width, height, output_format, timer=timer
+                    )
+                )
+            self.observe(timer, prefix="batch_")
+
+        return results
+
+    def check_precision(
+        self, image_bytes: bytes, tolerance: float = PRECISION_TOLERANCE, runs: int = 3
+    ) -> dict:
+        """
+        Compare the configured inference mode against eager fp32 on one image.
+        Returns per-field errors, whether every field is within tolerance, and
+        the median inference latency of both paths so modes can be ranked.
+        """
+        image_resized, disparity_factor, _, _, _ = self.prepare_image(image_bytes)
+
+        def timed(run):
+            latencies = []
+            output = None
+            for _ in range(runs):
+                self.sync()
+                run_start = time.time()
+                output = run()
+                self.sync()
+                latencies.append(time.time() - run_start)
+            return output, statistics.median(latencies)
+
+        reference, fp32_latency = timed(
+            lambda: self.forward(
+                image_resized, disparity_factor, predictor=self.eager_predictor
+            )
+        )
+        candidate, mode_latency = timed(
+            lambda: self.forward(image_resized, disparity_factor)
+        )
+
+        errors = compare_gaussians(reference, candidate)
+        within_tolerance = all(e["relative"] <= tolerance for e in errors.values())
+        print(
+            f"Precision check {self.inference_mode}: within_tolerance={within_tolerance} "
+            f"latency {mode_latency:.3f}s vs fp32 {fp32_latency:.3f}s"
+        )
+        return {
+            "inference_mode": self.inference_mode,
+            "tolerance": tolerance,
+            "within_tolerance": within_tolerance,
+            "errors": errors,
+            "latency_seconds": mode_latency,
+            "fp32_latency_seconds": fp32_latency,
+        }
+
+    def benchmark(self, image_bytes: bytes, runs: int = 3, output_format: str = "ply") -> dict:
+        """Median per-stage seconds of predict over several runs on one image."""
+        samples = {}
+        for _ in range(runs):
+            _, timings = self.predict_timed(image_bytes, output_format)
+            for stage, seconds in timings.items():
+                samples.setdefault(stage, []).append(seconds)
+        return {stage: statistics.median(values) for stage, values in samples.items()}
+
+
+POSTPROCESS_BENCHMARK_SIZES = (1_000_000, 3_000_000, 10_000_000)
+
+
+def random_rotation_matrices(count: int, device="cpu", seed: int = 0) -> "torch.Tensor":
+    """Uniformly random rotation matrices (from normalized Gaussian quaternions)."""
+    import torch
+
+    generator = torch.Generator().manual_seed(seed)
+    q = torch.randn(count, 4, generator=generator)
+    q = q / torch.linalg.norm(q, dim=-1, keepdim=True)
+    w, x, y, z = q.unbind(-1)
+    matrices = torch.stack(
+        [
+            1 - 2 * (y * y + z * z), 2 * (x * y - w * z), 2 * (x * z + w * y),
+            2 * (x * y + w * z), 1 - 2 * (x * x + z * z), 2 * (y * z - w * x),
+            2 * (x * z - w * y), 2 * (y * z + w * x), 1 - 2 * (x * x + y * y),
+        ],
+        -1,
+    ).reshape(count, 3, 3)
+    return matrices.to(device)
+
+
+def benchmark_quaternions(sizes=POSTPROCESS_BENCHMARK_SIZES, device=None, runs: int = 3) -> list:
+    """
+    Time quaternions_from_rotation_matrices_gpu against the mask-based version
+    and scipy for each batch size. Reports the best of runs in seconds and
+    the largest absolute difference to the mask-based result (up to sign
+    for scipy, which may return -q).
+    """
+    import time
+
+    import numpy as np
+    import torch
+    from scipy.spatial.transform import Rotation
+
+    if device is None:
+        device = "cuda" if torch.cuda.is_available() else "cpu"
+
+    def best_of(fn, arg):
+        best = float("inf")
+        for _ in range(runs):
+            if device == "cuda":
+                torch.cuda.synchronize()
+            start = time.perf_counter()
+            result = fn(arg)
+            if device == "cuda":
+                torch.cuda.synchronize()
+            best = min(best, time.perf_counter() - start)
+        return best, result
+
+    rows = []
+    for count in sizes:
+        matrices = random_rotation_matrices(count, device)
+        masked_time, reference = best_of(quaternions_from_rotation_matrices_masked, matrices)
+        branchless_time, quaternions = best_of(quaternions_from_rotation_matrices_gpu, matrices)
+        reference = reference.cpu().numpy()
+
+        matrices_np = matrices.cpu().numpy()
+        numpy_time, quaternions_np = best_of(quaternions_from_rotation_matrices_gpu, matrices_np)
+        scipy_time, scipy_xyzw = best_of(
+            lambda m: Rotation.from_matrix(m).as_quat(), matrices_np.astype(np.float64)
+        )
+        scipy_wxyz = np.roll(scipy_xyzw, 1, axis=-1)
+        scipy_error = np.minimum(
+            np.abs(scipy_wxyz - reference).max(-1), np.abs(scipy_wxyz + reference).max(-1)
+        ).max()
+
+        rows.append(
+            {
+                "count": count,
+                "device": device,
+                "masked_seconds": masked_time,
+                "branchless_seconds": branchless_time,
+                "numpy_seconds": numpy_time,
+                "scipy_seconds": scipy_time,
+                "branchless_max_error": float(np.abs(quaternions.cpu().numpy() - reference).max()),
+                "numpy_max_error": float(np.abs(quaternions_np - reference).max()),
+                "scipy_max_error": float(scipy_error),
+            }
+        )
+        row = rows[-1]
+        print(
+            f"{count:>10,} on {device}: masked {masked_time * 1000:8.1f} ms, "
+            f"branchless {branchless_time * 1000:8.1f} ms "
+            f"({masked_time / branchless_time:4.1f}x), "
+            f"numpy {numpy_time * 1000:8.1f} ms, scipy {scipy_time * 1000:8.1f} ms, "
+            f"max error {row['branchless_max_error']:.1e} / "
+            f"{row['numpy_max_error']:.1e} / {row['scipy_max_error']:.1e}"
+        )
+    return rows
+
+
+def random_covariance_matrices(count: int, device="cpu", seed: int = 0) -> "torch.Tensor":
+    """Random covariances with log-normal standard deviations like Sharp outputs."""
+    import torch
+
+    generator = torch.Generator().manual_seed(seed)
+    rotations = random_rotation_matrices(count, seed=seed)
+    variances = torch.exp(torch.randn(count, 3, generator=generator) * 1.5 - 5) ** 2
+    covariances = rotations @ torch.diag_embed(variances) @ rotations.transpose(-1, -2)
+    return covariances.to(device)
+
+
+def benchmark_covariance_decomposition(
+    sizes=POSTPROCESS_BENCHMARK_SIZES, device=None, runs: int = 3
+) -> list:
+    """
+    Time the Jacobi-based fast_decompose_covariance_matrices_gpu against the
+    previous SVD-based version. Accuracy is covered by
+    tests/test_covariance_decomposition.py.
+    """
+    import time
+
+    import torch
+
+    if device is None:
+        device = "cuda" if torch.cuda.is_available() else "cpu"
+
+    def best_of(fn, arg):
+        best = float("inf")
+        for _ in range(runs):
+            if device == "cuda":
+                torch.cuda.synchronize()
+            start = time.perf_counter()
+            fn(arg.clone())
+            if device == "cuda":
+                torch.cuda.synchronize()
+            best = min(best, time.perf_counter() - start)
+        return best
+
+    rows = []
+    for count in sizes:
+        covariances = random_covariance_matrices(count, device)
+        svd_time = best_of(decompose_covariance_matrices_svd, covariances)
+        jacobi_time = best_of(fast_decompose_covariance_matrices_gpu, covariances)
+
+        rows.append(
+            {
+                "count": count,
+                "device": device,
+                "svd_seconds": svd_time,
+                "jacobi_seconds": jacobi_time,
+            }
+        )
+        print(
+            f"{count:>10,} on {device}: svd {svd_time * 1000:8.1f} ms, "
+            f"jacobi {jacobi_time * 1000:8.1f} ms ({svd_time / jacobi_time:4.1f}x)"
+        )
+    return rows
+
+
+def main():
+    import argparse
+    import json
+    from pathlib import Path
+
+    parser = argparse.ArgumentParser(
+        description="Convert images to 3D Gaussian splats without Modal."
+    )
+    parser.add_argument("images", nargs="+", help="input images (PNG, JPG or WebP)")
+    parser.add_argument("--checkpoint", default=None, help="model checkpoint path")
+    parser.add_argument("--device", default=None, help="cpu, cuda or cuda:N (default: auto)")
+    parser.add_argument("--threads", type=int, default=None, help="intra-op CPU threads")
+    parser.add_argument("--inference-mode", default=DEFAULT_INFERENCE_MODE, choices=INFERENCE_MODES)
+    parser.add_argument("--format", default="ply", choices=OUTPUT_FORMATS)
+    parser.add_argument("--channels-last", action="store_true", help="NHWC conv layout (CPU)")
+    parser.add_argument("--no-onednn", action="store_true", help="disable oneDNN (CPU)")
+    parser.add_argument(
+        "--pipelined",
+        action="store_true",
+        help="overlap decode, inference and export across images (sharp_executor)",
+    )
+    parser.add_argument(
+        "--debug-stats", action="store_true", help="print intermediate value ranges"
+    )
+    parser.add_argument(
+        "--warmup-size", type=int, default=None, help="square warmup resolution"
+    )
+    parser.add_argument(
+        "--benchmark",
+        type=int,
+        default=0,
+        metavar="RUNS",
+        help="report median per-stage timings over RUNS runs instead of writing files",
+    )
+    args = parser.parse_args()
+
+    checkpoint_path = args.checkpoint or default_checkpoint_path()
+    ensure_checkpoint(checkpoint_path)
+    pipeline = SharpPipeline(
+        checkpoint_path,
+        device=args.device,
+        inference_mode=args.inference_mode,
+        num_threads=args.threads,
+        channels_last=args.channels_last,
+        onednn=not args.no_onednn,
+        warmup_shape=(args.warmup_size, args.warmup_size) if args.warmup_size else None,
+        debug_stats=args.debug_stats,
+    )
+
+    if args.pipelined and not args.benchmark:
+        from sharp_executor import PipelinedExecutor
+
+        executor = PipelinedExecutor(pipeline)
+        start_time = time.time()
+        futures = [
+            (image_path, executor.submit(Path(image_path).read_bytes(), args.format))
+            for image_path in args.images
+        ]
+        for image_path, future in futures:
+            output_path = Path(image_path).stem + "_gaussian.ply"
+            Path(output_path).write_bytes(future.result()[0][0])
+            print(f"Saved 3D Gaussian splats to: {output_path}")
+        executor.close()
+        elapsed = time.time() - start_time
+        print(f"{len(args.images)} images in {elapsed:.2f}s ({len(args.images) / elapsed:.2f} images/s)")
+        return
+
+    for image_path in args.images:
+        image_bytes = Path(image_path).read_bytes()
+        if args.benchmark:
+            stages = pipeline.benchmark(image_bytes, args.benchmark, args.format)
+            print(json.dumps({"image": image_path, "device": str(pipeline.device), **stages}, indent=2))
+            continue
+
+        ply_bytes = pipeline.predict(image_bytes, args.format)[0]
+        output_path = Path(image_path).stem + "_gaussian.ply"
+        Path(output_path).write_bytes(ply_bytes)
+        print(f"Saved 3D Gaussian splats to: {output_path}")
+
+
+if __name__ == "__main__":
+    main()
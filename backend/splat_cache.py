@@ -0,0 +1,203 @@
+"""
+Content-addressed result cache for generated Gaussian splats.
+
+Splat outputs are keyed by a hash of the input image bytes, the model
+checkpoint and the postprocessing parameters, so re-uploading a photo that
+has already been converted returns the stored PLY instead of re-running
+inference. Entries live as plain files in a directory (the sharp-model-cache
+Modal volume when deployed, a local directory otherwise) and are evicted in
+least-recently-used order once the total size exceeds a cap.
+"""
+
+import hashlib
+import json
+import os
+import tempfile
+import threading
+from collections import OrderedDict
+
+# Bump when the export code changes in a way that alters output bytes,
+# so stale entries are never served for new requests.
+CACHE_VERSION = 2
+
+DEFAULT_MAX_BYTES = 10 * 1024**3  # 10 GB
+CACHE_FILE_SUFFIX = ".ply"
+
+
+def default_cache_dir(volume_path: str) -> str:
+    """
+    Pick the cache directory.
+    SHARP_SPLAT_CACHE_DIR wins if set; otherwise use a folder on the mounted
+    Modal volume, falling back to a per-user directory when run off-Modal.
+    """
+    override = os.environ.get("SHARP_SPLAT_CACHE_DIR")
+    if override:
+        return override
+    if os.path.isdir(volume_path):
+        return os.path.join(volume_path, "splats")
+    return os.path.join(os.path.expanduser("~"), ".cache", "shopiverse", "splats")
+
+
+def splat_cache_key(image_bytes: bytes, checkpoint: str, params: dict) -> str:
+    """Hash the image bytes, model checkpoint and postprocessing parameters."""
+    digest = hashlib.sha256()
+    digest.update(image_bytes)
+    digest.update(b"\0")
+    digest.update(checkpoint.encode("utf-8"))
+    digest.update(b"\0")
+    digest.update(
+        json.dumps(
+            {"cache_version": CACHE_VERSION, **params}, sort_keys=True
+        ).encode("utf-8")
+    )
+    return digest.hexdigest()
+
+
+class SplatCache:
+    """
+    Directory-backed LRU cache of generated splat files.
+    Recency is tracked in memory and mirrored to file mtimes so the order
+    survives container restarts. Several containers may share the directory:
+    entries written elsewhere are picked up on lookup, and entries evicted
+    elsewhere are treated as misses.
+    """
+
+    def __init__(self, directory: str, max_bytes: int = DEFAULT_MAX_BYTES, on_write=None):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        # Called after files are added or removed (e.g. to commit a Modal volume)
+        self.on_write = on_write
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()  # key -> size in bytes, oldest first
+        self._total_bytes = 0
+
+        os.makedirs(directory, exist_ok=True)
+        self._scan()
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.directory, key + CACHE_FILE_SUFFIX)
+
+    def _scan(self):
+        """Rebuild the LRU index from the files already in the directory."""
+        found = []
+        for entry in os.scandir(self.directory):
+            if not entry.is_file() or not entry.name.endswith(CACHE_FILE_SUFFIX):
+                continue
+            stat = entry.stat()
+            found.append((stat.st_mtime, entry.name[: -len(CACHE_FILE_SUFFIX)], stat.st_size))
+        found.sort()
+        for _, key, size in found:
+            self._entries[key] = size
+            self._total_bytes += size
+
+    def _forget(self, key: str):
+        size = self._entries.pop(key, None)
+        if size is not None:
+            self._total_bytes -= size
+
+    def get(self, key: str):
+        """Return the cached bytes for key, or None on a miss."""
+        path = self._path(key)
+        with self._lock:
+            try:
+                with open(path, "rb") as f:
+                    data = f.read()
+            except FileNotFoundError:
+                self._forget(key)
+                self.misses += 1
+                return None
+
+            if key not in self._entries:
+                self._entries[key] = len(data)
+                self._total_bytes += len(data)
+            self._entries.move_to_end(key)
+            try:
+                os.utime(path)
+            except OSError:
+                pass
+            self.hits += 1
+            return data
+
+    def put(self, key: str, data: bytes):
+        """Store data under key and evict least-recently-used entries over the cap."""
+        if len(data) > self.max_bytes:
+            return
+        path = self._path(key)
+        with self._lock:
+            # Write to a temp file first so readers never see a partial entry
+            fd, tmp_path = tempfile.mkstemp(dir=self.directory, suffix=".tmp")
+            try:
+                with os.fdopen(fd, "wb") as f:
+                    f.write(data)
+                os.replace(tmp_path, path)
+            except BaseException:
+                if os.path.exists(tmp_path):
+                    os.remove(tmp_path)
+                raise
+
+            self._add(key, len(data))
+
+        if self.on_write is not None:
+            self.on_write()
+
+    def tee(self, key: str, chunks):
+        """
+        Yield chunks unchanged while writing them to the cache under key.
+        The entry is only committed once the iterator is exhausted; if the
+        consumer stops early (e.g. a streaming client disconnects) the partial
+        temp file is discarded.
+        """
+        fd, tmp_path = tempfile.mkstemp(dir=self.directory, suffix=".tmp")
+        size = 0
+        try:
+            with os.fdopen(fd, "wb") as f:
+                for chunk in chunks:
+                    f.write(chunk)
+                    size += len(chunk)
+                    yield chunk
+        except BaseException:
+            os.remove(tmp_path)
+            raise
+
+        if size > self.max_bytes:
+            os.remove(tmp_path)
+            return
+        with self._lock:
+            os.replace(tmp_path, self._path(key))
+            self._add(key, size)
+
+        if self.on_write is not None:
+            self.on_write()
+
+    def _add(self, key: str, size: int):
+        self._forget(key)
+        self._entries[key] = size
+        self._total_bytes += size
+        self._evict()
+
+    def _evict(self):
+        while self._total_bytes > self.max_bytes and self._entries:
+            key, size = self._entries.popitem(last=False)
+            self._total_bytes -= size
+            self.evictions += 1
+            try:
+                os.remove(self._path(key))
+            except FileNotFoundError:
+                pass
+
+    def stats(self) -> dict:
+        """Hit/miss counters and current size, for logging and the stats endpoint."""
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+                "evictions": self.evictions,
+                "entries": len(self._entries),
+                "total_bytes": self._total_bytes,
+                "max_bytes": self.max_bytes,
+            }
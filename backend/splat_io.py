@@ -0,0 +1,674 @@
+"""
+Gaussian splat file I/O.
+
+A small NumPy-only binary PLY writer used for Sharp outputs. The header is
+built directly and every element is copied column by column into a single
+preallocated buffer, so exporting multi-million-Gaussian scenes needs no
+intermediate structured arrays and no plyfile round-trip. Output is
+byte-for-byte identical to what plyfile writes for the same elements.
+"""
+
+import numpy as np
+
+# PLY scalar type names for each NumPy type code, as written by plyfile
+PLY_TYPE_NAMES = {
+    "i1": "char",
+    "u1": "uchar",
+    "i2": "short",
+    "u2": "ushort",
+    "i4": "int",
+    "u4": "uint",
+    "f4": "float",
+    "f8": "double",
+}
+
+# Per-Gaussian properties of a Sharp PLY, in file order
+VERTEX_PROPERTIES = (
+    "x",
+    "y",
+    "z",
+    "f_dc_0",
+    "f_dc_1",
+    "f_dc_2",
+    "opacity",
+    "scale_0",
+    "scale_1",
+    "scale_2",
+    "rot_0",
+    "rot_1",
+    "rot_2",
+    "rot_3",
+)
+VERTEX_DTYPE = np.dtype([(name, "<f4") for name in VERTEX_PROPERTIES])
+
+
+def _little_endian(dtype: np.dtype) -> np.dtype:
+    return np.dtype([(name, dtype[name].newbyteorder("<")) for name in dtype.names])
+
+
+def ply_header(elements) -> bytes:
+    """
+    Build a binary little-endian PLY header.
+    elements: sequence of (name, dtype, count) with structured dtypes.
+    """
+    lines = ["ply", "format binary_little_endian 1.0"]
+    for name, dtype, count in elements:
+        lines.append(f"element {name} {count}")
+        for field in dtype.names:
+            lines.append(f"property {PLY_TYPE_NAMES[dtype[field].str[1:]]} {field}")
+    lines.append("end_header")
+    return ("\n".join(lines) + "\n").encode("ascii")
+
+
+def _layout(elements):
+    """Normalize (name, dtype, columns) elements to (name, dtype, count, columns)."""
+    layout = []
+    for name, dtype, columns in elements:
+        dtype = _little_endian(np.dtype(dtype))
+        if isinstance(columns, dict):
+            count = len(columns[dtype.names[0]])
+        else:
+            count = len(columns[0])
+        layout.append((name, dtype, count, columns))
+    return layout
+
+
+def _fill_rows(view: np.ndarray, dtype: np.dtype, columns, start: int, stop: int):
+    """Copy rows [start, stop) of an element's columns into a structured view."""
+    if isinstance(columns, dict):
+        for field in dtype.names:
+            values = columns[field]
+            if start or stop != len(values):
+                values = np.asarray(values)[start:stop]
+            view[field] = values
+    else:
+        num_fields = len(dtype.names)
+        flat = view.view(dtype[0]).reshape(stop - start, num_fields)
+        np.concatenate(
+            [np.asarray(block)[start:stop].reshape(stop - start, -1) for block in columns],
+            axis=1,
+            out=flat,
+            casting="same_kind",
+        )
+
+
+def ply_size(elements) -> int:
+    """Total size in bytes of the PLY write_ply/iter_ply would produce."""
+    layout = _layout(elements)
+    header = ply_header([(name, dtype, count) for name, dtype, count, _ in layout])
+    return len(header) + sum(dtype.itemsize * count for _, dtype, count, _ in layout)
+
+
+def element_count(elements, name: str = "vertex") -> int:
+    """Number of rows of the named element (e.g. Gaussians in "vertex")."""
+    for element_name, _, count, _ in _layout(elements):
+        if element_name == name:
+            return count
+    raise KeyError(name)
+
+
+def write_ply(elements) -> bytearray:
+    """
+    Serialize PLY elements into one contiguous buffer.
+    elements: sequence of (name, dtype, columns). columns is either a mapping
+    of each field of the structured dtype to a 1-D array-like, or - when all
+    fields share one scalar type - a list of 2-D blocks covering consecutive
+    fields (e.g. [xyz, colors, opacity, scales, quaternions] for a vertex).
+    Data is cast and copied straight into the output, so the only allocation
+    is the returned buffer; the block form copies with one concatenate.
+    """
+    layout = _layout(elements)
+    header = ply_header([(name, dtype, count) for name, dtype, count, _ in layout])
+    total_size = len(header) + sum(dtype.itemsize * count for _, dtype, count, _ in layout)
+
+    buffer = bytearray(total_size)
+    buffer[: len(header)] = header
+
+    offset = len(header)
+    for _, dtype, count, columns in layout:
+        view = np.frombuffer(buffer, dtype=dtype, count=count, offset=offset)
+        _fill_rows(view, dtype, columns, 0, count)
+        offset += dtype.itemsize * count
+
+    return buffer
+
+
+def iter_ply(elements, chunk_bytes: int = 4 * 1024 * 1024):
+    """
+    Serialize PLY elements incrementally, yielding the header and then
+    roughly chunk_bytes-sized pieces of each element. Produces exactly the
+    bytes of write_ply without ever holding more than one chunk, so large
+    scenes can be streamed to a client while they are being serialized.
+    """
+    layout = _layout(elements)
+    yield ply_header([(name, dtype, count) for name, dtype, count, _ in layout])
+
+    for _, dtype, count, columns in layout:
+        rows_per_chunk = max(1, chunk_bytes // dtype.itemsize)
+        for start in range(0, count, rows_per_chunk):
+            stop = min(start + rows_per_chunk, count)
+            chunk = np.empty(stop - start, dtype=dtype)
+            _fill_rows(chunk, dtype, columns, start, stop)
+            yield memoryview(chunk).cast("B")
+
+
+def sharp_metadata_elements(
+    f_px: float, image_shape: tuple, num_gaussians: int, disparity_quantiles, color_space: int
+):
+    """
+    The metadata elements Sharp appends after the vertex block, in file order:
+    camera extrinsic/intrinsic, image size, frame, disparity range, color
+    space (as encoded by sharp.utils.color_space) and format version.
+    """
+    image_height, image_width = image_shape
+    return [
+        ("extrinsic", np.dtype([("extrinsic", "f4")]), {"extrinsic": np.eye(4).flatten()}),
+        (
+            "intrinsic",
+            np.dtype([("intrinsic", "f4")]),
+            {
+                "intrinsic": [
+                    f_px,
+                    0,
+                    image_width * 0.5,
+                    0,
+                    f_px,
+                    image_height * 0.5,
+                    0,
+                    0,
+                    1,
+                ]
+            },
+        ),
+        ("image_size", np.dtype([("image_size", "u4")]), {"image_size": [image_width, image_height]}),
+        ("frame", np.dtype([("frame", "i4")]), {"frame": [1, num_gaussians]}),
+        (
+            "disparity",
+            np.dtype([("disparity", "f4")]),
+            {"disparity": [disparity_quantiles[0], disparity_quantiles[1]]},
+        ),
+        ("color_space", np.dtype([("color_space", "u1")]), {"color_space": [color_space]}),
+        ("version", np.dtype([("version", "u1")]), {"version": [1, 5, 0]}),
+    ]
+
+
+# =============================================================================
+# READING
+# =============================================================================
+
+# NumPy type code for each PLY scalar type name (including the int8/float32
+# style aliases some writers use)
+PLY_TYPE_CODES = {name: code for code, name in PLY_TYPE_NAMES.items()}
+PLY_TYPE_CODES.update(
+    {
+        "int8": "i1",
+        "uint8": "u1",
+        "int16": "i2",
+        "uint16": "u2",
+        "int32": "i4",
+        "uint32": "u4",
+        "float32": "f4",
+        "float64": "f8",
+    }
+)
+
+
+def parse_ply_header(data):
+    """
+    Parse a binary little-endian PLY header.
+    Returns (elements, header_size) where elements is a list of
+    (name, dtype, count) with little-endian structured dtypes.
+    Raises ValueError for anything else (ASCII/big-endian files, list
+    properties, unknown types).
+    """
+    end = bytes(data[:65536]).find(b"end_header\n")
+    if not bytes(data[:4]) == b"ply\n" or end < 0:
+        raise ValueError("Not a PLY file or header too large")
+    header_size = end + len("end_header\n")
+    lines = bytes(data[:end]).decode("ascii", errors="replace").split("\n")
+
+    elements = []
+    fields = None
+    for line in lines[1:]:
+        parts = line.split()
+        if not parts or parts[0] in ("comment", "obj_info"):
+            continue
+        if parts[0] == "format":
+            if parts[1:] != ["binary_little_endian", "1.0"]:
+                raise ValueError(f"Unsupported PLY format: {' '.join(parts[1:])}")
+        elif parts[0] == "element":
+            fields = []
+            elements.append([parts[1], fields, int(parts[2])])
+        elif parts[0] == "property":
+            if fields is None:
+                raise ValueError("PLY property declared before any element")
+            if parts[1] == "list":
+                raise ValueError("PLY list properties are not supported")
+            if parts[1] not in PLY_TYPE_CODES:
+                raise ValueError(f"Unknown PLY property type: {parts[1]}")
+            fields.append((parts[2], "<" + PLY_TYPE_CODES[parts[1]]))
+        else:
+            raise ValueError(f"Unexpected PLY header line: {line}")
+
+    return [(name, np.dtype(fields), count) for name, fields, count in elements], header_size
+
+
+def read_ply(data) -> dict:
+    """
+    Read a binary little-endian PLY into {element name: structured array}.
+    Arrays are zero-copy views into data (bytes, bytearray, mmap or memmap).
+    """
+    elements, offset = parse_ply_header(data)
+    arrays = {}
+    for name, dtype, count in elements:
+        size = dtype.itemsize * count
+        if offset + size > len(data):
+            raise ValueError(f"PLY element '{name}' is truncated")
+        arrays[name] = np.frombuffer(data, dtype=dtype, count=count, offset=offset)
+        offset += size
+    return arrays
+
+
+def splat_from_vertex(vertex: np.ndarray) -> dict:
+    """
+    Gather a Sharp-style vertex array into float32 property blocks:
+    xyz (n, 3), f_dc (n, 3), opacity (n,) logits, scale (n, 3) logs and
+    rot (n, 4) quaternions in rot_0..rot_3 (w, x, y, z) order.
+    """
+
+    def block(*names):
+        return np.stack([vertex[name] for name in names], axis=1).astype(np.float32)
+
+    return {
+        "xyz": block("x", "y", "z"),
+        "f_dc": block("f_dc_0", "f_dc_1", "f_dc_2"),
+        "opacity": np.asarray(vertex["opacity"], dtype=np.float32),
+        "scale": block("scale_0", "scale_1", "scale_2"),
+        "rot": block("rot_0", "rot_1", "rot_2", "rot_3"),
+    }
+
+
+# =============================================================================
+# COMPRESSED PLY
+# Chunked, quantized layout understood by gaussian-splats-3d (the PlayCanvas
+# "compressed ply"): Gaussians are sorted along a Morton curve and grouped in
+# chunks of 256 that store float min/max ranges for position and log-scale.
+# Each Gaussian is then four uint32s - position and scale as 11/10/11-bit
+# offsets within the chunk range, rotation as smallest-three 2+10/10/10 bits
+# and color as 8-bit RGB plus 8-bit opacity - 16 bytes instead of 56.
+# =============================================================================
+
+COMPRESSED_CHUNK_SIZE = 256
+SH_C0 = 0.28209479177387814
+
+CHUNK_PROPERTIES = (
+    "min_x",
+    "min_y",
+    "min_z",
+    "max_x",
+    "max_y",
+    "max_z",
+    "min_scale_x",
+    "min_scale_y",
+    "min_scale_z",
+    "max_scale_x",
+    "max_scale_y",
+    "max_scale_z",
+)
+CHUNK_DTYPE = np.dtype([(name, "<f4") for name in CHUNK_PROPERTIES])
+COMPRESSED_VERTEX_DTYPE = np.dtype(
+    [
+        ("packed_position", "<u4"),
+        ("packed_rotation", "<u4"),
+        ("packed_scale", "<u4"),
+        ("packed_color", "<u4"),
+    ]
+)
+
+# Log-scales are clamped to this range before quantization
+SCALE_LOG_RANGE = (-20.0, 20.0)
+
+
+def _spread_bits_10(values: np.ndarray) -> np.ndarray:
+    """Insert two zero bits between each of the low 10 bits (for Morton codes)."""
+    v = values.astype(np.uint32) & 0x3FF
+    v = (v | (v << 16)) & 0x030000FF
+    v = (v | (v << 8)) & 0x0300F00F
+    v = (v | (v << 4)) & 0x030C30C3
+    v = (v | (v << 2)) & 0x09249249
+    return v
+
+
+def morton_codes(xyz: np.ndarray) -> np.ndarray:
+    """30-bit Morton (Z-order) codes of points on a 1024^3 grid over their bounds."""
+    if len(xyz) == 0:
+        return np.zeros(0, dtype=np.uint32)
+    lo = xyz.min(axis=0)
+    extent = np.maximum(xyz.max(axis=0) - lo, 1e-12)
+    cells = np.clip((xyz - lo) / extent * 1023.0, 0, 1023).astype(np.uint32)
+    return (
+        (_spread_bits_10(cells[:, 0]) << 2)
+        | (_spread_bits_10(cells[:, 1]) << 1)
+        | _spread_bits_10(cells[:, 2])
+    )
+
+
+def morton_order(xyz: np.ndarray) -> np.ndarray:
+    """Indices that sort points along a 30-bit Morton (Z-order) curve over their bounds."""
+    return np.argsort(morton_codes(xyz), kind="stable")
+
+
+def _pack_unorm(values: np.ndarray, bits: int) -> np.ndarray:
+    top = (1 << bits) - 1
+    return np.clip(np.floor(values * top + 0.5), 0, top).astype(np.uint32)
+
+
+def _unpack_unorm(values: np.ndarray, bits: int) -> np.ndarray:
+    top = (1 << bits) - 1
+    return (values & top).astype(np.float32) / top
+
+
+def _chunk_ranges(values: np.ndarray, starts: np.ndarray):
+    return np.minimum.reduceat(values, starts, axis=0), np.maximum.reduceat(values, starts, axis=0)
+
+
+def _pack_11_10_11(values: np.ndarray, lo: np.ndarray, hi: np.ndarray) -> np.ndarray:
+    """values/lo/hi: (n, 3), lo/hi already expanded per Gaussian."""
+    extent = hi - lo
+    t = np.where(extent > 0, (values - lo) / np.where(extent > 0, extent, 1.0), 0.0)
+    return (
+        (_pack_unorm(t[:, 0], 11) << 21)
+        | (_pack_unorm(t[:, 1], 10) << 11)
+        | _pack_unorm(t[:, 2], 11)
+    )
+
+
+def _unpack_11_10_11(packed: np.ndarray, lo: np.ndarray, hi: np.ndarray) -> np.ndarray:
+    t = np.stack(
+        [
+            _unpack_unorm(packed >> 21, 11),
+            _unpack_unorm(packed >> 11, 10),
+            _unpack_unorm(packed, 11),
+        ],
+        axis=1,
+    )
+    return lo + t * (hi - lo)
+
+
+def _pack_rotations(rot: np.ndarray) -> np.ndarray:
+    """Smallest-three encoding: 2-bit index of the largest component, 3 x 10 bits for the rest."""
+    q = rot / np.maximum(np.linalg.norm(rot, axis=1, keepdims=True), 1e-12)
+    largest = np.abs(q).argmax(axis=1)
+    rows = np.arange(len(q))
+    q = q * np.where(q[rows, largest] < 0, -1.0, 1.0)[:, None]
+
+    # Drop the largest component, keeping the other three in order
+    keep = np.ones_like(q, dtype=bool)
+    keep[rows, largest] = False
+    rest = q[keep].reshape(-1, 3)
+    packed = _pack_unorm(rest * (np.sqrt(2.0) * 0.5) + 0.5, 10)
+    return (
+        (largest.astype(np.uint32) << 30)
+        | (packed[:, 0] << 20)
+        | (packed[:, 1] << 10)
+        | packed[:, 2]
+    )
+
+
+def _unpack_rotations(packed: np.ndarray) -> np.ndarray:
+    norm = np.float32(np.sqrt(2.0))
+    rest = np.stack(
+        [
+            (_unpack_unorm(packed >> 20, 10) - 0.5) * norm,
+            (_unpack_unorm(packed >> 10, 10) - 0.5) * norm,
+            (_unpack_unorm(packed, 10) - 0.5) * norm,
+        ],
+        axis=1,
+    )
+    largest_value = np.sqrt(np.maximum(1.0 - (rest**2).sum(axis=1), 0.0))
+    largest = (packed >> 30).astype(np.int64)
+
+    q = np.empty((len(packed), 4), dtype=np.float32)
+    rows = np.arange(len(packed))
+    keep = np.ones_like(q, dtype=bool)
+    keep[rows, largest] = False
+    q[keep] = rest.reshape(-1)
+    q[rows, largest] = largest_value
+    return q
+
+
+def compressed_ply_elements(splat: dict):
+    """
+    Quantize float property blocks (see splat_from_vertex) into the chunk and
+    vertex elements of a compressed PLY, ready for write_ply or iter_ply.
+    Gaussians are written in Morton order; use morton_order(splat["xyz"]) to
+    line the original up with decode_compressed_ply output. Raises
+    ValueError for a splat with no Gaussians.
+    """
+    if len(splat["xyz"]) == 0:
+        raise ValueError("Cannot encode a compressed PLY with no Gaussians")
+    order = morton_order(splat["xyz"])
+    xyz = splat["xyz"][order]
+    scale = np.clip(splat["scale"][order], *SCALE_LOG_RANGE)
+    num_gaussians = len(xyz)
+
+    starts = np.arange(0, num_gaussians, COMPRESSED_CHUNK_SIZE)
+    chunk_index = np.arange(num_gaussians) // COMPRESSED_CHUNK_SIZE
+    xyz_min, xyz_max = _chunk_ranges(xyz, starts)
+    scale_min, scale_max = _chunk_ranges(scale, starts)
+
+    rgb = np.clip(splat["f_dc"][order] * SH_C0 + 0.5, 0.0, 1.0)
+    alpha = 1.0 / (1.0 + np.exp(-splat["opacity"][order].astype(np.float64)))
+    rgba = _pack_unorm(np.concatenate([rgb, alpha[:, None]], axis=1), 8)
+
+    vertex = {
+        "packed_position": _pack_11_10_11(xyz, xyz_min[chunk_index], xyz_max[chunk_index]),
+        "packed_rotation": _pack_rotations(splat["rot"][order]),
+        "packed_scale": _pack_11_10_11(scale, scale_min[chunk_index], scale_max[chunk_index]),
+        "packed_color": (rgba[:, 0] << 24) | (rgba[:, 1] << 16) | (rgba[:, 2] << 8) | rgba[:, 3],
+    }
+    chunks = [xyz_min, xyz_max, scale_min, scale_max]
+
+    return [
+        ("chunk", CHUNK_DTYPE, chunks),
+        ("vertex", COMPRESSED_VERTEX_DTYPE, vertex),
+    ]
+
+
+def encode_compressed_ply(splat: dict) -> bytearray:
+    """Encode float property blocks as a compressed PLY (see compressed_ply_elements)."""
+    return write_ply(compressed_ply_elements(splat))
+
+
+def decode_compressed_ply(data) -> dict:
+    """Decode a compressed PLY back into float property blocks (file order)."""
+    elements = read_ply(data)
+    chunk = elements["chunk"]
+    vertex = elements["vertex"]
+    chunk_index = np.arange(len(vertex)) // COMPRESSED_CHUNK_SIZE
+
+    def chunk_block(*names):
+        return np.stack([chunk[name] for name in names], axis=1)[chunk_index]
+
+    xyz = _unpack_11_10_11(
+        vertex["packed_position"],
+        chunk_block("min_x", "min_y", "min_z"),
+        chunk_block("max_x", "max_y", "max_z"),
+    )
+    scale = _unpack_11_10_11(
+        vertex["packed_scale"],
+        chunk_block("min_scale_x", "min_scale_y", "min_scale_z"),
+        chunk_block("max_scale_x", "max_scale_y", "max_scale_z"),
+    )
+
+    color = vertex["packed_color"]
+    rgb = np.stack(
+        [_unpack_unorm(color >> 24, 8), _unpack_unorm(color >> 16, 8), _unpack_unorm(color >> 8, 8)],
+        axis=1,
+    )
+    if "min_r" in chunk.dtype.names:
+        rgb = chunk_block("min_r", "min_g", "min_b") + rgb * (
+            chunk_block("max_r", "max_g", "max_b") - chunk_block("min_r", "min_g", "min_b")
+        )
+    alpha = np.clip(_unpack_unorm(color, 8), 1e-6, 1.0 - 1e-6)
+
+    return {
+        "xyz": xyz.astype(np.float32),
+        "f_dc": ((rgb - 0.5) / SH_C0).astype(np.float32),
+        "opacity": (-np.log(1.0 / alpha - 1.0)).astype(np.float32),
+        "scale": scale.astype(np.float32),
+        "rot": _unpack_rotations(vertex["packed_rotation"]),
+    }
+
+
+def compressed_roundtrip_error(splat: dict, data=None) -> dict:
+    """
+    Encode (unless encoded data is given), decode and report quantization error:
+    position error relative to the scene extent, color and opacity error in
+    8-bit steps, log-scale error, rotation error in degrees and size ratio.
+    """
+    if data is None:
+        data = encode_compressed_ply(splat)
+    decoded = decode_compressed_ply(data)
+    original = {key: value[morton_order(splat["xyz"])] for key, value in splat.items()}
+
+    extent = float(np.linalg.norm(original["xyz"].max(axis=0) - original["xyz"].min(axis=0)))
+    position_error = np.linalg.norm(decoded["xyz"] - original["xyz"], axis=1) / max(extent, 1e-12)
+
+    rgb_original = np.clip(original["f_dc"] * SH_C0 + 0.5, 0.0, 1.0)
+    color_error = np.abs(decoded["f_dc"] * SH_C0 + 0.5 - rgb_original) * 255.0
+
+    def sigmoid(x):
+        return 1.0 / (1.0 + np.exp(-x.astype(np.float64)))
+
+    opacity_error = np.abs(sigmoid(decoded["opacity"]) - sigmoid(original["opacity"])) * 255.0
+    scale_error = np.abs(decoded["scale"] - np.clip(original["scale"], *SCALE_LOG_RANGE))
+
+    q_original = original["rot"] / np.linalg.norm(original["rot"], axis=1, keepdims=True)
+    dot = np.clip(np.abs((decoded["rot"] * q_original).sum(axis=1)), 0.0, 1.0)
+    rotation_error = np.degrees(2.0 * np.arccos(dot))
+
+    def summary(values):
+        return {"max": float(values.max()), "mean": float(values.mean())}
+
+    raw_size = len(original["xyz"]) * VERTEX_DTYPE.itemsize
+    return {
+        "num_gaussians": len(original["xyz"]),
+        "compressed_bytes": len(data),
+        "compression_ratio": raw_size / len(data),
+        "position_relative": summary(position_error),
+        "color_8bit": summary(color_error),
+        "opacity_8bit": summary(opacity_error),
+        "log_scale": summary(scale_error),
+        "rotation_degrees": summary(rotation_error),
+    }
+
+
+# =============================================================================
+# SPATIAL CHUNKING
+# Float32 PLYs whose Gaussians are reordered so that consecutive rows are
+# close in space. A fixed number of rows then forms a compact chunk whose
+# byte range and bounding box go into a small index, letting a viewer
+# range-request the chunks nearest the camera first. Depth order sorts
+# front-to-back into log-spaced camera-depth bins (Sharp cameras sit at the
+# origin looking down +z) with Morton order inside each bin.
+# =============================================================================
+
+SPATIAL_ORDERS = ("morton", "depth")
+DEPTH_BINS = 64
+SPATIAL_CHUNK_ROWS = 4096
+
+
+def depth_bin_order(xyz: np.ndarray, num_bins: int = DEPTH_BINS) -> np.ndarray:
+    """Indices that sort points into near-to-far depth bins, Morton order within a bin."""
+    log_depth = np.log(np.maximum(xyz[:, 2].astype(np.float64), 1e-6))
+    lo = log_depth.min()
+    extent = max(log_depth.max() - lo, 1e-12)
+    bins = np.clip((log_depth - lo) / extent * num_bins, 0, num_bins - 1).astype(np.uint64)
+    keys = (bins << np.uint64(30)) | morton_codes(xyz).astype(np.uint64)
+    return np.argsort(keys, kind="stable")
+
+
+def spatial_order(xyz: np.ndarray, method: str) -> np.ndarray:
+    """Indices that reorder points by one of SPATIAL_ORDERS."""
+    if method == "morton":
+        return morton_order(xyz)
+    if method == "depth":
+        return depth_bin_order(xyz)
+    raise ValueError(
+        f"Unknown spatial order {method!r}, expected one of {', '.join(SPATIAL_ORDERS)}"
+    )
+
+
+def reorder_splat(splat: dict, method: str) -> dict:
+    """Float property blocks (see splat_from_vertex) reordered by spatial_order."""
+    if len(splat["xyz"]) == 0:
+        return splat
+    order = spatial_order(splat["xyz"], method)
+    return {key: value[order] for key, value in splat.items()}
+
+
+def ply_chunk_index(data, chunk_rows: int = SPATIAL_CHUNK_ROWS) -> dict:
+    """
+    Index consecutive runs of chunk_rows vertex rows of a float32 PLY.
+    Each chunk has its byte offset and length in the file, its first row,
+    row count and the min/max corners of its positions. Fetch bytes
+    [0, header_bytes) first, then the chunks in any order; the elements after
+    the vertex block start at trailer_offset.
+    """
+    elements, header_size = parse_ply_header(data)
+    offset = header_size
+    for name, dtype, count in elements:
+        if name == "vertex":
+            break
+        offset += dtype.itemsize * count
+    else:
+        raise ValueError("PLY has no vertex element")
+
+    vertex = read_ply(data)["vertex"]
+    xyz = np.stack([vertex["x"], vertex["y"], vertex["z"]], axis=1)
+    chunks = []
+    if count:
+        starts = np.arange(0, count, chunk_rows)
+        lo, hi = _chunk_ranges(xyz, starts)
+        for first, chunk_min, chunk_max in zip(starts.tolist(), lo.tolist(), hi.tolist()):
+            rows = min(chunk_rows, count - first)
+            chunks.append(
+                {
+                    "offset": offset + first * dtype.itemsize,
+                    "length": rows * dtype.itemsize,
+                    "first": first,
+                    "count": rows,
+                    "min": chunk_min,
+                    "max": chunk_max,
+                }
+            )
+
+    return {
+        "header_bytes": header_size,
+        "row_bytes": dtype.itemsize,
+        "chunk_rows": chunk_rows,
+        "num_gaussians": count,
+        "trailer_offset": offset + count * dtype.itemsize,
+        "chunks": chunks,
+    }
+
+
+if __name__ == "__main__":
+    import json
+    import sys
+
+    if len(sys.argv) not in (2, 3) or (len(sys.argv) == 3 and sys.argv[1] != "--chunks"):
+        print("Usage: python splat_io.py <scene.ply>")
+        print("  Reports the quantization error of the compressed PLY encoding")
+        print("       python splat_io.py --chunks <scene.ply>")
+        print("  Prints the spatial chunk index (byte ranges and bounding boxes)")
+        sys.exit(1)
+
+    with open(sys.argv[-1], "rb") as f:
+        ply_data = f.read()
+    if sys.argv[1] == "--chunks":
+        print(json.dumps(ply_chunk_index(ply_data), indent=2))
+        sys.exit(0)
+    vertex_splat = splat_from_vertex(read_ply(ply_data)["vertex"])
+    print(json.dumps(compressed_roundtrip_error(vertex_splat), indent=2))
@@ -0,0 +1,182 @@
+"""
+Asynchronous job queue for splat generation.
+
+Instead of holding an HTTP connection open for the whole cold start plus
+inference, clients submit a job, poll its status and fetch the result once it
+is done. Job ids are the splat cache key of the request, so identical
+submissions (same image, model and parameters) share one job while it is in
+flight and the finished PLY is read back from the splat cache.
+
+Job records live in a small key/value store: a Modal Dict when deployed
+(ModalDictJobStore) or an in-process dict (LocalJobStore). LocalJobQueue runs
+jobs on a thread pool so the queue can be exercised without Modal.
+"""
+
+import threading
+import time
+import traceback
+from concurrent.futures import ThreadPoolExecutor
+
+JOB_QUEUED = "queued"
+JOB_RUNNING = "running"
+JOB_DONE = "done"
+JOB_FAILED = "failed"
+JOB_STATUSES = (JOB_QUEUED, JOB_RUNNING, JOB_DONE, JOB_FAILED)
+
+# Queued/running jobs not updated for this long are assumed lost (e.g. the
+# worker container was preempted) and may be resubmitted. Must exceed the
+# worker timeout.
+JOB_STALE_SECONDS = 600
+
+
+def new_job_record(job_id: str, params: dict) -> dict:
+    """A fresh queued job record; params are echoed back in status responses."""
+    now = time.time()
+    return {
+        "job_id": job_id,
+        "status": JOB_QUEUED,
+        "params": params,
+        "error": None,
+        "submitted_at": now,
+        "updated_at": now,
+        "started_at": None,
+        "finished_at": None,
+    }
+
+
+def job_is_reusable(record) -> bool:
+    """True if a new submission should attach to this existing record."""
+    if record is None or record["status"] == JOB_FAILED:
+        return False
+    if record["status"] == JOB_DONE:
+        return True
+    return time.time() - record["updated_at"] < JOB_STALE_SECONDS
+
+
+class LocalJobStore:
+    """In-process job record store."""
+
+    def __init__(self):
+        self._records = {}
+        self._lock = threading.Lock()
+
+    def get(self, job_id: str):
+        with self._lock:
+            record = self._records.get(job_id)
+            return dict(record) if record is not None else None
+
+    def put(self, job_id: str, record: dict):
+        with self._lock:
+            self._records[job_id] = dict(record)
+
+    def claim(self, job_id: str, record: dict):
+        """
+        Insert record unless a reusable job already exists.
+        Returns (stored_record, created).
+        """
+        with self._lock:
+            existing = self._records.get(job_id)
+            if job_is_reusable(existing):
+                return dict(existing), False
+            self._records[job_id] = dict(record)
+            return dict(record), True
+
+
+class ModalDictJobStore:
+    """Job record store backed by a modal.Dict shared by all containers."""
+
+    def __init__(self, modal_dict):
+        self._dict = modal_dict
+
+    def get(self, job_id: str):
+        return self._dict.get(job_id)
+
+    def put(self, job_id: str, record: dict):
+        self._dict[job_id] = record
+
+    def claim(self, job_id: str, record: dict):
+        """
+        Insert record unless a reusable job already exists.
+        Returns (stored_record, created). Concurrent first submissions are
+        resolved by skip_if_exists; replacing a failed or stale record is
+        last-writer-wins, which at worst runs the job twice.
+        """
+        existing = self._dict.get(job_id)
+        if job_is_reusable(existing):
+            return existing, False
+        if existing is None:
+            if not self._dict.put(job_id, record, skip_if_exists=True):
+                return self._dict.get(job_id), False
+        else:
+            self._dict[job_id] = record
+        return record, True
+
+
+class JobQueue:
+    """
+    Tracks job state in a store and hands new jobs to dispatch(job_id, payload).
+    Workers call run(job_id, work) to execute a job and record its outcome;
+    the result itself is stored by work (in the splat cache), not here.
+    """
+
+    def __init__(self, store, dispatch):
+        self.store = store
+        self.dispatch = dispatch
+
+    def submit(self, job_id: str, payload, params: dict):
+        """
+        Queue a job unless an identical one is already queued, running or done.
+        Returns (record, created).
+        """
+        record, created = self.store.claim(job_id, new_job_record(job_id, params))
+        if created:
+            try:
+                self.dispatch(job_id, payload)
+            except Exception as e:
+                self.fail(job_id, f"Dispatch failed: {e}")
+                raise
+        return record, created
+
+    def status(self, job_id: str):
+        """The job record, or None for an unknown job id."""
+        return self.store.get(job_id)
+
+    def _update(self, job_id: str, **fields):
+        record = self.store.get(job_id) or new_job_record(job_id, {})
+        record.update(fields, updated_at=time.time())
+        self.store.put(job_id, record)
+        return record
+
+    def fail(self, job_id: str, error: str):
+        """Mark a job failed so the next identical submission runs it again."""
+        return self._update(job_id, status=JOB_FAILED, error=error, finished_at=time.time())
+
+    def run(self, job_id: str, work):
+        """Run work() for a job, recording running/done/failed transitions."""
+        self._update(job_id, status=JOB_RUNNING, started_at=time.time())
+        try:
+            work()
+        except Exception as e:
+            traceback.print_exc()
+            self.fail(job_id, str(e))
+            return False
+        self._update(job_id, status=JOB_DONE, finished_at=time.time())
+        return True
+
+
+class LocalJobQueue(JobQueue):
+    """
+    In-process queue: jobs run on a thread pool via worker(payload).
+    Useful for testing the submit/status/result flow without Modal.
+    """
+
+    def __init__(self, worker, max_workers: int = 1, store=None):
+        self._executor = ThreadPoolExecutor(max_workers=max_workers)
+        self._worker = worker
+        super().__init__(store or LocalJobStore(), self._dispatch)
+
+    def _dispatch(self, job_id: str, payload):
+        self._executor.submit(self.run, job_id, lambda: self._worker(payload))
+
+    def shutdown(self, wait: bool = True):
+        self._executor.shutdown(wait=wait)
@@ -0,0 +1,69 @@
+"""AnalyticsLog keeps storing events when the summary or a flush fails."""
+
+import time
+
+from analytics_log import AnalyticsLog
+from analytics_store import AnalyticsStore
+from analytics_summary import AnalyticsSummary
+
+
+def events(count: int, start: int = 0) -> list:
+    return [
+        {
+            "timestamp": f"2026-01-02T10:{(start + i) % 60:02d}:00",
+            "session_id": f"s{(start + i) % 3}",
+            "user_id": "u1",
+            "action": "view_product",
+            "data": "{}",
+            "event_id": str(start + i),
+            "device_type": "desktop",
+            "page": "/",
+            "scene": "",
+            "product_id": "p1",
+        }
+        for i in range(count)
+    ]
+
+
+def test_failed_summary_update_is_rebuilt(tmp_path, monkeypatch):
+    store = AnalyticsStore(str(tmp_path / "analytics"))
+    summary = AnalyticsSummary(str(tmp_path / "summary.json"), store)
+    summary.load()
+    log = AnalyticsLog(store, summary)
+
+    def broken_apply(batch):
+        raise RuntimeError("boom")
+
+    monkeypatch.setattr(summary, "apply", broken_apply)
+    log.append(events(5))
+    log.flush()  # stored; the summary failure is logged, not raised
+    monkeypatch.undo()
+
+    assert store.count() == 5
+    assert summary.get() == summary.scan().render()
+
+    log.append(events(4, start=5))
+    log.close()
+    assert store.count() == 9
+    assert summary.get() == summary.scan().render()
+
+
+def test_flusher_survives_unexpected_errors(tmp_path):
+    store = AnalyticsStore(str(tmp_path / "analytics"))
+    failures = []
+    append = store.append
+
+    def flaky_append(records):
+        if not failures:
+            failures.append(records)
+            raise ValueError("bad batch")
+        append(records)
+
+    store.append = flaky_append
+    log = AnalyticsLog(store, flush_interval=0.05)
+    log.append(events(3))
+    deadline = time.monotonic() + 5
+    while store.count() < 3 and time.monotonic() < deadline:
+        time.sleep(0.02)
+    log.close()
+    assert failures and store.count() == 3
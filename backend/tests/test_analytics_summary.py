@@ -0,0 +1,89 @@
+"""The journaled summary must agree with a full scan of the store."""
+
+import json
+import random
+
+import analytics_summary
+from analytics_store import AnalyticsStore
+from analytics_summary import AnalyticsSummary, canonical
+
+ACTIONS = [
+    "session_start", "navigate", "view_product", "add_to_cart",
+    "start_checkout", "complete_checkout", "send_chat_message", "session_end",
+]
+
+
+def random_events(count: int, seed: int) -> list:
+    rng = random.Random(seed)
+    events = []
+    for i in range(count):
+        action = rng.choice(ACTIONS)
+        session = rng.randint(0, 20)
+        data = {"fromScene": "a", "toScene": "b", "timeInPreviousScene": 3} if action == "navigate" else {}
+        events.append({
+            "timestamp": f"2026-01-{rng.randint(1, 3):02d}T{rng.randint(0, 23):02d}:{rng.randint(0, 59):02d}:00",
+            "session_id": f"s{session}",
+            "user_id": f"u{session % 8}",
+            "action": action,
+            "data": json.dumps(data),
+            "event_id": f"{seed}-{i}",
+            "device_type": rng.choice(["desktop", "mobile"]),
+            "page": "/",
+            "scene": rng.choice(["", "a", "b"]),
+            "product_id": rng.choice(["", "p1", "p2"]),
+            "message_text": "what does it cost" if action == "send_chat_message" else "",
+        })
+    return events
+
+
+def store_and_apply(store, summary, events):
+    store.append(events)
+    summary.apply(events)
+
+
+def test_journal_and_checkpoints_match_scan(tmp_path, monkeypatch):
+    monkeypatch.setattr(analytics_summary, "JOURNAL_COMPACT_BATCHES", 3)
+    store = AnalyticsStore(str(tmp_path / "analytics"))
+    summary = AnalyticsSummary(str(tmp_path / "summary.json"), store)
+    summary.load()
+    for seed in range(7):  # two checkpoints, one batch left in the journal
+        store_and_apply(store, summary, random_events(50, seed))
+
+    assert canonical(summary.get()) == canonical(summary.scan().render())
+    for session in summary.get()["sessions"].values():
+        assert "actions" not in session and session["actionCount"] > 0
+
+    restarted = AnalyticsSummary(summary.path, store)
+    restarted.load()
+    assert canonical(restarted.get()) == canonical(summary.get())
+
+
+def test_workers_see_each_others_batches(tmp_path):
+    store = AnalyticsStore(str(tmp_path / "analytics"))
+    first = AnalyticsSummary(str(tmp_path / "summary.json"), store)
+    second = AnalyticsSummary(first.path, store)
+    first.load()
+    second.load()
+
+    store_and_apply(store, first, random_events(40, 1))
+    version = second.version()
+    store_and_apply(store, second, random_events(40, 2))
+    assert second.version() != version
+    store_and_apply(store, first, random_events(40, 3))
+
+    expected = canonical(first.scan().render())
+    assert canonical(first.get()) == expected
+    assert canonical(second.get()) == expected
+
+
+def test_rendered_summary_is_a_copy(tmp_path):
+    store = AnalyticsStore(str(tmp_path / "analytics"))
+    summary = AnalyticsSummary(str(tmp_path / "summary.json"), store)
+    summary.load()
+    store_and_apply(store, summary, random_events(30, 4))
+    rendered = summary.get()
+    serialized = json.dumps(rendered, sort_keys=True)
+
+    store_and_apply(store, summary, random_events(30, 5))
+    assert json.dumps(rendered, sort_keys=True) == serialized
+    assert canonical(summary.get()) == canonical(summary.scan().render())
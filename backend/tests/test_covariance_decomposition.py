@@ -0,0 +1,129 @@
+"""The Jacobi covariance decomposition must match torch.linalg.eigh."""
+
+import math
+
+import pytest
+from sharp_pipeline import (
+    fast_decompose_covariance_matrices_gpu,
+    quaternions_from_rotation_matrices_gpu,
+    quaternions_from_rotation_matrices_masked,
+    random_covariance_matrices,
+    random_rotation_matrices,
+)
+
+torch = pytest.importorskip("torch")
+
+# Float32 round-off, relative to the largest entry or eigenvalue
+TOLERANCE = 1e-5
+
+
+def rotation_matrices(quaternions):
+    """(N, 4) unit quaternions [w, x, y, z] -> (N, 3, 3) rotation matrices."""
+    w, x, y, z = quaternions.unbind(-1)
+    return torch.stack(
+        [
+            1 - 2 * (y * y + z * z), 2 * (x * y - w * z), 2 * (x * z + w * y),
+            2 * (x * y + w * z), 1 - 2 * (x * x + z * z), 2 * (y * z - w * x),
+            2 * (x * z - w * y), 2 * (y * z + w * x), 1 - 2 * (x * x + y * y),
+        ],
+        -1,
+    ).reshape(-1, 3, 3)
+
+
+def axis_angle_matrices(axes, angles):
+    """Rotations by angles (radians) about axes, as float32 matrices."""
+    axes = torch.tensor(axes, dtype=torch.float64)
+    axes = axes / torch.linalg.norm(axes, dim=-1, keepdim=True)
+    half = torch.tensor(angles, dtype=torch.float64)[:, None] / 2
+    quaternions = torch.cat([torch.cos(half), axes * torch.sin(half)], -1)
+    return rotation_matrices(quaternions).float()
+
+
+def shepperd_case(matrices):
+    """The branch quaternions_from_rotation_matrices_gpu takes per matrix."""
+    m00, m11, m22 = matrices[:, 0, 0], matrices[:, 1, 1], matrices[:, 2, 2]
+    return torch.where(
+        m00 + m11 + m22 > 0,
+        0,
+        torch.where((m00 > m11) & (m00 > m22), 1, torch.where(m11 > m22, 2, 3)),
+    )
+
+
+def branch_rotations():
+    """Rotations covering all four Shepperd cases, including their boundaries."""
+    axes = [
+        (1, 0, 0), (0, 1, 0), (0, 0, 1),  # half turns: one case each for x, y, z
+        (1, 1, 0), (0, 1, 1), (1, 0, 1),  # half turns with tied diagonals
+        (1, 1, 1), (1, -1, 1), (1, 2, 3),
+    ]
+    angles = [math.pi, math.pi - 1e-3, 2 * math.pi / 3, 0.0, 1e-4]
+    matrices = axis_angle_matrices(
+        [axis for axis in axes for _ in angles], [angle for _ in axes for angle in angles]
+    )
+    return torch.cat([matrices, random_rotation_matrices(1000, seed=1)])
+
+
+def covariances_from(rotations, variances):
+    return rotations @ torch.diag_embed(variances) @ rotations.transpose(-1, -2)
+
+
+def special_covariances():
+    """Degenerate, repeated-eigenvalue and ill-conditioned covariances."""
+    rotations = random_rotation_matrices(8, seed=2)
+    variances = torch.tensor(
+        [
+            [0.0, 0.0, 0.0],  # zero matrix
+            [1.0, 0.0, 0.0],  # rank 1
+            [1.0, 1.0, 0.0],  # rank 2, repeated
+            [2.0, 2.0, 2.0],  # isotropic
+            [3.0, 1.0, 1.0],  # two equal, smaller
+            [3.0, 3.0, 1.0],  # two equal, larger
+            [1.0, 1e-6, 1e-12],  # wide dynamic range
+            [1e-8, 1e-8, 1e-8],  # tiny Gaussian
+        ]
+    )
+    rotated = covariances_from(rotations, variances)
+    axis_aligned = torch.diag_embed(variances)  # already diagonal: no Jacobi rotations
+    branches = branch_rotations()
+    generator = torch.Generator().manual_seed(3)
+    branch_variances = torch.rand(len(branches), 3, generator=generator) + 0.1
+    return torch.cat([rotated, axis_aligned, covariances_from(branches, branch_variances)])
+
+
+def assert_matches_eigh(covariances):
+    quaternions, singular_values = fast_decompose_covariance_matrices_gpu(covariances)
+    reference = torch.linalg.eigh(covariances.double()).eigenvalues.flip(-1)
+
+    assert torch.allclose(torch.linalg.norm(quaternions, dim=-1), torch.ones(len(quaternions)), atol=1e-6)
+    assert (singular_values[:, :-1] >= singular_values[:, 1:]).all()
+
+    scale = reference.abs().amax(-1).clamp(min=1e-30)
+    eigenvalue_error = ((singular_values.double() ** 2 - reference).abs().amax(-1) / scale).max()
+    assert eigenvalue_error < TOLERANCE
+
+    rebuilt = covariances_from(rotation_matrices(quaternions), singular_values**2)
+    magnitude = covariances.abs().amax(dim=(-2, -1)).clamp(min=1e-30)
+    rebuild_error = ((rebuilt - covariances).abs().amax(dim=(-2, -1)) / magnitude).max()
+    assert rebuild_error < TOLERANCE
+
+
+def test_random_covariances_match_eigh():
+    assert_matches_eigh(random_covariance_matrices(20000, seed=0))
+
+
+def test_special_covariances_match_eigh():
+    assert_matches_eigh(special_covariances())
+
+
+def test_quaternions_cover_every_shepperd_case():
+    matrices = branch_rotations()
+    assert set(shepperd_case(matrices).tolist()) == {0, 1, 2, 3}
+
+    quaternions = quaternions_from_rotation_matrices_gpu(matrices)
+    assert torch.allclose(rotation_matrices(quaternions), matrices, atol=TOLERANCE)
+
+    reference = quaternions_from_rotation_matrices_masked(matrices)
+    assert torch.allclose(quaternions, reference, atol=1e-6)
+
+    numpy_quaternions = quaternions_from_rotation_matrices_gpu(matrices.numpy())
+    assert torch.allclose(torch.from_numpy(numpy_quaternions), quaternions, atol=1e-6)
@@ -0,0 +1,24 @@
+"""SceneIndex updates from several processes must not lose entries."""
+
+import multiprocessing
+
+from ply_ingest import SceneIndex
+
+
+def put_entries(path: str, prefix: str, count: int):
+    index = SceneIndex(path)
+    for i in range(count):
+        index.put(f"{prefix}{i}.ply", {"filename": f"{prefix}{i}.ply", "vertex_count": i})
+
+
+def test_concurrent_puts_keep_every_entry(tmp_path):
+    path = str(tmp_path / "scene_index.json")
+    context = multiprocessing.get_context("spawn")
+    workers = [context.Process(target=put_entries, args=(path, prefix, 40)) for prefix in "ab"]
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join(30)
+
+    assert all(worker.exitcode == 0 for worker in workers)
+    assert len(SceneIndex(path).load()) == 80
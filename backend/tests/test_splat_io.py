@@ -0,0 +1,75 @@
+"""The NumPy PLY writer must produce exactly the bytes plyfile writes."""
+
+import io
+
+import numpy as np
+import pytest
+from splat_io import VERTEX_DTYPE, iter_ply, ply_size, sharp_metadata_elements, write_ply
+
+plyfile = pytest.importorskip("plyfile")
+
+
+def random_splat(num_gaussians: int, seed: int = 0) -> dict:
+    rng = np.random.default_rng(seed)
+    quat = rng.normal(size=(num_gaussians, 4)).astype(np.float32)
+    return {
+        "xyz": rng.normal(size=(num_gaussians, 3)).astype(np.float32),
+        "color": rng.normal(size=(num_gaussians, 3)).astype(np.float32),
+        "opacity": rng.normal(size=(num_gaussians, 1)).astype(np.float32),
+        "scale": rng.normal(size=(num_gaussians, 3)).astype(np.float32),
+        "rot": quat / np.linalg.norm(quat, axis=1, keepdims=True),
+    }
+
+
+def splat_elements(splat: dict):
+    num_gaussians = len(splat["xyz"])
+    vertex = ("vertex", VERTEX_DTYPE, [splat[key] for key in ("xyz", "color", "opacity", "scale", "rot")])
+    return [vertex] + sharp_metadata_elements(
+        f_px=812.5, image_shape=(480, 640), num_gaussians=num_gaussians,
+        disparity_quantiles=(0.05, 0.95), color_space=1,
+    )
+
+
+def plyfile_bytes(elements) -> bytes:
+    """The same elements written through plyfile, as the exporter used to."""
+    described = []
+    for name, dtype, columns in elements:
+        dtype = np.dtype(dtype)
+        if isinstance(columns, dict):
+            count = len(columns[dtype.names[0]])
+            array = np.empty(count, dtype=dtype)
+            for field in dtype.names:
+                array[field] = columns[field]
+        else:
+            flat = np.concatenate([np.asarray(block).reshape(len(block), -1) for block in columns], axis=1)
+            array = np.empty(len(flat), dtype=dtype)
+            for i, field in enumerate(dtype.names):
+                array[field] = flat[:, i]
+        described.append(plyfile.PlyElement.describe(array, name))
+    buffer = io.BytesIO()
+    plyfile.PlyData(described, byte_order="<").write(buffer)
+    return buffer.getvalue()
+
+
+@pytest.mark.parametrize("num_gaussians", [1, 7, 1000])
+def test_write_ply_matches_plyfile(num_gaussians):
+    elements = splat_elements(random_splat(num_gaussians))
+    expected = plyfile_bytes(elements)
+    assert bytes(write_ply(elements)) == expected
+    assert ply_size(elements) == len(expected)
+
+
+@pytest.mark.parametrize("chunk_bytes", [1, 100, 4 * 1024 * 1024])
+def test_iter_ply_matches_plyfile(chunk_bytes):
+    elements = splat_elements(random_splat(333, seed=1))
+    assert b"".join(bytes(piece) for piece in iter_ply(elements, chunk_bytes)) == plyfile_bytes(elements)
+
+
+def test_column_mapping_matches_block_form():
+    splat = random_splat(50, seed=2)
+    block_elements = splat_elements(splat)
+    flat = np.concatenate([splat[key] for key in ("xyz", "color", "opacity", "scale", "rot")], axis=1)
+    mapping = {field: flat[:, i] for i, field in enumerate(VERTEX_DTYPE.names)}
+    mapping_elements = [("vertex", VERTEX_DTYPE, mapping)] + block_elements[1:]
+    assert bytes(write_ply(mapping_elements)) == bytes(write_ply(block_elements))
+    assert bytes(write_ply(mapping_elements)) == plyfile_bytes(mapping_elements)
@@ -0,0 +1,50 @@
+"""LocalJobQueue: deduplicated submissions and failed-job retries."""
+
+import threading
+
+from splat_jobs import JOB_DONE, JOB_FAILED, LocalJobQueue
+
+
+def test_duplicate_submit_runs_once():
+    release = threading.Event()
+    calls = []
+
+    def worker(payload):
+        calls.append(payload)
+        release.wait(5)
+
+    queue = LocalJobQueue(worker)
+    try:
+        _, created = queue.submit("job", "payload", {"format": "ply"})
+        _, duplicate = queue.submit("job", "payload", {"format": "ply"})
+        release.set()
+    finally:
+        queue.shutdown()
+
+    assert created and not duplicate
+    assert calls == ["payload"]
+    assert queue.status("job")["status"] == JOB_DONE
+    assert queue.submit("job", "payload", {})[1] is False
+
+
+def test_failed_job_is_rerun():
+    calls = []
+
+    def worker(payload):
+        calls.append(payload)
+        if len(calls) == 1:
+            raise RuntimeError("out of memory")
+
+    queue = LocalJobQueue(worker)
+    queue.submit("job", "payload", {})
+    queue.shutdown()
+    record = queue.status("job")
+    assert record["status"] == JOB_FAILED
+    assert record["error"] == "out of memory"
+
+    queue = LocalJobQueue(worker, store=queue.store)
+    _, created = queue.submit("job", "payload", {})
+    queue.shutdown()
+    assert created
+    assert calls == ["payload", "payload"]
+    assert queue.status("job")["status"] == JOB_DONE
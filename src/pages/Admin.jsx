@@ -1760,7 +1760,7 @@ function InsightsTab() {
     }
 
     const handleExportCSV = () => {
-        window.open('http://localhost:5000/api/analytics', '_blank')
+        window.open('http://localhost:5000/api/analytics/export', '_blank')
     }
 
     const escapeHtml = (value) => {
@@ -1,4 +1,18 @@
 const ANALYTICS_API_URL = 'http://localhost:5000/api/analytics'
+const ANALYTICS_BATCH_URL = `${ANALYTICS_API_URL}/batch`
+
+// Events are queued and sent together, when the queue reaches
+// FLUSH_MAX_EVENTS or FLUSH_DELAY_MS after the first queued event
+const FLUSH_MAX_EVENTS = 20
+const FLUSH_DELAY_MS = 2000
+const MAX_QUEUED_EVENTS = 500
+
+// Failed batches are retried after FLUSH_DELAY_MS, doubling per consecutive
+// failure up to MAX_RETRY_DELAY_MS (or after the server's Retry-After)
+const MAX_RETRY_DELAY_MS = 60000
+
+// Browsers cap the data of in-flight beacons at about 64 KB; stay below it
+const MAX_BEACON_BYTES = 60000
 
 // Guard against duplicate initialization (React StrictMode, HMR, etc.)
 const INIT_KEY = 'shopiverse_analytics_initialized'
@@ -44,40 +58,131 @@ const getEventId = () => {
   return `evt_${Date.now()}_${eventCounter}`
 }
 
+let queue = []
+let flushTimer = null
+let failedFlushes = 0
+
+// Statuses worth retrying: server errors, plus timeouts and rate limits
+const isRetryable = (status) => status >= 500 || status === 408 || status === 429
+
+const scheduleRetry = (retryAfterSeconds) => {
+  failedFlushes += 1
+  const backoff = Math.min(FLUSH_DELAY_MS * 2 ** (failedFlushes - 1), MAX_RETRY_DELAY_MS)
+  const delay = retryAfterSeconds > 0 ? retryAfterSeconds * 1000 : backoff
+  clearTimeout(flushTimer)
+  flushTimer = setTimeout(flushEvents, delay)
+}
+
 /**
- * Track a user action and send it to the backend
- * @param {string} action - The action name
- * @param {object} data - Additional data about the action
+ * Send all queued events to the batch endpoint. If the request fails with a
+ * network error or a retryable status, the events are put back in the queue
+ * (up to MAX_QUEUED_EVENTS) and retried with exponential backoff; a batch the
+ * server refuses (other 4xx) is dropped.
  */
-export async function trackEvent(action, data = {}) {
+export async function flushEvents() {
+  clearTimeout(flushTimer)
+  flushTimer = null
+  if (queue.length === 0) return
+
+  const events = queue
+  queue = []
   try {
-    const response = await fetch(ANALYTICS_API_URL, {
+    const response = await fetch(ANALYTICS_BATCH_URL, {
       method: 'POST',
       headers: { 'Content-Type': 'application/json' },
-      body: JSON.stringify({
-        eventId: getEventId(),
-        action,
-        timestamp: new Date().toISOString(),
-        sessionId: getSessionId(),
-        userId: getUserId(),
-        sessionDuration: Math.round((Date.now() - sessionStartTime) / 1000), // seconds since session start
-        deviceType: getDeviceType(),
-        page: window.location.pathname || 'store',
-        scene: currentScene,
-        productId: data.productId || data.hotspotId,
-        orderTotal: data.total,
-        cartValue: data.total,
-        messageText: data.messageText,
-        data
-      })
+      body: JSON.stringify(events)
     })
 
+    if (isRetryable(response.status)) {
+      console.warn(`Analytics error: HTTP ${response.status}, retrying`)
+      queue = events.concat(queue).slice(-MAX_QUEUED_EVENTS)
+      scheduleRetry(parseInt(response.headers.get('Retry-After')))
+      return
+    }
+    failedFlushes = 0
     if (!response.ok) {
-      console.warn('Failed to track event:', action)
+      // Resending the same batch would be refused again
+      console.warn(`Analytics dropped ${events.length} events: HTTP ${response.status}`)
+      return
+    }
+    const { rejected = 0 } = await response.json().catch(() => ({}))
+    if (rejected) {
+      console.warn(`Analytics rejected ${rejected} events`)
     }
   } catch (error) {
     // Silently fail - analytics should not break the app
     console.warn('Analytics error:', error.message)
+    queue = events.concat(queue).slice(-MAX_QUEUED_EVENTS)
+    scheduleRetry()
+  }
+}
+
+/**
+ * Send the queue with sendBeacon on page unload, split into beacons below
+ * MAX_BEACON_BYTES. Newest events go first, so session_end is not the one
+ * lost when the browser refuses a beacon.
+ */
+function beaconEvents() {
+  const encoder = new TextEncoder()
+  const events = queue.slice().reverse()
+  queue = []
+  let batch = []
+  let batchBytes = 2 // []
+  let sent = 0
+  const send = () => {
+    if (batch.length === 0) return true
+    if (!navigator.sendBeacon(ANALYTICS_BATCH_URL, `[${batch.join(',')}]`)) return false
+    sent += batch.length
+    batch = []
+    batchBytes = 2
+    return true
+  }
+
+  for (const event of events) {
+    const json = JSON.stringify(event)
+    const bytes = encoder.encode(json).length + 1 // separating comma
+    if (bytes + 2 > MAX_BEACON_BYTES) continue // too large for any beacon
+    if (batchBytes + bytes > MAX_BEACON_BYTES && !send()) break
+    batch.push(json)
+    batchBytes += bytes
+  }
+  if (!send() || sent < events.length) {
+    console.warn(`Analytics could not send ${events.length - sent} events on unload`)
+  }
+}
+
+/**
+ * Track a user action; it is sent to the backend with the next batch
+ * @param {string} action - The action name
+ * @param {object} data - Additional data about the action
+ */
+export async function trackEvent(action, data = {}) {
+  queue.push({
+    eventId: getEventId(),
+    action,
+    timestamp: new Date().toISOString(),
+    sessionId: getSessionId(),
+    userId: getUserId(),
+    sessionDuration: Math.round((Date.now() - sessionStartTime) / 1000), // seconds since session start
+    deviceType: getDeviceType(),
+    page: window.location.pathname || 'store',
+    scene: currentScene,
+    productId: data.productId || data.hotspotId,
+    orderTotal: data.total,
+    cartValue: data.total,
+    messageText: data.messageText,
+    data
+  })
+  if (queue.length > MAX_QUEUED_EVENTS) {
+    queue.shift()
+  }
+
+  // While retrying, wait for the backoff timer instead of flushing early
+  if (queue.length >= FLUSH_MAX_EVENTS && failedFlushes === 0) {
+    return flushEvents()
+  }
+  if (!flushTimer) {
+    flushTimer = setTimeout(flushEvents, FLUSH_DELAY_MS)
   }
 }
 
@@ -218,8 +323,9 @@ if (!sessionStorage.getItem(INIT_KEY)) {
 
   // Track session end when user leaves (only register once)
   window.addEventListener('beforeunload', () => {
-    // Use sendBeacon for reliable delivery on page unload
-    const data = JSON.stringify({
+    // Use sendBeacons for reliable delivery on page unload, together with
+    // whatever is still queued
+    queue.push({
       eventId: getEventId(),
       action: 'session_end',
       timestamp: new Date().toISOString(),
@@ -235,7 +341,8 @@ if (!sessionStorage.getItem(INIT_KEY)) {
         lastSceneDuration: sceneEntryTime ? Math.round((Date.now() - sceneEntryTime) / 1000) : 0
       }
     })
-    navigator.sendBeacon(ANALYTICS_API_URL, data)
+    clearTimeout(flushTimer)
+    beaconEvents()
   })
 }
 
@@ -29,7 +29,9 @@ function base64ToBytes(base64) {
     return bytes
 }
 
-export async function generatePlyFromImageBase64(imageBase64) {
+// format: 'ply' (float32), 'chunked_ply' (float32 in spatial order, with a
+// chunk_index for range requests) or 'compressed_ply' (quantized, ~3.5x smaller)
+export async function generatePlyFromImageBase64(imageBase64, { format = 'ply' } = {}) {
     if (!imageBase64) {
         throw new Error('Missing image base64 payload for Sharp API.')
     }
@@ -38,7 +40,7 @@ export async function generatePlyFromImageBase64(imageBase64) {
     const response = await fetch(endpoint, {
         method: 'POST',
         headers: { 'Content-Type': 'application/json' },
-        body: JSON.stringify({ image: imageBase64 })
+        body: JSON.stringify({ image: imageBase64, format })
     })
 
     if (!response.ok) {